@@ -0,0 +1,87 @@
+"""Benchmark closing 100 positions, one write per message against one batched write.
+
+Runs against the local stand-in server and measures the time from close_all()
+until the fills of all the positions are applied, and the reads done by the server
+on the TRADE stream. On the loopback the round trip is almost free, so the latency
+is mostly the processing of the fills; on a real link each extra segment can wait
+for the acknowledgement of the previous one (Nagle).
+"""
+
+# python
+from pathlib import Path
+import statistics
+import sys
+import threading
+import time
+from typing import Callable, List, Tuple
+
+# our modules
+from ctrader.fix import FIX, SubID
+
+# the stand-in server of the tests
+sys.path.append(str(Path(__file__).resolve().parents[2] / "tests"))
+from stand_in import StandInServer  # noqa: E402
+
+POSITIONS = 100
+RUNS = 20
+
+
+def unbatched_close_all(fix: FIX) -> None:
+    """Previous FIX.close_all(), each close_position() is written on its own."""
+    for position in list(fix.position_list):
+        fix.close_position(position, None)
+
+
+def batched_close_all(fix: FIX) -> None:
+    """Current FIX.close_all()."""
+    fix.close_all()
+
+
+def run(close_all: Callable[[FIX], None]) -> Tuple[float, int]:
+    """Seconds until all the positions are closed, and reads of the server."""
+    server = StandInServer(positions=POSITIONS)
+    loaded = threading.Event()
+    closed = threading.Event()
+
+    def position_list_callback(positions: dict, price_data: dict) -> None:
+        if len(positions) == POSITIONS:
+            loaded.set()
+        elif not positions and loaded.is_set():
+            closed.set()
+
+    fix = FIX(
+        "127.0.0.1",
+        "demo.icmarkets",
+        "1234567",
+        "password",
+        "USD",
+        "1",
+        position_list_callback,
+        lambda orders, price_data: None,
+        quote_port=server.quote_port,
+        trade_port=server.trade_port,
+    )
+    assert loaded.wait(5)
+    reads = server.reads[SubID.TRADE]
+    start = time.perf_counter()
+    close_all(fix)
+    assert closed.wait(5)
+    elapsed = time.perf_counter() - start
+    reads = server.reads[SubID.TRADE] - reads
+    fix.close()
+    server.close()
+    return elapsed, reads
+
+
+if __name__ == "__main__":
+    for name, close_all in [
+        ("one write per message", unbatched_close_all),
+        ("batched", batched_close_all),
+    ]:
+        results: List[Tuple[float, int]] = [run(close_all) for _ in range(RUNS)]
+        latency = statistics.median(r[0] for r in results) * 1000
+        reads = statistics.median(r[1] for r in results)
+        print(
+            f"close_all of {POSITIONS} positions, {name}: "
+            f"median latency={latency:.2f} ms, server reads={reads:.0f}"
+        )
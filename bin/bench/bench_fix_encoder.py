@@ -0,0 +1,132 @@
+"""Benchmark the encoding of outgoing FIX messages, before and after the cached header.
+
+The "before" encoders are copies of the previous implementations:
+FIX.Message.__bytes__ and the f-string builders of Broker with checksum().
+"""
+
+# python
+from datetime import datetime
+import time
+from types import SimpleNamespace
+from typing import Any, Callable, List, Tuple
+
+# our modules
+from ctrader.encoder import HeaderEncoder, encode_fields, sending_time
+from ctrader.fix import FIX, Field, SubID
+
+N = 100_000
+
+
+def legacy_fix_bytes(parent: Any, seq: int) -> bytes:
+    """Previous FIX.Message.__bytes__ of a new market order."""
+    fields: List[Tuple[Field, Any]] = [
+        (Field.BeginString, "FIX.4.4"),
+        (Field.BodyLength, 0),
+        (Field.MsgType, "D"),
+        (Field.SenderCompID, parent.broker + "." + parent.login),
+        (Field.SenderSubID, SubID.TRADE),
+        (Field.TargetCompID, "CSERVER"),
+        (Field.TargetSubID, SubID.TRADE),
+        (Field.MsgSeqNum, seq),
+        (Field.SendingTime, datetime.utcnow().strftime("%Y%m%d-%H:%M:%S")),
+        (Field.ClOrdId, "dt20231010-10:10:10"),
+        (Field.Symbol, 1),
+        (Field.Side, 1),
+        (Field.TransactTime, "20231010-10:10:10"),
+        (Field.OrderQty, 1000.0),
+        (Field.OrdType, 1),
+    ]
+    data = bytearray()
+    for k, v in fields:
+        data.extend(b"%b=%b\x01" % (str(k.value).encode(), str(v).encode()))
+    data[12:13] = b"%d" % (len(data) - 14)
+    cksm = sum(data) % 256
+    data.extend(b"10=%03d\x01" % cksm)
+    return bytes(data)
+
+
+def new_fix_bytes(parent: Any, seq: int) -> bytes:
+    """Current FIX.Message.__bytes__ of a new market order."""
+    msg = FIX.Message(SubID.TRADE, "D", parent)
+    msg[Field.ClOrdId] = "dt20231010-10:10:10"
+    msg[Field.Symbol] = 1
+    msg[Field.Side] = 1
+    msg[Field.TransactTime] = "20231010-10:10:10"
+    msg[Field.OrderQty] = 1000.0
+    msg[Field.OrdType] = 1
+    return bytes(msg)
+
+
+def legacy_checksum(message: str) -> str:
+    """Previous checksum() of Broker."""
+    sum = 0
+    message_array = bytes(message, "UTF-8")
+    for i in message_array:
+        sum += i
+    return str((sum % 256)).zfill(3)
+
+
+def legacy_broker_bytes(parent: Any, seq: int) -> bytes:
+    """Previous Broker.fix_set_order() of a market order, then bytes()."""
+    bl = (
+        "35=D"
+        f"|49={parent.broker}.{parent.login}"
+        "|56=cServer"
+        f"|34={seq}"
+        f"|52={time.strftime('%Y%m%d-%H:%M:%S', time.gmtime())}"
+        "|50=abcdefghi"
+        "|57=TRADE"
+        f"|11={seq}"
+        "|55=1"
+        "|54=1"
+        f"|60={time.strftime('%Y%m%d-%H:%M:%S', time.gmtime())}"
+        "|40=1"
+        "|38=1000"
+    )
+    bl += "|"
+    message = f"8=FIX.4.4|9={str(len(bl))}|{bl}".replace("|", "\u0001")
+    return bytes(message + f"10={legacy_checksum(message)}\u0001", "UTF-8")
+
+
+def new_broker_bytes(parent: Any, seq: int) -> bytes:
+    """Current Broker.fix_set_order() of a market order."""
+    body = encode_fields(
+        [
+            (11, seq),
+            (55, 1),
+            (54, 1),
+            (60, sending_time().decode()),
+            (40, 1),
+            (38, 1000),
+        ]
+    )
+    return parent.broker_encoder.encode(b"D", seq, body)
+
+
+def rate(encode: Callable[[Any, int], bytes], parent: Any) -> float:
+    """Messages per second of one encoder."""
+    start = time.perf_counter()
+    for seq in range(N):
+        encode(parent, seq)
+    return N / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    parent = SimpleNamespace(broker="demo.icmarkets", login="1234567", qseq=1, tseq=1)
+    parent.encoders = {
+        sub: HeaderEncoder("demo.icmarkets.1234567", "CSERVER", str(sub), str(sub))
+        for sub in SubID
+    }
+    parent.broker_encoder = HeaderEncoder(
+        "demo.icmarkets.1234567", "cServer", "abcdefghi", "TRADE"
+    )
+    for name, before, after in [
+        ("FIX.Message", legacy_fix_bytes, new_fix_bytes),
+        ("Broker.fix_set_order", legacy_broker_bytes, new_broker_bytes),
+    ]:
+        r_before = rate(before, parent)
+        r_after = rate(after, parent)
+        print(
+            f"{name}: before={r_before:,.0f} msg/s, after={r_after:,.0f} msg/s, "
+            f"speedup={r_after / r_before:.2f}x"
+        )
@@ -0,0 +1,190 @@
+"""Benchmark the parsing of the execution and position reports received by Broker.
+
+The "before" parsers are copies of the previous Broker.parse_one_order_message and
+Broker.parse_one_position_message, one regex search per tag on the message decoded
+with | as separator. The "after" parser splits the frame once into a mapping of tag
+to value and decodes the report from it. The frames are as received from cTrader.
+"""
+
+# python
+import re
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+# our modules
+from configs.assets import DICT_SYMBOL_ID_SYMBOL
+from ctrader_fix_asyncio.parser import (
+    decode_execution_report,
+    decode_position_report,
+    parse,
+)
+
+N = 100_000
+
+
+def make_frame(body: str) -> bytes:
+    """Frame around the fields of a body written with | as separator."""
+    body_bytes = body.replace("|", "\x01").encode()
+    head = b"8=FIX.4.4\x019=%d\x01" % len(body_bytes)
+    checksum = sum(head + body_bytes) % 256
+    return head + body_bytes + b"10=%03d\x01" % checksum
+
+
+EXECUTION_REPORT = make_frame(
+    "35=8|34=12|49=cServer|50=TRADE|52=20231010-10:10:10.123|56=demo.icmarkets.1234567"
+    "|57=TRADE|11=1696932610|14=0|37=543140337|38=1000|39=0|40=2|44=1.05|54=1|55=1"
+    "|59=1|60=20231010-10:10:10.120|150=0|151=1000|721=298765432|911=3|"
+)
+POSITION_REPORT = make_frame(
+    "35=AP|34=5|49=cServer|50=TRADE|52=20231010-10:10:10.123|56=demo.icmarkets.1234567"
+    "|57=TRADE|55=1|710=d1c2|721=298765432|727=3|728=0|730=1.05621|702=1|704=1000"
+    "|705=0|"
+)
+
+
+def legacy_position(full_message: str) -> Optional[Dict[str, Any]]:
+    """Previous Broker.parse_one_position_message."""
+    d = None
+    if match := re.search("721=(\\d+)", full_message):
+        d = {}
+        d["position_id"] = match.group(1)
+        if match := re.search("55=(\\d+)", full_message):
+            symbol_id = int(match.group(1))
+        else:
+            symbol_id = 0
+        if match := re.search("704=([\\d.]+)\\|", full_message):
+            quantity_buy = float(match.group(1))
+        else:
+            quantity_buy = 0.0
+        if match := re.search("705=([\\d.]+)\\|", full_message):
+            quantity_sell = float(match.group(1))
+        else:
+            quantity_sell = 0.0
+        if quantity_buy > 0.0 and quantity_sell == 0.0:
+            direction = "buy"
+            quantity = quantity_buy
+        elif quantity_buy == 0.0 and quantity_sell > 0.0:
+            direction = "sell"
+            quantity = quantity_sell
+        else:
+            raise ValueError
+        if match := re.search("730=([\\d.]+)\\|", full_message):
+            cost_price = float(match.group(1))
+        else:
+            cost_price = 0.0
+        if match := re.search("727=(\\d+)", full_message):
+            num_opened_positions = int(match.group(1))
+        else:
+            num_opened_positions = 0
+        d["symbol"] = DICT_SYMBOL_ID_SYMBOL[symbol_id]
+        d["symbol_id"] = symbol_id
+        d["direction"] = direction
+        d["quantity"] = quantity
+        d["cost_price"] = cost_price
+        d["num_opened_positions"] = num_opened_positions
+    return d
+
+
+def legacy_order(full_message: str) -> Optional[Dict[str, Any]]:
+    """Previous Broker.parse_one_order_message, with its lookup tables inlined."""
+    d = None
+    if match := re.search("37=(\\d+)", full_message):
+        d = {}
+        d["order_id"] = match.group(1)
+        match = re.search("11=(\\d+)", full_message)
+        order_request_id = match.group(1) if match else None
+        match = re.search("721=(\\d+)", full_message)
+        position_id = match.group(1) if match else None
+        match = re.search("55=(\\d+)", full_message)
+        symbol_id = int(match.group(1)) if match else 0
+        match = re.search("38=([\\d.]+)\\|", full_message)
+        quantity_ordered = float(match.group(1)) if match else 0.0
+        match = re.search("14=([\\d.]+)\\|", full_message)
+        quantity_filled = float(match.group(1)) if match else 0.0
+        match = re.search("151=([\\d.]+)\\|", full_message)
+        quantity_not_filled = float(match.group(1)) if match else 0.0
+        match = re.search("39=(\\d+)", full_message)
+        order_status = {"0": "new", "1": "partially_filled", "2": "filled"}.get(
+            match.group(1) if match else ""
+        )
+        match = re.search("54=(\\d+)", full_message)
+        order_direction = {"1": "buy", "2": "sell"}.get(match.group(1) if match else "")
+        match = re.search("40=(\\d+)", full_message)
+        order_type = {"1": "market", "2": "limit", "3": "stop"}.get(
+            match.group(1) if match else ""
+        )
+        match = re.search("44=([\\d.]+)\\|", full_message)
+        price_limit = float(match.group(1)) if match else None
+        match = re.search("99=([\\d.]+)\\|", full_message)
+        price_stop = float(match.group(1)) if match else None
+        match = re.search("59=(\\d+)", full_message)
+        time_in_force = {"1": "GTC", "3": "IOC", "6": "GTD"}.get(
+            match.group(1) if match else ""
+        )
+        match = re.search(r"150=([^|]+)", full_message)
+        execution_type = {"0": "new", "4": "canceled", "F": "trade"}.get(
+            match.group(1) if match else ""
+        )
+        match = re.search(r"60=([^|]+)", full_message)
+        datetime = match.group(1) if match else None
+        match = re.search("911=(\\d+)", full_message)
+        num_opened_orders = int(match.group(1)) if match else 0
+        d["position_id"] = position_id
+        d["datetime"] = datetime
+        d["symbol"] = DICT_SYMBOL_ID_SYMBOL[symbol_id]
+        d["symbol_id"] = symbol_id
+        d["order_direction"] = order_direction
+        d["order_type"] = order_type
+        d["price_limit"] = price_limit
+        d["price_stop"] = price_stop
+        d["quantity_ordered"] = quantity_ordered
+        d["quantity_filled"] = quantity_filled
+        d["quantity_not_filled"] = quantity_not_filled
+        d["order_status"] = order_status
+        d["time_in_force"] = time_in_force
+        d["execution_type"] = execution_type
+        d["order_request_id"] = order_request_id
+        d["num_opened_orders"] = num_opened_orders
+    return d
+
+
+def before_order(frame: bytes) -> Optional[Dict[str, Any]]:
+    """Previous handling of an execution report, from the frame."""
+    return legacy_order(frame.decode().replace("\u0001", "|"))
+
+
+def before_position(frame: bytes) -> Optional[Dict[str, Any]]:
+    """Previous handling of a position report, from the frame."""
+    return legacy_position(frame.decode().replace("\u0001", "|"))
+
+
+def after_order(frame: bytes) -> Optional[Dict[str, Any]]:
+    """Current handling of an execution report, from the frame."""
+    return decode_execution_report(parse(frame))
+
+
+def after_position(frame: bytes) -> Optional[Dict[str, Any]]:
+    """Current handling of a position report, from the frame."""
+    return decode_position_report(parse(frame))
+
+
+def cost(parser: Callable[[bytes], Any], frames: List[bytes]) -> float:
+    """Microseconds per message of one parser."""
+    start = time.perf_counter()
+    for _ in range(N // len(frames)):
+        for frame in frames:
+            parser(frame)
+    return (time.perf_counter() - start) / N * 1e6
+
+
+if __name__ == "__main__":
+    for name, frame, before, after in [
+        ("execution report", EXECUTION_REPORT, before_order, after_order),
+        ("position report", POSITION_REPORT, before_position, after_position),
+    ]:
+        c_before = cost(before, [frame])
+        c_after = cost(after, [frame])
+        print(
+            f"{name}: before={c_before:.2f} us/msg, after={c_after:.2f} us/msg, "
+            f"speedup={c_before / c_after:.2f}x"
+        )
@@ -0,0 +1,168 @@
+"""Benchmark flattening an account against the local stand-in server.
+
+FIX.cancel_all() of 100 orders: one write per cancel (before), the cancels in
+one write (fallback when the server rejects 35=q), and one OrderMassCancelRequest.
+Broker.close_all_positions() of 100 positions: one task and one write per position
+(before), and one write for all. Measures the messages and the reads of the server,
+and the time until the server received everything (Broker) or until the client
+applied all the cancels (FIX).
+"""
+
+# python
+import asyncio
+from pathlib import Path
+import statistics
+import sys
+import threading
+import time
+from typing import Callable, List, Tuple
+
+# our modules
+from ctrader.fix import FIX, SubID
+from ctrader_fix_asyncio.broker import Broker
+
+# the stand-in server of the tests
+sys.path.append(str(Path(__file__).resolve().parents[2] / "tests"))
+from stand_in import StandInServer  # noqa: E402
+
+COUNT = 100
+RUNS = 20
+
+
+def one_write_per_cancel(fix: FIX) -> None:
+    """Previous FIX.cancel_all()."""
+    for order in list(fix.order_list):
+        fix.cancel_order(order)
+
+
+def cancels_in_one_write(fix: FIX) -> None:
+    """Current FIX.cancel_all() when the server rejects OrderMassCancelRequest."""
+    fix.mass_cancel_supported = False
+    fix.cancel_all()
+
+
+def mass_cancel(fix: FIX) -> None:
+    """Current FIX.cancel_all()."""
+    fix.cancel_all()
+
+
+def run_fix(cancel_all: Callable[[FIX], None]) -> Tuple[float, int, int]:
+    """Seconds until all the orders are cancelled, messages and reads of the server."""
+    server = StandInServer(orders=COUNT)
+    loaded = threading.Event()
+    cancelled = threading.Event()
+
+    def order_list_callback(orders: dict, price_data: dict) -> None:
+        if len(orders) == COUNT:
+            loaded.set()
+        elif not orders and loaded.is_set():
+            cancelled.set()
+
+    fix = FIX(
+        "127.0.0.1",
+        "demo.icmarkets",
+        "1234567",
+        "password",
+        "USD",
+        "1",
+        lambda positions, price_data: None,
+        order_list_callback,
+        quote_port=server.quote_port,
+        trade_port=server.trade_port,
+    )
+    assert loaded.wait(5)
+    reads = server.reads[SubID.TRADE]
+    start = time.perf_counter()
+    cancel_all(fix)
+    assert cancelled.wait(5)
+    elapsed = time.perf_counter() - start
+    messages = server.count(SubID.TRADE, "F") + server.count(SubID.TRADE, "q")
+    reads = server.reads[SubID.TRADE] - reads
+    fix.close()
+    server.close()
+    return elapsed, messages, reads
+
+
+async def one_task_per_position(broker: Broker) -> None:
+    """Previous Broker.close_all_positions()."""
+    for d in list(broker.positions):
+        asyncio.create_task(broker.close_position(d["position_id"]))
+
+
+async def positions_in_one_write(broker: Broker) -> None:
+    """Current Broker.close_all_positions()."""
+    await broker.close_all_positions()
+
+
+async def run_broker_async(
+    close_all: Callable[[Broker], None]
+) -> Tuple[float, int, int]:
+    """Seconds until the server received all the closes, messages and reads."""
+    server = StandInServer()
+    broker = Broker(
+        credentials={
+            "broker": "icmarkets",
+            "hostname": "127.0.0.1",
+            "account": "1234567",
+            "password": "password",
+            "type": "demo",
+            "trade_port": server.trade_port,
+        }
+    )
+    for i in range(COUNT):
+        broker.positions.upsert(
+            {
+                "position_id": str(i),
+                "symbol": "EURUSD",
+                "direction": "buy",
+                "quantity": 1000,
+            }
+        )
+    broker.trade_reader, broker.trade_writer = await asyncio.open_connection(
+        "127.0.0.1", broker.trade_port
+    )
+    start = time.perf_counter()
+    await close_all(broker)
+    while server.count(SubID.TRADE, "D") < COUNT:
+        await asyncio.sleep(0)
+    elapsed = time.perf_counter() - start
+    reads = server.reads[SubID.TRADE]
+    broker.trade_writer.close()
+    server.close()
+    return elapsed, server.count(SubID.TRADE, "D"), reads
+
+
+def run_broker(close_all: Callable[[Broker], None]) -> Tuple[float, int, int]:
+    """Run one Broker benchmark in its own event loop."""
+    return asyncio.run(run_broker_async(close_all))
+
+
+def report(name: str, results: List[Tuple[float, int, int]]) -> None:
+    """Print the medians of the runs."""
+    latency = statistics.median(r[0] for r in results) * 1000
+    messages = statistics.median(r[1] for r in results)
+    reads = statistics.median(r[2] for r in results)
+    print(
+        f"{name}: median latency={latency:.2f} ms, "
+        f"messages={messages:.0f}, server reads={reads:.0f}"
+    )
+
+
+if __name__ == "__main__":
+    for name, cancel_all in [
+        ("one write per cancel", one_write_per_cancel),
+        ("cancels in one write", cancels_in_one_write),
+        ("OrderMassCancelRequest", mass_cancel),
+    ]:
+        report(
+            f"FIX.cancel_all of {COUNT} orders, {name}",
+            [run_fix(cancel_all) for _ in range(RUNS)],
+        )
+    for name, close_all in [
+        ("one task per position", one_task_per_position),
+        ("one write", positions_in_one_write),
+    ]:
+        report(
+            f"Broker.close_all_positions of {COUNT} positions, {name}",
+            [run_broker(close_all) for _ in range(RUNS)],
+        )
@@ -0,0 +1,100 @@
+"""Benchmark the depth updates of FIX.process_market_incr_data and the quote callback.
+
+The "before" depth is the previous dict of entries by MDEntryID, split into bids
+and asks and sorted by CTrader.quote_callback at each update to read the best
+level. The "after" depth is the OrderBook of the symbol, its levels kept sorted
+as the entries are added and removed. Each update replaces one entry of a book
+with LEVELS levels per side, as the incremental refreshes of cTrader do.
+"""
+
+# python
+from operator import itemgetter
+import random
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+# our modules
+from ctrader.order_book import OrderBook
+
+N = 100_000
+LEVELS = 20
+DIGITS = 5
+
+# (entry removed, entry added, side, price, size) of each update
+Update = Tuple[str, str, int, float, float]
+
+
+def make_updates() -> Tuple[List[Tuple[str, int, float, float]], List[Update]]:
+    """Entries of the first snapshot, then updates moving one entry each."""
+    random.seed(1)
+    snapshot = []
+    for i in range(LEVELS):
+        snapshot.append((f"b{i}", 0, round(1.1 - i * 1e-5, DIGITS), 100000.0))
+        snapshot.append((f"a{i}", 1, round(1.10002 + i * 1e-5, DIGITS), 100000.0))
+    live = [entry_id for entry_id, _, _, _ in snapshot]
+    updates = []
+    for i in range(N):
+        removed = live.pop(random.randrange(len(live)))
+        side = 0 if removed[0] == "b" else 1
+        level = random.randrange(LEVELS)
+        price = 1.1 - level * 1e-5 if side == 0 else 1.10002 + level * 1e-5
+        added = f"{removed[0]}x{i}"
+        live.append(added)
+        updates.append((removed, added, side, round(price, DIGITS), 50000.0))
+    return snapshot, updates
+
+
+def legacy_quote_callback(data: Dict[str, Dict[str, Any]]) -> Tuple[float, float]:
+    """Previous CTrader.quote_callback, to the best bid and ask."""
+    ask = []
+    bid = []
+    for e in data.values():
+        if e["type"] == 0:
+            bid.append(e)
+        else:
+            ask.append(e)
+    ask.sort(key=itemgetter("price"))
+    bid.sort(key=itemgetter("price"), reverse=True)
+    return bid[0]["price"], ask[0]["price"]
+
+
+def before(
+    snapshot: List[Tuple[str, int, float, float]], updates: List[Update]
+) -> None:
+    """Previous depth, a dict of entries sorted at each update."""
+    data = {
+        entry_id: {"type": side, "price": price, "size": size}
+        for entry_id, side, price, size in snapshot
+    }
+    for removed, added, side, price, size in updates:
+        del data[removed]
+        data[added] = {"type": side, "price": price, "size": size}
+        legacy_quote_callback(data)
+
+
+def after(snapshot: List[Tuple[str, int, float, float]], updates: List[Update]) -> None:
+    """Current depth, an OrderBook with the levels sorted."""
+    book = OrderBook(DIGITS)
+    for entry in snapshot:
+        book.add(*entry)
+    for removed, added, side, price, size in updates:
+        book.remove(removed)
+        book.add(added, side, price, size)
+        book.best_bid(), book.best_ask()
+
+
+def cost(depth: Callable[..., None], snapshot, updates) -> float:
+    """Microseconds per update of one depth."""
+    start = time.perf_counter()
+    depth(snapshot, updates)
+    return (time.perf_counter() - start) / len(updates) * 1e6
+
+
+if __name__ == "__main__":
+    snapshot, updates = make_updates()
+    c_before = cost(before, snapshot, updates)
+    c_after = cost(after, snapshot, updates)
+    print(
+        f"depth update of {LEVELS} levels per side: before={c_before:.2f} us/update, "
+        f"after={c_after:.2f} us/update, speedup={c_before / c_after:.2f}x"
+    )
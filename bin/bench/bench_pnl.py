@@ -0,0 +1,141 @@
+"""Benchmark the P&L of the positions kept current from a burst of spot quotes.
+
+The "before" is a copy of the previous CTrader.position_list_callback, called by
+FIX.process_market_data at each spot quote: it prints the positions and the
+prices, then formats a row for every position. The "after" gives each quote to
+PnLEngine.update, and reads the rows once every READ_EVERY quotes. The quotes
+are of SYMBOLS symbols, the positions of the first POSITION_SYMBOLS of them.
+"""
+
+# python
+from contextlib import redirect_stdout
+import io
+import logging
+import random
+import time
+from typing import Dict, List, Tuple
+
+# our modules
+from ctrader.pnl import PnLEngine, float_format
+
+N = 20_000
+POSITIONS = 50
+SYMBOLS = 20
+POSITION_SYMBOLS = 5
+READ_EVERY = 100
+
+
+def legacy_position_list_callback(data: dict, price_data: dict) -> None:
+    """Previous CTrader.position_list_callback."""
+    logging.info("In position_list_callback()")
+    print(f"position: data={data}")
+    print(f"position: price_data={price_data}")
+    positions = []
+    for i, kv in enumerate(data.items()):
+        pos_id = kv[0]
+        name = kv[1]["name"]
+        side = "Buy" if kv[1]["long"] > 0 else "Sell"
+        amount = kv[1]["long"] if kv[1]["long"] > 0 else kv[1]["short"]
+        price_str = float_format("{:.%df}" % kv[1]["digits"], kv[1]["price"], False)
+        price = price_data.get(name, None)
+        actual_price = ""
+        diff_str = ""
+        pl_str = ""
+        gain_str = ""
+        if price:
+            if side == "Buy":
+                p = price["bid"]
+            else:
+                p = price["ask"]
+            actual_price = ("{:.%df}" % kv[1]["digits"]).format(p)
+            diff = p - kv[1]["price"]
+            if side == "Sell":
+                diff = -diff
+            diff_str = float_format("{:+.%df}" % kv[1]["digits"], diff)
+            pl = amount * diff
+            pl_str = float_format("{:+.2f}", pl)
+            convert = kv[1]["convert"]
+            convert_dir = kv[1]["convert_dir"]
+            price = price_data.get(convert, None)
+            if price:
+                if convert_dir:
+                    rate = 1 / price["ask"]
+                else:
+                    rate = price["bid"]
+                pl_base = pl * rate
+                gain_str = "{:+.2f}".format(round(pl_base, 2))
+        positions.append(
+            {
+                "pos_id": pos_id,
+                "name": name,
+                "side": side,
+                "amount": amount,
+                "price": price_str,
+                "actual_price": actual_price,
+                "diff": diff_str,
+                "pl": pl_str,
+                "gain": gain_str,
+            }
+        )
+
+
+def make_data() -> Tuple[Dict[str, dict], List[Tuple[str, float, float]]]:
+    """Positions of an account in EUR, and a burst of quotes."""
+    random.seed(1)
+    symbols = [f"S{i:02d}USD" for i in range(SYMBOLS)]
+    positions = {}
+    for i in range(POSITIONS):
+        long = random.choice([True, False])
+        positions[str(i)] = {
+            "pos_id": str(i),
+            "name": symbols[i % POSITION_SYMBOLS],
+            "long": 10000.0 if long else 0.0,
+            "short": 0.0 if long else 10000.0,
+            "price": 1.1,
+            "digits": 5,
+            "clid": f"o{i}",
+            "convert": "EURUSD",
+            "convert_dir": 1,
+        }
+    quotes = []
+    for _ in range(N):
+        mid = 1.1 + random.uniform(-0.01, 0.01)
+        quotes.append((random.choice(symbols + ["EURUSD"]), mid - 1e-5, mid + 1e-5))
+    return positions, quotes
+
+
+def before(positions: Dict[str, dict], quotes: List[Tuple[str, float, float]]) -> None:
+    """Previous handling of the quotes, the rows of all the positions each time."""
+    spot_price_list: Dict[str, Dict[str, float]] = {}
+    with redirect_stdout(io.StringIO()):
+        for name, bid, ask in quotes:
+            spot_price_list[name] = {"time": 0, "bid": bid, "ask": ask}
+            legacy_position_list_callback(positions, spot_price_list)
+
+
+def after(positions: Dict[str, dict], quotes: List[Tuple[str, float, float]]) -> None:
+    """Current handling of the quotes, the rows read every READ_EVERY quotes."""
+    pnl = PnLEngine()
+    pnl.set_positions(positions)
+    for i, (name, bid, ask) in enumerate(quotes):
+        pnl.update(name, 0, bid, ask)
+        if i % READ_EVERY == 0:
+            pnl.rows()
+
+
+def cost(handle, positions, quotes) -> float:
+    """Microseconds per quote."""
+    start = time.perf_counter()
+    handle(positions, quotes)
+    return (time.perf_counter() - start) / len(quotes) * 1e6
+
+
+if __name__ == "__main__":
+    positions, quotes = make_data()
+    c_before = cost(before, positions, quotes)
+    c_after = cost(after, positions, quotes)
+    print(
+        f"{POSITIONS} positions, quotes of {SYMBOLS} symbols: "
+        f"before={c_before:.2f} us/quote, after={c_after:.2f} us/quote, "
+        f"speedup={c_before / c_after:.1f}x"
+    )
@@ -114,3 +114,8 @@ SAVE_SCREENSHOT = False
 SAVE_HTML = False
 
 FILE_ORDERS_LOG = "./output/orders/orders_01.log"
+
+""" cTrader FIX API """
+
+# security list (symbol ids, names, digits) saved per broker and server
+SEC_LIST_CACHE_DIR = "./output/cache"
@@ -1,31 +1,110 @@
 """Module for Buffer."""
 
+from typing import Iterator, Optional
+
+# a FIX frame is 8=BeginString|9=BodyLength|<body>10=CheckSum|
+BEGIN_STRING = b"8=FIX"
+BODY_LENGTH = b"9="
+SOH = 0x01
+# 10=NNN\x01 follows the body, it is not counted in BodyLength
+TRAILER_LENGTH = 7
+# BodyLength values are small, more digits than this means a corrupt header
+MAX_BODY_LENGTH_DIGITS = 9
+
 
 class Buffer:
-    """Class Buffer."""
+    """Class Buffer.
+
+    Received bytes are appended at the end and consumed from a read offset,
+    so taking a message from the front does not move the bytes behind it.
+    The consumed prefix is dropped in one go once it is larger than what is
+    still unread, which keeps the cost amortised O(1) per byte.
+    """
 
     def __init__(self) -> None:
         """Init."""
         self._buffer = bytearray()
+        self._pos = 0
 
     def write(self, data: bytes) -> None:
         """Write."""
+        if self._pos and self._pos >= len(self._buffer) - self._pos:
+            del self._buffer[: self._pos]
+            self._pos = 0
         self._buffer.extend(data)
 
-    def read(self, size: int) -> bytearray:
+    def read(self, size: int) -> bytes:
         """Read."""
-        data = self._buffer[:size]
-        self._buffer[:size] = b""
+        data = bytes(self._buffer[self._pos : self._pos + size])
+        self._pos += len(data)
         return data
 
-    def peek(self, size: int) -> bytearray:
+    def peek(self, size: int) -> bytes:
         """Peek."""
-        return self._buffer[:size]
+        return bytes(self._buffer[self._pos : self._pos + size])
 
     def count(self) -> int:
         """Count."""
-        return len(self._buffer)
+        return len(self._buffer) - self._pos
 
     def __len__(self) -> int:
         """Length."""
-        return len(self._buffer)
+        return len(self._buffer) - self._pos
+
+    def next_frame(self) -> Optional[bytes]:
+        """Return the next complete FIX frame, or None if it did not fully arrive.
+
+        The frame boundary is computed from BodyLength (tag 9), so the bytes
+        of a frame are looked at only once, whatever the size of the backlog.
+        Garbage in front of a frame is skipped up to the next BeginString.
+        """
+        buf = self._buffer
+        end = len(buf)
+        while True:
+            start = self._pos
+            if end - start < len(BEGIN_STRING):
+                return None
+            if not buf.startswith(BEGIN_STRING, start):
+                self._resync(start + 1)
+                continue
+            soh = buf.find(SOH, start, end)
+            if soh == -1:
+                return None
+            value_start = soh + 1 + len(BODY_LENGTH)
+            if end < value_start:
+                return None
+            if not buf.startswith(BODY_LENGTH, soh + 1):
+                self._resync(start + 1)
+                continue
+            soh = buf.find(SOH, value_start, value_start + MAX_BODY_LENGTH_DIGITS + 1)
+            if soh == -1:
+                if end - value_start > MAX_BODY_LENGTH_DIGITS:
+                    self._resync(start + 1)
+                    continue
+                return None
+            try:
+                body_length = int(buf[value_start:soh])
+            except ValueError:
+                self._resync(start + 1)
+                continue
+            frame_end = soh + 1 + body_length + TRAILER_LENGTH
+            if frame_end > end:
+                return None
+            if not buf.startswith(b"10=", frame_end - TRAILER_LENGTH):
+                self._resync(start + 1)
+                continue
+            self._pos = frame_end
+            return bytes(buf[start:frame_end])
+
+    def frames(self) -> Iterator[bytes]:
+        """Yield all the complete frames currently in the buffer."""
+        while (frame := self.next_frame()) is not None:
+            yield frame
+
+    def _resync(self, start: int) -> None:
+        """Skip to the next BeginString at or after start, or to the end."""
+        index = self._buffer.find(BEGIN_STRING, start)
+        if index == -1:
+            # keep a tail that could be the beginning of a BeginString
+            index = max(start, len(self._buffer) - len(BEGIN_STRING) + 1)
+        self._pos = index
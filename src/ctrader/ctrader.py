@@ -4,8 +4,12 @@ import logging
 import json
 import time
 import random
-from operator import itemgetter
+from configs.settings import SEC_LIST_CACHE_DIR
+from market_data.bus import QuoteBus
+from market_data.tick_store import TickStore
 from .fix import FIX, Side, OrderType
+from .order_book import OrderBook
+from .pnl import PnLEngine, float_format
 
 from typing import Any, Dict, List, Optional
 
@@ -40,6 +44,9 @@ class CTrader:
         currency: str,
         client_id: int = 1,
         debug: bool = False,
+        sec_list_cache_dir: Optional[str] = SEC_LIST_CACHE_DIR,
+        fill_timeout: float = 10.0,
+        tick_store_dir: Optional[str] = None,
     ):
         """Init.
 
@@ -51,6 +58,12 @@ class CTrader:
             currency ([str]): "EUR" or "USD"
             client_id ([str]):[example 1 or trader-1 its comment on position label]
             debug ([bool]): if true or false to add more logging info.
+            sec_list_cache_dir ([str]): folder of the saved security lists,
+            None to always wait for the list from the server.
+            fill_timeout ([float]): seconds to wait for the fill of a market order
+            before sending its SL and TP orders.
+            tick_store_dir ([str]): folder where the quotes received are recorded,
+            per broker, None to not record them.
         """
         if debug:
             logging.getLogger().setLevel(logging.INFO)
@@ -66,9 +79,10 @@ class CTrader:
             "password": password,
             "currency": currency,
             "fix_status": 0,
-            "positions": [],
             "orders": [],
         }
+        # P&L of the positions, from the quotes
+        self.pnl = PnLEngine()
         self.fix = FIX(
             c["server"],
             c["broker"],
@@ -78,8 +92,24 @@ class CTrader:
             c["_id"],
             self.position_list_callback,
             self.order_list_callback,
+            sec_list_cache_dir=sec_list_cache_dir,
         )
         self.market_data_list = {}
+        # identities of the orders and positions, the same index as in FIX
+        self.index = self.fix.index
+        self.fill_timeout = fill_timeout
+        self.fix.add_quote_listener(self.pnl.update)
+        # the quotes for the other consumers, subscribed with self.bus.subscribe()
+        self.bus = QuoteBus()
+        self.fix.add_quote_listener(self.bus.publish)
+        self.tick_store: Optional[TickStore] = None
+        if tick_store_dir is not None:
+            self.tick_store = TickStore(f"{tick_store_dir}/{broker}")
+            self.fix.add_quote_listener(self.tick_store.append)
+            # the ticks are appended from the loop, flushed there too
+            self.tick_flush_timer = self.fix.loop.call_every(
+                self.tick_store.flush_interval, self.tick_store.flush
+            )
 
     def trade(
         self,
@@ -174,54 +204,48 @@ class CTrader:
                     f'OPEN v_type==0={v_type}, command="{command}", '
                     "should be open market order, start pasing command"
                 )
+                # registered before sending, the fill can arrive before parse returns
+                fill = self.fix.expect_fill(v_ticket) if v_sl or v_tp else None
                 self.parse_command(command)
                 logging.info("End parsing command.")
 
-                # print("A")
-                # logging.info(f"v_ticket={v_ticket}")
-                # time.sleep(4)
-                # logging.info(f"self.fix.origin_to_pos_id={self.fix.origin_to_pos_id}")
-                # ticket = self.fix.origin_to_pos_id[v_ticket]
-                # logging.info(f"ticket={ticket}")
-                # print("B")
-
-                if v_sl or v_tp:
-                    # if False:
-                    # print(f"We have SL or TP, SL={v_sl}, TP={v_tp}")
-                    while True:
-                        try:
-                            ticket = self.fix.origin_to_pos_id[v_ticket]
-                            time.sleep(1)
-                            if ticket:  # Verifica se a variável ticket não está vazia
-                                break
-                        except Exception as e:
-                            logging.info(e)
-                            continue
-
-                # print("B")
+                if fill is not None:
+                    # the SL and TP orders need the id of the position opened
+                    try:
+                        ticket = fill.result(timeout=self.fill_timeout)
+                    except TimeoutError:
+                        self.fix.fills.pop(v_ticket, None)
+                        logging.error(
+                            f"No fill for {v_ticket} after {self.fill_timeout}s, "
+                            "SL and TP are not sent."
+                        )
+                    except Exception as e:
+                        logging.error(f"Order {v_ticket} not filled: {e}")
 
                 if ticket:
-                    # print(f"C, SL={v_sl}, TP={v_tp}")
-                    if v_sl and float(v_sl) > 0:
-                        # print(f"D, SL={v_sl}")
-                        # abre posicao pendente SL
-                        otype = "sell stop" if v_type == "0" else "buy stop"
-                        command = "{0} {1} {2} {3} {4} {5}".format(
-                            otype, symbol, size, v_sl, v_ticket, ticket
-                        )
-                        # print(f"We have SL command={command}")
-                        self.parse_command(command)
-                    if v_tp and float(v_tp) > 0:
-                        # print(f"D, TP={v_tp}")
-                        # cancela ordens pendentes abertas de TP e SL
-                        ticket_orders = self.getOrdersIdByOriginId(v_ticket)
-                        # abre posicao pendente TP
-                        otype = "sell limit" if v_type == "0" else "buy limit"
-                        command = "{0} {1} {2} {3} {4} {5}".format(
-                            otype, symbol, size, v_tp, v_ticket, ticket
-                        )
-                        # print(f"We have TP command={command}")
-                        self.parse_command(command)
+                    # the SL and TP orders leave in one write
+                    with self.fix.batch():
+                        # print(f"C, SL={v_sl}, TP={v_tp}")
+                        if v_sl and float(v_sl) > 0:
+                            # print(f"D, SL={v_sl}")
+                            # abre posicao pendente SL
+                            otype = "sell stop" if v_type == "0" else "buy stop"
+                            command = "{0} {1} {2} {3} {4} {5}".format(
+                                otype, symbol, size, v_sl, v_ticket, ticket
+                            )
+                            # print(f"We have SL command={command}")
+                            self.parse_command(command)
+                        if v_tp and float(v_tp) > 0:
+                            # print(f"D, TP={v_tp}")
+                            # cancela ordens pendentes abertas de TP e SL
+                            ticket_orders = self.getOrdersIdByOriginId(v_ticket)
+                            # abre posicao pendente TP
+                            otype = "sell limit" if v_type == "0" else "buy limit"
+                            command = "{0} {1} {2} {3} {4} {5}".format(
+                                otype, symbol, size, v_tp, v_ticket, ticket
+                            )
+                            # print(f"We have TP command={command}")
+                            self.parse_command(command)
 
         elif v_action in ["CLOSED", "PCLOSED"]:
             # print("closing action")
@@ -475,10 +499,11 @@ class CTrader:
 
     def positions(self) -> List[Dict[str, Any]]:
         """Get positions."""
-        return json.loads(json.dumps(self.client["positions"]))
+        return json.loads(json.dumps(self.pnl.rows()))
 
     def orders(self) -> List[Dict[str, Any]]:
-        """Get orders."""
+        """Get orders, with the prices of the last quotes."""
+        self.order_list_callback(dict(self.fix.order_list), self.fix.spot_price_list)
         return json.loads(json.dumps(self.client["orders"]))
 
     def parse_command(self, command: str) -> None:
@@ -550,99 +575,41 @@ class CTrader:
 
     def float_format(self, fmt: str, num: float, force_sign: bool = True) -> str:
         """Format a float as a string."""
-        return max(
-            ("{:+}" if force_sign else "{}").format(round(num, 6)),
-            fmt.format(num),
-            key=len,
-        )
+        return float_format(fmt, num, force_sign)
 
     def position_list_callback(self, data: dict, price_data: dict) -> None:
-        """Position list callback."""
-        logging.info(f"In position_list_callback()")
-        print(f"position: data={data}")
-        print(f"position: price_data={price_data}")
-        positions = []
-        for i, kv in enumerate(data.items()):
-            pos_id = kv[0]
-            name = kv[1]["name"]
-            side = "Buy" if kv[1]["long"] > 0 else "Sell"
-            amount = kv[1]["long"] if kv[1]["long"] > 0 else kv[1]["short"]
-            price_str = self.float_format(
-                "{:.%df}" % kv[1]["digits"], kv[1]["price"], False
-            )
-            price = price_data.get(name, None)
-            actual_price = ""
-            diff_str = ""
-            pl_str = ""
-            gain_str = ""
-            if price:
-                if side == "Buy":
-                    p = price["bid"]
-                else:
-                    p = price["ask"]
-                actual_price = ("{:.%df}" % kv[1]["digits"]).format(p)
-                diff = p - kv[1]["price"]
-                if side == "Sell":
-                    diff = -diff
-                diff_str = self.float_format("{:+.%df}" % kv[1]["digits"], diff)
-                pl = amount * diff
-                pl_str = self.float_format("{:+.2f}", pl)
-                convert = kv[1]["convert"]
-                convert_dir = kv[1]["convert_dir"]
-                price = price_data.get(convert, None)
-                if price:
-                    if convert_dir:
-                        rate = 1 / price["ask"]
-                    else:
-                        rate = price["bid"]
-                    pl_base = pl * rate
-                    gain_str = "{:+.2f}".format(round(pl_base, 2))
-            # adiciona informacoes de posicoes no client
-            positions.append(
-                {
-                    "pos_id": pos_id,
-                    "name": name,
-                    "side": side,
-                    "amount": amount,
-                    "price": price_str,
-                    "actual_price": actual_price,
-                    "diff": diff_str,
-                    "pl": pl_str,
-                    "gain": gain_str,
-                }
-            )
-        self.client.update(positions=positions)
-        logging.debug("positions: %s", positions)
+        """Position list callback, when the positions change.
+
+        The prices come to self.pnl as quotes, and the rows are formatted when
+        read by positions().
+        """
+        logging.debug("positions: %s", data)
+        self.pnl.set_positions(data, price_data)
 
     def getPositionIdByOriginId(self, posId: str) -> Optional[str]:
         """Get PositionID by OriginID."""
-        if posId in self.fix.origin_to_pos_id:
-            return self.fix.position_list[self.fix.origin_to_pos_id[posId]]
-        else:
-            return None
+        pos_id = self.index.position(posId)
+        return self.fix.position_list.get(pos_id) if pos_id is not None else None
 
-    def getOrdersIdByOriginId(self, ordId: str) -> Optional[str]:
+    def getOrdersIdByOriginId(self, ordId: str) -> Optional[List[str]]:
         """Get OrderID by OriginID."""
-        if (
-            ordId in self.fix.origin_to_ord_id
-        ):  # Verifique se a chave existe antes de acessá-la
-            return self.fix.origin_to_ord_id[ordId]
-        else:
-            return None  # Retorne None ou outro valor padrão quando a chave não existir
+        return self.index.orders(ordId) or None
 
     def cancelOrdersByOriginId(self, clIdArr: str) -> None:
         """Cancel order by OriginID."""
         if not clIdArr:
             return
-        for clId in clIdArr:
-            self.fix.cancel_order(clId)
+        with self.fix.batch():
+            for clId in clIdArr:
+                self.fix.cancel_order(clId)
 
     def subscribe(self, symbols: List[str]) -> None:
-        """Subscribe."""
-        # print(f"A, symbols={symbols}")
-        for symbol in symbols:
-            # print(f"B, symbol={symbol}")
-            self.fix.spot_market_request(symbol)
+        """Subscribe, to all the symbols in one request."""
+        self.fix.spot_market_request(*symbols)
+
+    def unsubscribe(self, symbols: List[str]) -> None:
+        """Unsubscribe, from the symbols not needed by a position or an order."""
+        self.fix.spot_market_release(*symbols)
 
     def quote(self, symbol: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
         """Quote."""
@@ -657,10 +624,7 @@ class CTrader:
         return self.fix.spot_price_list
 
     def order_list_callback(self, data: dict, price_data: dict):
-        """Order list callback."""
-        logging.info(f"In order_list_callback()")
-        logging.info(f"order: data={data}")
-        logging.info(f"order: price_data={price_data}")
+        """Order list callback, when the orders change and when they are read."""
         orders = []
         for i, kv in enumerate(data.items()):
             ord_id = kv[0]
@@ -700,23 +664,14 @@ class CTrader:
         self.client.update(orders=orders)
         logging.debug("orders: %s", orders)
 
-    def quote_callback(self, name: str, digits: int, data: dict):
+    def quote_callback(self, name: str, digits: int, book: OrderBook):
         """Quote callback."""
-        if len(data) == 0:
+        bid, ask = book.best_bid(), book.best_ask()
+        if bid is None or ask is None:
             return
-        ask = []
-        bid = []
-        for e in data.values():
-            if e["type"] == 0:
-                bid.append(e)
-            else:
-                ask.append(e)
-        ask.sort(key=itemgetter("price"))
-        bid.sort(key=itemgetter("price"), reverse=True)
-
-        bid_str = ("{:.%df}" % digits).format(bid[0]["price"])
-        offer_str = ("{:.%df}" % digits).format(ask[0]["price"])
-        spread_str = ("{:.%df}" % digits).format(ask[0]["price"] - bid[0]["price"])
+        bid_str = ("{:.%df}" % digits).format(bid)
+        offer_str = ("{:.%df}" % digits).format(ask)
+        spread_str = ("{:.%df}" % digits).format(ask - bid)
         self.market_data_list[name] = {
             "bid": bid_str,
             "ask": offer_str,
@@ -734,6 +689,9 @@ class CTrader:
 
     def logout(self) -> str:
         """Logout."""
+        if self.tick_store is not None:
+            self.tick_flush_timer.cancel()
+            self.fix.loop.call_soon(self.tick_store.flush)
         if self.isconnected():
             self.fix.logout()
             logout = "Logged out"
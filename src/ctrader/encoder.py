@@ -0,0 +1,86 @@
+"""Module to encode outgoing FIX messages with a cached session header."""
+
+# python
+import time
+from typing import Any, Iterable, Tuple
+
+BEGIN_STRING = b"8=FIX.4.4\x01"
+BEGIN_STRING_SUM = sum(BEGIN_STRING)
+
+_sending_time_second = -1
+_sending_time = b""
+
+
+def sending_time() -> bytes:
+    """Get current UTC time as encoded for SendingTime, formatted once per second."""
+    global _sending_time_second, _sending_time
+    now = int(time.time())
+    if now != _sending_time_second:
+        _sending_time = time.strftime("%Y%m%d-%H:%M:%S", time.gmtime(now)).encode()
+        _sending_time_second = now
+    return _sending_time
+
+
+def encode_fields(fields: Iterable[Tuple[int, Any]]) -> bytes:
+    """Encode a list of (tag, value) pairs as tag=value fields."""
+    return b"".join(b"%d=%b\x01" % (int(k), str(v).encode()) for k, v in fields)
+
+
+class HeaderEncoder:
+    """Encoder for the messages of one stream (QUOTE or TRADE) of one session.
+
+    The header fields that do not change during the session (SenderCompID,
+    SenderSubID, TargetCompID, TargetSubID) are encoded once, together with
+    their contribution to the checksum. Each message then only adds MsgType,
+    MsgSeqNum, SendingTime and its body, and the whole frame is built with
+    a single formatting operation.
+    """
+
+    __slots__ = ("sender_comp_id", "header", "header_sum")
+
+    def __init__(
+        self,
+        sender_comp_id: str,
+        target_comp_id: str,
+        sender_sub_id: str,
+        target_sub_id: str,
+    ) -> None:
+        """Init."""
+        self.sender_comp_id = sender_comp_id
+        self.header = b"49=%b\x0150=%b\x0156=%b\x0157=%b\x01" % (
+            sender_comp_id.encode(),
+            sender_sub_id.encode(),
+            target_comp_id.encode(),
+            target_sub_id.encode(),
+        )
+        self.header_sum = sum(self.header) + BEGIN_STRING_SUM
+
+    def encode(
+        self,
+        msg_type: bytes,
+        seq_num: int,
+        body: bytes = b"",
+        timestamp: bytes = b"",
+    ) -> bytes:
+        """Encode one message ready to be sent, with BodyLength and CheckSum."""
+        msg_type_field = b"35=%b\x01" % msg_type
+        seq_time_fields = b"34=%d\x0152=%b\x01" % (seq_num, timestamp or sending_time())
+        body_length = b"9=%d\x01" % (
+            len(msg_type_field) + len(self.header) + len(seq_time_fields) + len(body)
+        )
+        checksum = (
+            self.header_sum
+            + sum(body_length)
+            + sum(msg_type_field)
+            + sum(seq_time_fields)
+            + sum(body)
+        ) % 256
+        return b"%b%b%b%b%b%b10=%03d\x01" % (
+            BEGIN_STRING,
+            body_length,
+            msg_type_field,
+            self.header,
+            seq_time_fields,
+            body,
+            checksum,
+        )
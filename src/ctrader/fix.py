@@ -1,18 +1,26 @@
 """Module to implement the FIX protocol."""
 
 # python
-from datetime import datetime
+from array import array
+from concurrent.futures import Future
+from contextlib import contextmanager
 from enum import IntEnum, Enum
 import logging
 from pprint import pformat
-import re
 import socket
 import time
 import threading
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
 
 # our modules
 from .buffer import Buffer
+from .encoder import HeaderEncoder, encode_fields, sending_time
+from .loop import FIXLoop, Timer
+from .order_book import OrderBook
+from .order_index import OrderIndex
+from .sec_cache import SecurityListCache, apply_sec_list_diff
+from .subscriptions import Subscriptions
+from market_data import QuoteListener
 
 
 class Field(IntEnum):
@@ -25,6 +33,7 @@ class Field(IntEnum):
     CheckSum = 10
     ClOrdId = 11
     CumQty = 14
+    LastPx = 31
     OrdQty = 32
     MsgSeqNum = 34
     MsgType = 35
@@ -77,6 +86,9 @@ class Field(IntEnum):
     BusinessRejectReason = 380
     CxlRejResponseTo = 434
     Designation = 494
+    MassCancelRequestType = 530
+    MassCancelResponse = 531
+    MassCancelRejectReason = 532
     Username = 553
     Password = 554
     SecurityListRequestType = 559
@@ -131,14 +143,155 @@ class OrderType(IntEnum):
 
 def get_time() -> str:
     """Get current time as a string."""
-    return datetime.utcnow().strftime("%Y%m%d-%H:%M:%S")
+    return sending_time().decode()
+
+
+# repeating groups that are decoded into entries as soon as a message is parsed,
+# with the tags of their entries
+DECODED_GROUPS = {
+    Field.NoMDEntries: {
+        Field.MDUpdateAction,
+        Field.MDEntryType,
+        Field.MDEntryID,
+        Field.Symbol,
+        Field.MDEntryPx,
+        Field.MDEntrySize,
+    },
+    Field.NoRelatedSym: {Field.Symbol, Field.SymbolName, Field.SymbolDigits},
+}
+
+
+class ReceivedMessage:
+    """Message received from the server.
+
+    The frame is split once into arrays of tags and of value offsets, with an
+    index from each tag to its first occurrence, so a lookup is O(1).
+    Values are decoded from the raw bytes the first time they are read.
+    """
+
+    __slots__ = ("raw", "tags", "starts", "ends", "index", "values", "groups")
+
+    def __init__(self, frame: bytes) -> None:
+        """Init by indexing the fields of one complete frame."""
+        self.raw = frame
+        self.tags = array("I")
+        self.starts = array("I")
+        self.ends = array("I")
+        self.index: Dict[int, int] = {}
+        pos = 0
+        size = len(frame)
+        while pos < size:
+            eq = frame.find(b"=", pos)
+            end = frame.find(b"\x01", eq)
+            if eq == -1 or end == -1:
+                break
+            tag = int(frame[pos:eq])
+            if tag not in self.index:
+                self.index[tag] = len(self.tags)
+            self.tags.append(tag)
+            self.starts.append(eq + 1)
+            self.ends.append(end)
+            pos = end + 1
+        self.values: List[Optional[str]] = [None] * len(self.tags)
+        self.groups: Dict[int, List[Dict[int, str]]] = {}
+        for count_key in DECODED_GROUPS:
+            if count_key in self.index:
+                self.groups[count_key] = self._decode_group(count_key)
+
+    def value(self, i: int) -> str:
+        """Get the value of the i-th field, decoding it if not done already."""
+        v = self.values[i]
+        if v is None:
+            v = self.values[i] = self.raw[self.starts[i] : self.ends[i]].decode()
+        return v
+
+    def __getitem__(self, item: int) -> Optional[str]:
+        """Get the value of the first field with this tag, or None."""
+        i = self.index.get(item)
+        return None if i is None else self.value(i)
+
+    def __contains__(self, item: int) -> bool:
+        """Check if a tag is present."""
+        return item in self.index
+
+    def _decode_group(self, count_key: int) -> List[Dict[int, str]]:
+        """Decode the entries of the repeating group counted by count_key.
+
+        The first tag after the counter delimits the entries, as in the FIX spec,
+        and the counter bounds their number. The last entry ends at a tag it has
+        already, or at a tag not of the group: of DECODED_GROUPS if listed there,
+        else of the entries before it.
+        """
+        result: List[Dict[int, str]] = []
+        first = self.index[count_key] + 1
+        count = int(self.value(first - 1) or 0)
+        if first >= len(self.tags) or count <= 0:
+            return result
+        delimiter = self.tags[first]
+        members = DECODED_GROUPS.get(count_key)
+        seen: Set[int] = set()
+        item: Dict[int, str] = {}
+        for i in range(first, len(self.tags)):
+            tag = self.tags[i]
+            if tag == Field.CheckSum:
+                break
+            if tag == delimiter and item:
+                result.append(item)
+                seen.update(item)
+                item = {}
+                if len(result) == count:
+                    break
+            elif len(result) == count - 1 and (
+                tag in item
+                or (members is not None and tag not in members)
+                or (members is None and result and tag not in seen)
+            ):
+                # past the end of the last entry
+                break
+            item[tag] = self.value(i)
+        if item:
+            result.append(item)
+        return result
+
+    def get_repeating_groups(
+        self,
+        count_key: int,
+        repeating_start: Optional[int] = None,
+        repeating_end: Optional[int] = None,
+    ) -> List[Dict[int, Any]]:
+        """Get repeating groups, already decoded for the usual groups."""
+        if count_key not in self.groups:
+            self.groups[count_key] = (
+                self._decode_group(count_key) if count_key in self.index else []
+            )
+        return self.groups[count_key]
+
+    def __str__(self) -> str:
+        """Get string."""
+        return self.raw.decode().replace("\x01", "|")
+
+    def __repr__(self) -> str:
+        """Retrun representation to print nicely as a string."""
+        return pformat(
+            [
+                (
+                    Field(tag).name if tag in Field._value2member_map_ else tag,
+                    self.value(i),
+                )
+                for i, tag in enumerate(self.tags)
+            ]
+        )
 
 
 class FIX:
     """Class FIX."""
 
     class Message:
-        """Class Message."""
+        """Class Message.
+
+        Only the body fields are kept in the list of fields. The header comes
+        from the encoder of the session, which has it already encoded.
+        """
 
         def __init__(
             self,
@@ -148,88 +301,66 @@ class FIX:
         ) -> None:
             """Init."""
             self.fields: List[Tuple[Field, Any]] = []
+            self.sub = sub
+            self.msg_type = msg_type
             if parent:
                 self.origin = True
-                self.fields.append((Field.BeginString, "FIX.4.4"))
-                self.fields.append((Field.BodyLength, 0))
-                self.fields.append((Field.MsgType, msg_type))
-                self.fields.append(
-                    (Field.SenderCompID, parent.broker + "." + parent.login)
-                )
-                self.fields.append((Field.SenderSubID, sub))
-                self.fields.append((Field.TargetCompID, "CSERVER"))
-                self.fields.append((Field.TargetSubID, sub))
+                self.encoder: HeaderEncoder = parent.encoders[sub]
                 if sub == SubID.QUOTE:
-                    self.fields.append((Field.MsgSeqNum, parent.qseq))
+                    self.seq_num = parent.qseq
                     parent.qseq += 1
                 elif sub == SubID.TRADE:
-                    self.fields.append((Field.MsgSeqNum, parent.tseq))
+                    self.seq_num = parent.tseq
                     parent.tseq += 1
-                self.fields.append((Field.SendingTime, get_time()))
+                self.sending_time = sending_time()
             else:
                 self.origin = False
 
+        def header_fields(self) -> List[Tuple[Field, Any]]:
+            """Get the header fields, as they will be encoded."""
+            if not self.origin:
+                return []
+            return [
+                (Field.BeginString, "FIX.4.4"),
+                (Field.MsgType, self.msg_type),
+                (Field.SenderCompID, self.encoder.sender_comp_id),
+                (Field.SenderSubID, self.sub),
+                (Field.TargetCompID, "CSERVER"),
+                (Field.TargetSubID, self.sub),
+                (Field.MsgSeqNum, self.seq_num),
+                (Field.SendingTime, self.sending_time.decode()),
+            ]
+
         def __getitem__(self, item: int) -> Any:
             """Get ite if found in the list of fields."""
             for k, v in self.fields:
                 if k == item:
                     return v
+            for k, v in self.header_fields():
+                if k == item:
+                    return v
             return None
 
         def __setitem__(self, key: Field, value: Any) -> None:
             """Set item by appending to the list of fields."""
             self.fields.append((key, value))
 
-        def get_repeating_groups(
-            self,
-            count_key: int,
-            repeating_start: int,
-            repeating_end: Optional[int] = None,
-        ) -> List[Dict[int, Any]]:
-            """Get repeating groups."""
-            count = None
-            result: List[Any] = []
-            item: Dict[int, Any] = {}
-            for k, v in self.fields[8:]:
-                if count == 0:
-                    return result
-                if count is None:
-                    if k == count_key:
-                        count = int(v)
-                    continue
-                if (k == repeating_start and len(item) > 0) or k == repeating_end:
-                    result.append(item)
-                    item = {}
-                    count -= 1
-                item[k] = v
-            result.append(item)
-            return result
-
         def __bytes__(self) -> bytes:
             """Get bytes."""
-            data = bytearray()
-            for k, v in self.fields:
-                data.extend(b"%b=%b\x01" % (str(k.value).encode(), str(v).encode()))
-            if self.origin:
-                data[12:13] = b"%d" % (len(data) - 14)
-                cksm = sum(data) % 256
-                data.extend(b"10=%03d\x01" % cksm)
-            return bytes(data)
+            body = encode_fields(self.fields)
+            if not self.origin:
+                return body
+            return self.encoder.encode(
+                self.msg_type.encode(), self.seq_num, body, self.sending_time
+            )
 
         def __str__(self) -> str:
             """Get string."""
-            data = ""
-            for k, v in self.fields:
-                data += "%s=%s|" % (str(k.value), str(v))
-            if self.origin:
-                data = data[:12] + "%d" % (len(data) - 14) + data[13:]
-                cksm = sum(data.replace("|", "\x01").encode()) % 256
-                data += "10=%03d|" % cksm
-            return data
+            return bytes(self).decode().replace("\x01", "|")
 
         def __repr__(self) -> str:
             """Retrun representation to print nicely as a string."""
-            return pformat([(k.name, v) for k, v in self.fields])
+            return pformat([(k.name, v) for k, v in self.header_fields() + self.fields])
 
     def __init__(
         self,
@@ -242,157 +373,244 @@ class FIX:
         position_list_callback,
         order_list_callback,
         update_fix_status=None,
+        loop: Optional[FIXLoop] = None,
+        sec_list_cache_dir: Optional[str] = None,
+        reconcile_interval: float = 60.0,
+        quote_port: int = 5201,
+        trade_port: int = 5202,
     ) -> None:
-        """Init of class FIX."""
+        """Init of class FIX.
+
+        The sockets and heartbeats are served by loop, by default the loop shared
+        by all the sessions of the process. The constructor waits for the
+        logon and the security list, so it must not be called from a callback
+        run by the loop.
+
+        If sec_list_cache_dir is given, the security list saved there at the
+        previous start is used right away, and the one from the server is only
+        applied as a diff when it arrives.
+
+        The execution reports are applied to the positions and orders as they
+        arrive. The snapshots of both are only requested at logon, every
+        reconcile_interval seconds and after a gap in the trade sequence.
+
+        The messages are queued per stream and written together: at the end of
+        the loop tick when sent from the loop, at the end of batch() when sent
+        inside one, and right away otherwise.
+        """
         try:
+            self.loop = loop if loop is not None else FIXLoop.default()
             # quotes
             self.qstream = Buffer()
             self.qs = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.qs.connect((server, 5201))
+            self.qs.connect((server, quote_port))
             # trades
             self.tstream = Buffer()
             self.ts = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.ts.connect((server, 5202))
+            self.ts.connect((server, trade_port))
             # common to both quotes and trades
             self.broker = broker
             self.login = login
             self.password = password
             self.currency = currency
             self.client_id = client_id
+            # the static part of the header is encoded once per stream
+            sender_comp_id = broker + "." + login
+            self.encoders = {
+                sub: HeaderEncoder(sender_comp_id, "CSERVER", str(sub), str(sub))
+                for sub in SubID
+            }
             #
             self.qseq = 1
             self.tseq = 1
             self.qtest_seq = 1
             self.ttest_seq = 1
             self.market_seq = 1
-            self.subscribed_symbol = [-1, -1, -1]
-            self.qworker_thread = threading.Thread(target=self.qworker)
-            self.qworker_thread.start()
-            self.tworker_thread = threading.Thread(target=self.tworker)
-            self.tworker_thread.start()
-            self.ping_qworker_thread: Optional[threading.Thread] = None
-            self.ping_tworker_thread: Optional[threading.Thread] = None
+            # spots (top of the book) and depths subscribed to, by owner
+            self.spot_subscriptions = Subscriptions(self.spot_request)
+            self.depth_subscriptions = Subscriptions(self.depth_request)
+            self.subscriptions_scheduled = False
+            # encoded messages waiting to be written, per stream
+            self.send_queues: Dict[SubID, List[bytes]] = {sub: [] for sub in SubID}
+            self.send_lock = threading.Lock()
+            self.batch_depth = 0
+            self.flush_scheduled = False
+            # OrderMassCancelRequest (35=q) until the server rejects it
+            self.mass_cancel_supported = True
+            # scope (symbol, side) of the mass cancels sent, by ClOrdID
+            self.mass_cancels: Dict[str, Tuple[Optional[str], Optional[Side]]] = {}
+            self.loop.add_reader(self.qs, self.qworker)
+            self.loop.add_reader(self.ts, self.tworker)
+            self.ping_qworker_timer: Optional[Timer] = None
+            self.ping_tworker_timer: Optional[Timer] = None
             self.sec_list_callback = None
             self.market_callback = None
+            # called with the top of the book of each quote received
+            self.quote_listeners: List[QuoteListener] = []
             self.sec_id_table = {}
             self.sec_name_table = {}
             self.position_list_callback = position_list_callback
             self.order_list_callback = order_list_callback
             self.update_fix_status = update_fix_status
-            self.market_data = {}
+            # depth of the symbols subscribed to with market_request, by name
+            self.market_data: Dict[str, OrderBook] = {}
             self.position_list = {}
-            self.spot_request_list = set()
             self.spot_price_list = {}
             self.base_convert_request_list = set()
             self.base_convert_list = {}
             self.order_list = {}
-            self.origin_to_pos_id = {}
-            self.origin_to_ord_id = {}
+            # snapshots of positions and orders being received, None otherwise
+            self.position_snapshot: Optional[Dict[str, Dict[str, Any]]] = None
+            self.order_snapshot: Optional[Dict[str, Dict[str, Any]]] = None
+            # CumQty already applied of the orders partially filled
+            self.filled_qty: Dict[str, float] = {}
+            self.reconcile_interval = reconcile_interval
+            self.reconcile_timer: Optional[Timer] = None
+            self.trecv_seq = 1
+            # ClOrdID, PosMaintRptID and OrderID of our orders, shared with CTrader
+            self.index = OrderIndex()
+            # fills awaited by ClOrdID, resolved with the position id
+            self.fills: Dict[str, Future] = {}
             self.logged = False
-            self.logon()
+            self.trade_logged = False
+            self.logon_evt = threading.Event()
             self.sec_list_evt = threading.Event()
-            self.thread_sec_list = threading.Thread(target=self.sec_list)
-            self.thread_sec_list.start()
+            self.sec_list_ready = False
+            self.sec_list_cache = (
+                SecurityListCache(sec_list_cache_dir, broker, server)
+                if sec_list_cache_dir
+                else None
+            )
+            cached_sec_list = (
+                self.sec_list_cache.load() if self.sec_list_cache else None
+            )
+            if cached_sec_list:
+                apply_sec_list_diff(
+                    self.sec_id_table, self.sec_name_table, cached_sec_list
+                )
+                self.sec_list_ready = True
+                self.sec_list_evt.set()
+            self.logon()
+            # with a cached security list this is a refresh in the background
+            self.sec_list()
+            self.logon_evt.wait()
             self.sec_list_evt.wait()
         except Exception as e:
             # Code to handle the exception
             logging.error(f"{e}")
 
     def qworker(self) -> None:
-        """Quote worker."""
-        while True:
-            try:
-                data = self.qs.recv(65535)
-            except Exception as e:
-                logging.info(e)
-                break
-            if len(data) == 0:
-                logging.info("Quote Logged out")
-                break
-            try:
-                self.qstream.write(data)
-                self.parse_quote_message()
-            except Exception as e:
-                logging.info(f"Market is Closed or Disconnected {e}")
-                break
+        """Quote worker, called by the loop when the quote socket has data."""
+        try:
+            data = self.qs.recv(65535)
+        except Exception as e:
+            logging.info(e)
+            self.stop_worker(self.qs)
+            return
+        if len(data) == 0:
+            logging.info("Quote Logged out")
+            self.stop_worker(self.qs)
+            return
+        try:
+            self.qstream.write(data)
+            self.parse_quote_message()
+        except Exception as e:
+            logging.info(f"Market is Closed or Disconnected {e}")
+            self.stop_worker(self.qs)
 
     def tworker(self) -> None:
-        """Trade worker."""
-        while True:
-            try:
-                data = self.ts.recv(65535)
-            except Exception as e:
-                logging.info(e)
-                break
-            logging.info("B")
-            logging.info(f"data={data}")
-            logging.info("C")
-            if len(data) == 0:
-                logging.info("Trade Logged out")
-                break
-            logging.info("C")
-            try:
-                logging.info("D")
-                self.tstream.write(data)
-                logging.info("E")
-                self.parse_trade_message()
-                logging.info("F")
-            except Exception as e:
-                logging.info(f"Market is Closed or Logged out {e}")
-                break
+        """Trade worker, called by the loop when the trade socket has data."""
+        try:
+            data = self.ts.recv(65535)
+        except Exception as e:
+            logging.info(e)
+            self.stop_worker(self.ts)
+            return
+        logging.info(f"data={data}")
+        if len(data) == 0:
+            logging.info("Trade Logged out")
+            self.stop_worker(self.ts)
+            return
+        try:
+            self.tstream.write(data)
+            self.parse_trade_message()
+        except Exception as e:
+            logging.info(f"Market is Closed or Logged out {e}")
+            self.stop_worker(self.ts)
+
+    def stop_worker(self, sock: socket.socket) -> None:
+        """Stop reading from a socket and close it, its heartbeat stops as well."""
+        self.loop.remove_reader(sock)
+        sock.close()
+        if sock is self.qs:
+            self.logged = False
+        else:
+            self.trade_logged = False
+            # no execution report can arrive anymore for the orders sent
+            fills, self.fills = self.fills, {}
+            for fill in fills.values():
+                if not fill.done():
+                    fill.set_exception(ConnectionError("Trade stream closed"))
+        # do not leave the constructor waiting for a session that is gone
+        self.logon_evt.set()
+        self.sec_list_evt.set()
+
+    def is_alive(self) -> bool:
+        """Check both streams are logged on and their sockets still open."""
+        return (
+            self.logged
+            and self.trade_logged
+            and self.qs.fileno() != -1
+            and self.ts.fileno() != -1
+        )
+
+    def close(self) -> None:
+        """Close both streams without logout, for a session that is not usable."""
+        for sock in (self.qs, self.ts):
+            if sock.fileno() != -1:
+                self.stop_worker(sock)
 
     def parse_quote_message(self) -> None:
         """Parse quote message."""
-        while len(self.qstream) > 0:
-            match = re.search(rb"10=\d{3}\x01", self.qstream.peek(self.qstream.count()))
-            if match:
-                msg = FIX.Message()
-                data = self.qstream.read(match.span()[1]).split(b"\x01")[:-1]
-                for part in data:
-                    tag, value = part.split(b"=", 1)
-                    msg[Field(int(tag.decode()))] = value.decode()
-                logging.debug("\033[32mRECV <<< %s\033[0m" % msg)
-                self.process_message(msg)
-            else:
-                break
+        for frame in self.qstream.frames():
+            msg = ReceivedMessage(frame)
+            logging.debug("\033[32mRECV <<< %s\033[0m", msg)
+            self.process_message(msg)
 
     def parse_trade_message(self) -> None:
         """Parse trade message."""
         logging.info(f"Start parse_trade_message")
-        while len(self.tstream) > 0:
-            match = re.search(rb"10=\d{3}\x01", self.tstream.peek(self.tstream.count()))
-            if match:
-                msg = FIX.Message()
-                data = self.tstream.read(match.span()[1]).split(b"\x01")[:-1]
-                for part in data:
-                    tag, value = part.split(b"=", 1)
-                    msg[Field(int(tag.decode()))] = value.decode()
-                logging.info("\033[92mRECV <<< %s\033[0m" % msg)
-                self.process_message(msg)
-            else:
-                break
-
-    def ping_qworker(self, interval: int) -> None:
-        """Ping quote worker."""
-        while True:
-            if self.qs._closed:
-                break
-            self.qheartbeat()
-            time.sleep(interval)
+        for frame in self.tstream.frames():
+            msg = ReceivedMessage(frame)
+            logging.info("\033[92mRECV <<< %s\033[0m", msg)
+            seq_num = int(msg[Field.MsgSeqNum])
+            gap = seq_num > self.trecv_seq
+            self.trecv_seq = seq_num + 1
+            self.process_message(msg)
+            if gap:
+                # an execution report may be missing, the deltas cannot be trusted
+                logging.warning(f"Trade sequence gap before {seq_num}, reconciling")
+                self.reconcile()
+
+    def ping_qworker(self) -> None:
+        """Ping quote worker, called by the loop every HeartBtInt."""
+        if self.qs._closed:
+            self.ping_qworker_timer.cancel()
+            return
+        self.qheartbeat()
 
-    def ping_tworker(self, interval: int) -> None:
-        """Ping trade worker."""
-        while True:
-            if self.ts._closed:
-                break
-            self.theartbeat()
-            time.sleep(interval)
+    def ping_tworker(self) -> None:
+        """Ping trade worker, called by the loop every HeartBtInt."""
+        if self.ts._closed:
+            self.ping_tworker_timer.cancel()
+            return
+        self.theartbeat()
 
     def process_ping(self, msg: str) -> None:
         """Process ping."""
         pass
 
-    def process_test(self, msg: Message) -> None:
+    def process_test(self, msg: ReceivedMessage) -> None:
         """Process test."""
         # print(f"process_test, msg={msg}")
         if msg[Field.SenderSubID] == "QUOTE":
@@ -400,76 +618,176 @@ class FIX:
         elif msg[Field.SenderSubID] == "TRADE":
             self.theartbeat(msg[Field.TestReqID])
 
-    def process_logout(self, msg: Message) -> None:
+    def process_logout(self, msg: ReceivedMessage) -> None:
         """Process logout."""
         # print(f"process_logout, msg={msg}")
         if not msg[Field.Text]:
             self.logged = False
-        self.update_fix_status(self.client_id, self.logged)
-
-    def process_exec_report(self, msg: Message) -> None:
-        """Process exec report."""
-        # print(f"process_exec_report, msg={msg}")
-        if msg[Field.ExecType] == "F":
-            self.position_list = {}
-            self.position_request()
-            self.order_list = {}
-            self.origin_to_pos_id[msg[Field.ClOrdId]] = msg[Field.PosMaintRptID]
-            self.order_request()
-        elif msg[Field.ExecType] in ["0", "4", "5", "C"]:
-            self.order_list = {}
-            self.order_request()
-        elif msg[Field.ExecType] == "I":
-            name = self.sec_id_table[int(msg[Field.Symbol])]["name"]
-            self.order_list[msg[Field.OrderID]] = {
-                "name": name,
-                "side": Side(int(msg[Field.Side])),
-                "amount": float(msg[Field.LeavesQty]),
-                "type": int(msg[Field.OrdType]),
-                "pos_id": msg[Field.PosMaintRptID],
-                "digits": self.sec_id_table[int(msg[Field.Symbol])]["digits"],
-                "clid": msg[Field.ClOrdId],
-            }
-
-            if int(msg[Field.OrdType]) == 1:
-                self.origin_to_pos_id[msg[Field.ClOrdId]] = msg[Field.PosMaintRptID]
-            else:
-                if msg[Field.ClOrdId] not in self.origin_to_ord_id:
-                    self.origin_to_ord_id[msg[Field.ClOrdId]] = []
-                if msg[Field.OrderID] not in self.origin_to_ord_id[msg[Field.ClOrdId]]:
-                    self.origin_to_ord_id[msg[Field.ClOrdId]].append(msg[Field.OrderID])
-
+        if self.update_fix_status:
+            self.update_fix_status(self.client_id, self.logged)
+
+    def process_exec_report(self, msg: ReceivedMessage) -> None:
+        """Process exec report, applied as a change to the positions and orders."""
+        exec_type = msg[Field.ExecType]
+        if exec_type == "I":
+            self.process_order_status(msg)
+            return
+        order_id = msg[Field.OrderID]
+        if exec_type == "F":
+            fill = self.fills.pop(msg[Field.ClOrdId], None)
+            if fill is not None and not fill.done():
+                fill.set_result(msg[Field.PosMaintRptID])
+            self.apply_fill(msg)
+            self.position_list_callback(self.position_list, self.spot_price_list)
+        elif exec_type == "8":
+            fill = self.fills.pop(msg[Field.ClOrdId], None)
+            if fill is not None and not fill.done():
+                fill.set_exception(RuntimeError(f"Order rejected: {msg[Field.Text]}"))
+            self.remove_order(order_id)
+        elif exec_type in ["0", "5"]:
+            # new or replaced, only the pending orders are kept in the list
             if int(msg[Field.OrdType]) > 1:
-                price = msg[Field.Price]
-                if price:
-                    self.order_list[msg[Field.OrderID]]["price"] = float(price)
-                else:
-                    self.order_list[msg[Field.OrderID]]["price"] = float(
-                        msg[Field.StopPx]
-                    )
-            if name not in self.spot_request_list:
-                self.spot_market_request(name)
-                logging.info("AAAAA")
-            self.order_list_callback(self.order_list, self.spot_price_list)
+                self.order_list[order_id] = self.new_order(msg)
+                self.index.link_order(msg[Field.ClOrdId], order_id)
+        elif exec_type in ["4", "C"]:
+            # cancelled or expired
+            self.remove_order(order_id)
+        self.order_list_callback(self.order_list, self.spot_price_list)
+
+    def apply_fill(self, msg: ReceivedMessage) -> None:
+        """Apply a fill, or a partial fill, to its order and its position."""
+        order_id = msg[Field.OrderID]
+        cum_qty = float(msg[Field.CumQty] or 0)
+        # CumQty is the total of the order, the fill is what was not seen yet
+        qty = cum_qty - self.filled_qty.pop(order_id, 0.0)
+        if float(msg[Field.LeavesQty] or 0) > 0:
+            self.filled_qty[order_id] = cum_qty
+            if order_id in self.order_list:
+                self.order_list[order_id]["amount"] = float(msg[Field.LeavesQty])
+        else:
+            self.remove_order(order_id)
+        if qty <= 0:
+            return
+        pos_id = msg[Field.PosMaintRptID]
+        # the price of this fill, AvgPx is the average of all the fills of the order
+        price = float(msg[Field.LastPx] or 0)
+        signed_qty = qty if int(msg[Field.Side]) == Side.Buy else -qty
+        position = self.position_list.get(pos_id)
+        if position is None:
+            self.position_list[pos_id] = self.new_position(
+                pos_id,
+                int(msg[Field.Symbol]),
+                max(signed_qty, 0.0),
+                max(-signed_qty, 0.0),
+                price,
+            )
+            self.index.link_position(msg[Field.ClOrdId], pos_id)
+            self.position_list[pos_id]["clid"] = msg[Field.ClOrdId]
+            return
+        net = position["long"] - position["short"]
+        new_net = net + signed_qty
+        if abs(new_net) < 1e-9:
+            del self.position_list[pos_id]
+            self.index.remove_position(pos_id)
+            self.release_spots(("position", pos_id))
+            return
+        if net * signed_qty > 0:
+            # increased, the price is the average of the two
+            position["price"] = (abs(net) * position["price"] + qty * price) / abs(
+                new_net
+            )
+        position["long"] = max(new_net, 0.0)
+        position["short"] = max(-new_net, 0.0)
+
+    def remove_order(self, order_id: str) -> None:
+        """Remove an order that is not pending anymore."""
+        self.order_list.pop(order_id, None)
+        self.filled_qty.pop(order_id, None)
+        self.index.remove_order(order_id)
+        self.release_spots(("order", order_id))
+
+    def new_order(self, msg: ReceivedMessage) -> Dict[str, Any]:
+        """Build a pending order from an execution report."""
+        symbol = self.sec_id_table[int(msg[Field.Symbol])]
+        order = {
+            "name": symbol["name"],
+            "side": Side(int(msg[Field.Side])),
+            "amount": float(msg[Field.LeavesQty]),
+            "type": int(msg[Field.OrdType]),
+            "pos_id": msg[Field.PosMaintRptID],
+            "digits": symbol["digits"],
+            "clid": msg[Field.ClOrdId],
+        }
+        if order["type"] > 1:
+            price = msg[Field.Price]
+            order["price"] = float(price) if price else float(msg[Field.StopPx])
+        self.hold_spots(("order", msg[Field.OrderID]), symbol["name"])
+        return order
+
+    def process_order_status(self, msg: ReceivedMessage) -> None:
+        """Process one order of the snapshot of the orders (ExecType=I)."""
+        if self.order_snapshot is None:
+            self.order_snapshot = {}
+        self.order_snapshot[msg[Field.OrderID]] = self.new_order(msg)
+        if int(msg[Field.OrdType]) == 1:
+            self.index.link_position(msg[Field.ClOrdId], msg[Field.PosMaintRptID])
+        else:
+            self.index.link_order(msg[Field.ClOrdId], msg[Field.OrderID])
+        if len(self.order_snapshot) >= int(msg[Field.TotNumReports] or 1):
+            self.replace_orders(self.order_snapshot)
+
+    def replace_orders(self, orders: Dict[str, Dict[str, Any]]) -> None:
+        """Replace all the orders with a complete snapshot."""
+        self.order_snapshot = None
+        for order_id in [k for k in self.order_list if k not in orders]:
+            self.remove_order(order_id)
+        self.order_list.update(orders)
+        self.order_list_callback(self.order_list, self.spot_price_list)
+
+    def reconcile(self) -> None:
+        """Request the snapshots of positions and orders, to correct the state."""
+        if not self.sec_list_ready or not self.trade_logged:
+            return
+        self.position_snapshot = None
+        self.order_snapshot = None
+        self.position_request()
+        self.order_request()
+
+    def reconcile_tworker(self) -> None:
+        """Reconcile the trade state, called by the loop every reconcile_interval."""
+        if self.ts._closed:
+            self.reconcile_timer.cancel()
+            return
+        self.reconcile()
 
-    def process_logon(self, msg: Message) -> None:
+    def process_logon(self, msg: ReceivedMessage) -> None:
         """Process logon."""
         # print(f"process_logon, msg={msg}")
         if msg[Field.SenderSubID] == "QUOTE":
             logging.info("Quote logged on")
-            self.ping_qworker_thread = threading.Thread(
-                target=self.ping_qworker, args=[int(msg[Field.HeartBtInt])]
+            self.ping_qworker_timer = self.loop.call_every(
+                int(msg[Field.HeartBtInt]), self.ping_qworker
             )
-            self.ping_qworker_thread.start()
             self.logged = True
+            # the subscriptions held before the logon, or of the previous session
+            self.spot_subscriptions.resubscribe()
+            self.depth_subscriptions.resubscribe()
         elif msg[Field.SenderSubID] == "TRADE":
             logging.info("Trade logged on")
-            self.ping_tworker_thread = threading.Thread(
-                target=self.ping_tworker, args=[int(msg[Field.HeartBtInt])]
+            self.ping_tworker_timer = self.loop.call_every(
+                int(msg[Field.HeartBtInt]), self.ping_tworker
+            )
+            self.trade_logged = True
+            self.trecv_seq = int(msg[Field.MsgSeqNum]) + 1
+            self.reconcile_timer = self.loop.call_every(
+                self.reconcile_interval, self.reconcile_tworker
             )
-            self.ping_tworker_thread.start()
+            # with the symbols known from the cache, no need to wait for the list
+            self.reconcile()
+        if self.logged and self.trade_logged:
+            self.logon_evt.set()
 
-    def process_market_data(self, msg: Message) -> None:
+    def process_market_data(self, msg: ReceivedMessage) -> None:
         # print(f"process_market_data, msg={msg}")
         """Process market data."""
         name = self.sec_id_table[int(msg[Field.Symbol])]["name"]
@@ -482,84 +800,93 @@ class FIX:
                 self.spot_price_list[name][
                     "bid" if e[Field.MDEntryType] == "0" else "ask"
                 ] = float(e[Field.MDEntryPx])
-            self.position_list_callback(self.position_list, self.spot_price_list)
-            self.order_list_callback(self.order_list, self.spot_price_list)
+            # the P&L of the positions is kept current by a quote listener
+            if self.quote_listeners:
+                quote = self.spot_price_list[name]
+                self.notify_quote(name, quote.get("bid", 0.0), quote.get("ask", 0.0))
             return
-        self.market_data[name] = {}
+        book = self.market_data.get(name)
+        if book is None:
+            book = self.market_data[name] = OrderBook(digits)
+        book.clear()
         for e in entries:
-            eid = e[Field.MDEntryID]
-            self.market_data[name][eid] = {
-                "type": int(e[Field.MDEntryType]),
-                "price": float(e[Field.MDEntryPx]),
-                "size": float(e[Field.MDEntrySize]),
-            }
+            book.add(
+                e[Field.MDEntryID],
+                int(e[Field.MDEntryType]),
+                float(e[Field.MDEntryPx]),
+                float(e[Field.MDEntrySize]),
+            )
         # logging.debug(pformat(msg))
-        self.market_callback(name, digits, self.market_data[name])
+        if self.quote_listeners:
+            self.notify_quote(name, *book.top())
+        self.market_callback(name, digits, book)
 
-    def process_market_incr_data(self, msg: Message) -> None:
+    def process_market_incr_data(self, msg: ReceivedMessage) -> None:
         """Process market incr data."""
         name = self.sec_id_table[int(msg[Field.Symbol])]["name"]
         digits = self.sec_id_table[int(msg[Field.Symbol])]["digits"]
         entries = msg.get_repeating_groups(Field.NoMDEntries, Field.MDUpdateAction)
+        book = self.market_data[name]
         for e in entries:
             if e[Field.MDUpdateAction] == "2":
-                del self.market_data[name][e[Field.MDEntryID]]
+                book.remove(e[Field.MDEntryID])
             elif e[Field.MDUpdateAction] == "0":
-                eid = e[Field.MDEntryID]
-                self.market_data[name][eid] = {
-                    "type": int(e[Field.MDEntryType]),
-                    "price": float(e[Field.MDEntryPx]),
-                    "size": float(e[Field.MDEntrySize]),
-                }
+                book.add(
+                    e[Field.MDEntryID],
+                    int(e[Field.MDEntryType]),
+                    float(e[Field.MDEntryPx]),
+                    float(e[Field.MDEntrySize]),
+                )
         # logging.debug(pformat(msg))
-        self.market_callback(name, digits, self.market_data[name])
+        if self.quote_listeners:
+            self.notify_quote(name, *book.top())
+        self.market_callback(name, digits, book)
 
-    def process_sec_list(self, msg: Message) -> None:
+    def process_sec_list(self, msg: ReceivedMessage) -> None:
         """Process sec list."""
         sec_list = msg.get_repeating_groups(Field.NoRelatedSym, Field.Symbol)
-        for symbol in sec_list:
-            self.sec_id_table[int(symbol[Field.Symbol])] = {
+        fresh = {
+            int(symbol[Field.Symbol]): {
                 "name": symbol[Field.SymbolName],
                 "digits": int(symbol[Field.SymbolDigits]),
             }
-            self.sec_name_table[symbol[Field.SymbolName]] = {
-                "id": int(symbol[Field.Symbol]),
-                "digits": int(symbol[Field.SymbolDigits]),
-            }
+            for symbol in sec_list
+        }
+        added, changed, removed = apply_sec_list_diff(
+            self.sec_id_table, self.sec_name_table, fresh
+        )
+        logging.info(
+            f"Security list: {added} symbols added, {changed} changed, "
+            f"{removed} removed."
+        )
+        if self.sec_list_cache is not None and (added or changed or removed):
+            self.sec_list_cache.save(self.sec_id_table)
         if self.sec_list_callback is not None:
             self.sec_list_callback()
-        self.position_request()
-        self.order_request()
+        if not self.sec_list_ready:
+            self.sec_list_ready = True
+            self.reconcile()
         self.sec_list_evt.set()
 
-    def get_origin_from_pos_id(self, pos_id):
+    def get_origin_from_pos_id(self, pos_id: str) -> Optional[str]:
         """Get origin from pos_id."""
-        logging.info("Start get_origin_from_pos_id")
-        logging.info(f"{self.origin_to_pos_id}")
-        keys = list(self.origin_to_pos_id.keys())
-        values = list(self.origin_to_pos_id.values())
-        if pos_id in values:
-            return keys[values.index(pos_id)]
-        else:
-            return None
-
-    def process_position_list(self, msg: Message) -> None:
-        """Process position list."""
-        if msg[Field.PosReqResult] == "2":
-            return
-        name = self.sec_id_table[int(msg[Field.Symbol])]["name"]
-        self.position_list[msg[Field.PosMaintRptID]] = {
-            "pos_id": msg[Field.PosMaintRptID],
+        return self.index.origin_of_position(pos_id)
+
+    def new_position(
+        self, pos_id: str, symbol_id: int, long: float, short: float, price: float
+    ) -> Dict[str, Any]:
+        """Build a position, and subscribe to the spots needed for its P&L."""
+        name = self.sec_id_table[symbol_id]["name"]
+        position = {
+            "pos_id": pos_id,
             "name": name,
-            "long": float(msg[Field.LongQty]),
-            "short": float(msg[Field.ShortQty]),
-            "price": float(msg[Field.SettlPrice]),
-            "digits": self.sec_id_table[int(msg[Field.Symbol])]["digits"],
-            "clid": self.get_origin_from_pos_id(msg[Field.PosMaintRptID]),
+            "long": long,
+            "short": short,
+            "price": price,
+            "digits": self.sec_id_table[symbol_id]["digits"],
+            "clid": self.get_origin_from_pos_id(pos_id),
         }
-
-        if name not in self.spot_request_list:
-            self.spot_market_request(name)
+        symbols = [name]
         base = name[-3:]
         if base != self.currency:
             pair = "%s%s" % (base, self.currency)
@@ -567,19 +894,63 @@ class FIX:
             if not self.sec_name_table.get(pair, None):
                 pair = "%s%s" % (self.currency, base)
                 conv_dir = 1
-            self.position_list[msg[Field.PosMaintRptID]]["convert"] = pair
-            self.position_list[msg[Field.PosMaintRptID]]["convert_dir"] = conv_dir
-            if pair not in self.spot_request_list:
-                self.spot_market_request(pair)
-        self.position_list_callback(
-            self.position_list, self.spot_price_list, self.client_id
+            position["convert"] = pair
+            position["convert_dir"] = conv_dir
+            symbols.append(pair)
+        self.hold_spots(("position", pos_id), *symbols)
+        return position
+
+    def process_position_list(self, msg: ReceivedMessage) -> None:
+        """Process one position of the snapshot of the positions."""
+        if msg[Field.PosReqResult] == "2":
+            # no position
+            self.replace_positions({})
+            return
+        if self.position_snapshot is None:
+            self.position_snapshot = {}
+        pos_id = msg[Field.PosMaintRptID]
+        self.position_snapshot[pos_id] = self.new_position(
+            pos_id,
+            int(msg[Field.Symbol]),
+            float(msg[Field.LongQty]),
+            float(msg[Field.ShortQty]),
+            float(msg[Field.SettlPrice]),
         )
-
-    def process_reject(self, msg: Message) -> None:
+        if len(self.position_snapshot) >= int(msg[Field.TotalNumPosReports] or 1):
+            self.replace_positions(self.position_snapshot)
+
+    def replace_positions(self, positions: Dict[str, Dict[str, Any]]) -> None:
+        """Replace all the positions with a complete snapshot."""
+        self.position_snapshot = None
+        for pos_id in [k for k in self.position_list if k not in positions]:
+            del self.position_list[pos_id]
+            self.index.remove_position(pos_id)
+            self.release_spots(("position", pos_id))
+        self.position_list.update(positions)
+        self.position_list_callback(self.position_list, self.spot_price_list)
+
+    def process_mass_cancel_report(self, msg: ReceivedMessage) -> None:
+        """Process the answer to an OrderMassCancelRequest."""
+        scope = self.mass_cancels.pop(msg[Field.ClOrdId], None)
+        if msg[Field.MassCancelResponse] == "0" and scope is not None:
+            # rejected, the orders are cancelled one by one, in one write
+            logging.info(f"Mass cancel rejected: {msg[Field.MassCancelRejectReason]}")
+            self.cancel_orders(self.orders_in_scope(*scope))
+
+    def process_reject(self, msg: ReceivedMessage) -> None:
         """Process reject."""
-        checkOrders = msg[Field.Text].split(":")[1]
+        if msg[Field.RefMsgType] == "q":
+            # the server does not know OrderMassCancelRequest
+            logging.info(f"Mass cancel not supported: {msg[Field.Text]}")
+            self.mass_cancel_supported = False
+            mass_cancels, self.mass_cancels = self.mass_cancels, {}
+            for symbol, side in mass_cancels.values():
+                self.cancel_orders(self.orders_in_scope(symbol, side))
+            return
+        checkOrders = (msg[Field.Text] or "").split(":")[-1]
         if checkOrders == "no orders found":
             logging.info("No Orders")
+            self.replace_orders({})
         else:
             logging.error(checkOrders)
 
@@ -596,32 +967,63 @@ class FIX:
         "X": process_market_incr_data,
         "y": process_sec_list,
         "AP": process_position_list,
+        "r": process_mass_cancel_report,
     }
 
-    def process_message(self, msg: Message) -> None:
+    def process_message(self, msg: ReceivedMessage) -> None:
         """Process message."""
         msg_type = msg[Field.MsgType]
         FIX.message_dispatch[msg_type](self, msg)
 
     def send_message(self, msg: Message) -> None:
-        """Send message."""
-        if msg[Field.TargetSubID] == SubID.QUOTE:
-            try:
-                self.qs.send(bytes(msg))
-                logging.debug("\033[36mSEND >>> %s\033[0m" % msg)
-            except Exception as e:
-                logging.debug(f"QUOTE send error: {e}. client_id: {self.client_id}")
-                self.qs.close()
-        elif msg[Field.TargetSubID] == SubID.TRADE:
-            try:
-                self.ts.send(bytes(msg))
-                logging.debug("\033[96mSEND >>> %s\033[0m" % msg)
-            except Exception as e:
-                logging.debug(
-                    f"TRADE send error: {e} Closing connection. "
-                    f"client_id:{self.client_id}"
-                )
-                self.ts.close()
+        """Send message, queued to be written with the others of the same tick."""
+        data = bytes(msg)
+        logging.debug("\033[36mSEND >>> %s\033[0m", data)
+        with self.send_lock:
+            self.send_queues[msg.sub].append(data)
+            if self.batch_depth:
+                return
+        if not self.loop.in_loop_thread():
+            self.flush()
+        elif not self.flush_scheduled:
+            # run after the other callbacks of this tick of the loop
+            self.flush_scheduled = True
+            self.loop.call_soon(self.flush)
+
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        """Hold the messages sent inside, and write them together at the end."""
+        with self.send_lock:
+            self.batch_depth += 1
+        try:
+            yield
+        finally:
+            with self.send_lock:
+                self.batch_depth -= 1
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the queued messages, one system call per stream."""
+        with self.send_lock:
+            self.flush_scheduled = False
+            if self.batch_depth:
+                return
+            for sub, sock in ((SubID.QUOTE, self.qs), (SubID.TRADE, self.ts)):
+                queue = self.send_queues[sub]
+                if not queue:
+                    continue
+                self.send_queues[sub] = []
+                try:
+                    sent = sock.sendmsg(queue)
+                    size = sum(len(data) for data in queue)
+                    if sent < size:
+                        sock.sendall(b"".join(queue)[sent:])
+                except Exception as e:
+                    logging.debug(
+                        f"{sub} send error: {e} Closing connection. "
+                        f"client_id:{self.client_id}"
+                    )
+                    self.stop_worker(sock)
 
     def qheartbeat(self, test_id: Optional[int] = None) -> None:
         """Quote heartbeat."""
@@ -664,6 +1066,16 @@ class FIX:
         msg[Field.Password] = self.password
         self.send_message(msg)
 
+    def expect_fill(self, cl_ord_id: str) -> Future:
+        """Get a future resolved with the position id when the order is filled.
+
+        To be called before sending the order with ClOrdID cl_ord_id, so that
+        a fill received right away is not missed.
+        """
+        fill: Future = Future()
+        self.fills[cl_ord_id] = fill
+        return fill
+
     def logout(self) -> None:
         """Logout."""
         msg = FIX.Message(SubID.QUOTE, "5", self)
@@ -671,53 +1083,107 @@ class FIX:
         msg = FIX.Message(SubID.TRADE, "5", self)
         self.send_message(msg)
 
+    def add_quote_listener(self, listener: QuoteListener) -> None:
+        """Call a listener with each quote received, like TickStore.append."""
+        self.quote_listeners.append(listener)
+
+    def notify_quote(
+        self, name: str, bid: float, ask: float, size: float = 0.0
+    ) -> None:
+        """Call the quote listeners, from the thread of the loop."""
+        now = time.time_ns()
+        for listener in self.quote_listeners:
+            try:
+                listener(name, now, bid, ask, size)
+            except Exception:
+                logging.exception("Quote listener failed for %s", name)
+
     def market_request(self, subid, symbol: str, callback) -> None:
-        """Market request."""
+        """Market request, the depth of a symbol in the slot subid."""
         if symbol not in self.sec_name_table.keys():
             logging.error("Symbol %s not found!" % symbol)
             return
+        self.market_callback = callback
+        if self.depth_subscriptions.hold(("slot", subid), symbol):
+            self.schedule_subscriptions()
+
+    def spot_market_request(self, *symbols: str) -> None:
+        """Spot market request, held until spot_market_release."""
+        flush = False
+        for symbol in symbols:
+            flush |= self.spot_subscriptions.hold(("user", symbol), symbol)
+        if flush:
+            self.schedule_subscriptions()
+
+    def spot_market_release(self, *symbols: str) -> None:
+        """Release the spots of spot_market_request, unsubscribed if not needed."""
+        flush = False
+        for symbol in symbols:
+            flush |= self.spot_subscriptions.release(("user", symbol))
+        if flush:
+            self.schedule_subscriptions()
+
+    def hold_spots(self, owner: Tuple[str, str], *symbols: str) -> None:
+        """Hold the spots needed by a position or an order."""
+        if self.spot_subscriptions.hold(owner, *symbols):
+            self.schedule_subscriptions()
+
+    def release_spots(self, owner: Tuple[str, str]) -> None:
+        """Release the spots of a position or an order removed."""
+        if self.spot_subscriptions.release(owner):
+            self.schedule_subscriptions()
+
+    def schedule_subscriptions(self) -> None:
+        """Send the changes of the subscriptions, with the others of the tick."""
+        if not self.loop.in_loop_thread():
+            self.flush_subscriptions()
+        elif not self.subscriptions_scheduled:
+            self.subscriptions_scheduled = True
+            self.loop.call_soon(self.flush_subscriptions)
+
+    def flush_subscriptions(self) -> None:
+        """Send the changes of the subscriptions, once logged on."""
+        self.subscriptions_scheduled = False
+        if not self.logged:
+            # all sent by process_logon
+            return
+        with self.batch():
+            self.spot_subscriptions.flush()
+            self.depth_subscriptions.flush()
+
+    def spot_request(self, symbols: List[str], subscribe: bool) -> None:
+        """Subscribe to or unsubscribe from the spots of symbols, in one request."""
+        self.market_data_request(symbols, subscribe, 1)
 
-        if self.subscribed_symbol[subid] != -1:
-            msg = FIX.Message(SubID.QUOTE, "V", self)
-            msg[Field.MDReqID] = self.market_seq
-            msg[Field.SubscriptionRequestType] = 2
-            msg[Field.MarketDepth] = 0
-            msg[Field.NoMDEntryTypes] = 2
-            msg[Field.MDEntryType] = 0
-            msg[Field.MDEntryType] = 1
-            msg[Field.NoRelatedSym] = 1
-            msg[Field.Symbol] = self.subscribed_symbol[subid]
-            self.send_message(msg)
-            self.market_seq += 1
+    def depth_request(self, symbols: List[str], subscribe: bool) -> None:
+        """Subscribe to or unsubscribe from the depths of symbols, in one request."""
+        self.market_data_request(symbols, subscribe, 0)
+
+    def market_data_request(
+        self, symbols: List[str], subscribe: bool, market_depth: int
+    ) -> None:
+        """MarketDataRequest of several symbols, by name."""
+        ids = []
+        for symbol in symbols:
+            if symbol in self.sec_name_table:
+                ids.append(self.sec_name_table[symbol]["id"])
+            else:
+                logging.error("Symbol %s not found!" % symbol)
+        if not ids:
+            return
         msg = FIX.Message(SubID.QUOTE, "V", self)
         msg[Field.MDReqID] = self.market_seq
-        msg[Field.SubscriptionRequestType] = 1
-        msg[Field.MarketDepth] = 0
+        msg[Field.SubscriptionRequestType] = 1 if subscribe else 2
+        msg[Field.MarketDepth] = market_depth
         msg[Field.NoMDEntryTypes] = 2
         msg[Field.MDEntryType] = 0
         msg[Field.MDEntryType] = 1
-        msg[Field.NoRelatedSym] = 1
-        msg[Field.Symbol] = self.sec_name_table[symbol]["id"]
-        self.subscribed_symbol[subid] = msg[Field.Symbol]
-        self.market_callback = callback
+        msg[Field.NoRelatedSym] = len(ids)
+        for symbol_id in ids:
+            msg[Field.Symbol] = symbol_id
         self.send_message(msg)
         self.market_seq += 1
 
-    def spot_market_request(self, symbol: str) -> None:
-        """Spot market request."""
-        msg = FIX.Message(SubID.QUOTE, "V", self)
-        msg[Field.MDReqID] = self.client_id
-        msg[Field.SubscriptionRequestType] = 1
-        msg[Field.MarketDepth] = 1
-        msg[Field.NoMDEntryTypes] = 2
-        msg[Field.MDEntryType] = 0
-        msg[Field.MDEntryType] = 1
-        msg[Field.NoRelatedSym] = 1
-        msg[Field.Symbol] = self.sec_name_table[symbol]["id"]
-        self.spot_request_list.add(symbol)
-        # print(f"msg={msg}")
-        self.send_message(msg)
-
     def position_request(self) -> None:
         """Position request."""
         msg = FIX.Message(SubID.TRADE, "AN", self)
@@ -777,14 +1243,11 @@ class FIX:
             return
 
         # remove referencia ao server ord_id da tabela de-para
-        for o, p in self.origin_to_pos_id.items():
-            if p == pos_id:
-                # cancela ordens de TP e SL se existirem
-                if o in self.origin_to_ord_id:
-                    for cl_id in self.origin_to_ord_id[o]:
-                        self.cancel_order(cl_id)
-                self.origin_to_pos_id.pop(o)
-                break
+        origin = self.index.remove_position(pos_id)
+        if origin is not None:
+            # cancela ordens de TP e SL se existirem
+            for order_id in self.index.orders(origin):
+                self.cancel_order(order_id)
 
         msg = FIX.Message(SubID.TRADE, "D", self)
         msg[Field.ClOrdId] = get_time()
@@ -804,10 +1267,27 @@ class FIX:
         msg[Field.OrdType] = OrderType.Market.value
         self.send_message(msg)
 
-    def close_all(self) -> None:
-        """Close all positions."""
-        for position in self.position_list:
-            self.close_position(position, None)
+    def positions_in_scope(
+        self, symbol: Optional[str] = None, side: Optional[Side] = None
+    ) -> List[str]:
+        """Ids of the positions of symbol and side, all if None."""
+        return [
+            pos_id
+            for pos_id, p in self.position_list.items()
+            if (symbol is None or p["name"] == symbol)
+            and (side is None or (Side.Buy if p["long"] > 0 else Side.Sell) == side)
+        ]
+
+    def close_all(
+        self, symbol: Optional[str] = None, side: Optional[Side] = None
+    ) -> None:
+        """Close all positions, or those of one symbol and/or side, in one write.
+
+        FIX has no message to close many positions, so one order is sent for each.
+        """
+        with self.batch():
+            for position in self.positions_in_scope(symbol, side):
+                self.close_position(position, None)
 
     def new_limit_order(
         self,
@@ -843,12 +1323,7 @@ class FIX:
     def cancel_order(self, clid: str) -> None:
         """Cancel order."""
         # remove referencia ao server ord_id da tabela de-para
-        for o, p in self.origin_to_ord_id.items():
-            if clid in p:
-                p.remove(clid)
-                if len(p) == 0:
-                    self.origin_to_ord_id.pop(o)
-                break
+        self.index.remove_order(clid)
 
         msg = FIX.Message(SubID.TRADE, "F", self)
         msg[Field.OrigClOrdID] = clid
@@ -856,7 +1331,44 @@ class FIX:
         msg[Field.ClOrdId] = clid
         self.send_message(msg)
 
-    def cancel_all(self) -> None:
-        """Cancel all orders."""
-        for order in self.order_list:
-            self.cancel_order(order)
+    def orders_in_scope(
+        self, symbol: Optional[str] = None, side: Optional[Side] = None
+    ) -> List[str]:
+        """Ids of the pending orders of symbol and side, all if None."""
+        return [
+            order_id
+            for order_id, o in self.order_list.items()
+            if (symbol is None or o["name"] == symbol)
+            and (side is None or o["side"] == side)
+        ]
+
+    def cancel_orders(self, order_ids: List[str]) -> None:
+        """Cancel orders one by one, in one write."""
+        with self.batch():
+            for order_id in order_ids:
+                self.cancel_order(order_id)
+
+    def cancel_all(
+        self, symbol: Optional[str] = None, side: Optional[Side] = None
+    ) -> None:
+        """Cancel all orders, or those of one symbol and/or side.
+
+        With one OrderMassCancelRequest, or if the server does not support it,
+        with one cancel per order written together.
+        """
+        if not self.mass_cancel_supported:
+            self.cancel_orders(self.orders_in_scope(symbol, side))
+            return
+        if symbol and symbol not in self.sec_name_table:
+            return
+        msg = FIX.Message(SubID.TRADE, "q", self)
+        msg[Field.ClOrdId] = "mc" + str(msg.seq_num)
+        # 1: the orders of one symbol, 7: all the orders
+        msg[Field.MassCancelRequestType] = 1 if symbol else 7
+        if symbol:
+            msg[Field.Symbol] = self.sec_name_table[symbol]["id"]
+        if side:
+            msg[Field.Side] = side.value
+        msg[Field.TransactTime] = get_time()
+        self.mass_cancels[msg[Field.ClOrdId]] = (symbol, side)
+        self.send_message(msg)
@@ -0,0 +1,192 @@
+"""Module for the event loop shared by the FIX sessions.
+
+One thread waits on the QUOTE and TRADE sockets of all the sessions with a
+selector, and runs the heartbeat timers, instead of one thread per socket
+and per heartbeat. All the messages received are processed on that thread,
+so the state of a session is only changed from one place.
+"""
+
+# python
+from collections import deque
+import heapq
+import itertools
+import logging
+import selectors
+import socket
+import threading
+import time
+from typing import Any, Callable, Deque, List, Optional, Tuple
+
+
+class Timer:
+    """Timer scheduled on the loop, run once or repeated every interval."""
+
+    __slots__ = ("when", "interval", "callback", "args", "cancelled")
+
+    def __init__(
+        self,
+        when: float,
+        interval: Optional[float],
+        callback: Callable[..., None],
+        args: Tuple[Any, ...],
+    ) -> None:
+        """Init."""
+        self.when = when
+        self.interval = interval
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self) -> None:
+        """Cancel, the timer will not run anymore."""
+        self.cancelled = True
+
+
+class FIXLoop:
+    """Single thread serving the sockets and the timers of many FIX sessions."""
+
+    _default: Optional["FIXLoop"] = None
+    _default_lock = threading.Lock()
+
+    @classmethod
+    def default(cls) -> "FIXLoop":
+        """Get the loop shared by all the sessions of the process, started."""
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls()
+                cls._default.start()
+            return cls._default
+
+    def __init__(self) -> None:
+        """Init."""
+        self.selector = selectors.DefaultSelector()
+        self._timers: List[Tuple[float, int, Timer]] = []
+        self._counter = itertools.count()
+        self._ready: Deque[Tuple[Callable[..., None], Tuple[Any, ...]]] = deque()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        # writing to this socket wakes up the select() from other threads
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self.selector.register(self._wake_r, selectors.EVENT_READ, self._drain_wake)
+
+    def start(self) -> None:
+        """Start the thread of the loop."""
+        self._thread = threading.Thread(target=self.run, name="FIXLoop", daemon=True)
+        self._thread.start()
+
+    def in_loop_thread(self) -> bool:
+        """Check if called from the thread of the loop."""
+        return threading.current_thread() is self._thread
+
+    def call_soon(self, callback: Callable[..., None], *args: Any) -> None:
+        """Run callback on the loop thread, as soon as possible."""
+        with self._lock:
+            self._ready.append((callback, args))
+        if not self.in_loop_thread():
+            self._wake()
+
+    def call_later(
+        self, delay: float, callback: Callable[..., None], *args: Any
+    ) -> Timer:
+        """Run callback on the loop thread once, after delay seconds."""
+        return self._schedule(Timer(time.monotonic() + delay, None, callback, args))
+
+    def call_every(
+        self, interval: float, callback: Callable[..., None], *args: Any
+    ) -> Timer:
+        """Run callback on the loop thread every interval seconds."""
+        return self._schedule(
+            Timer(time.monotonic() + interval, interval, callback, args)
+        )
+
+    def add_reader(self, sock: socket.socket, callback: Callable[[], None]) -> None:
+        """Call callback on the loop thread each time sock has data to read."""
+        if self.in_loop_thread():
+            self.selector.register(sock, selectors.EVENT_READ, callback)
+        else:
+            self.call_soon(self.add_reader, sock, callback)
+
+    def remove_reader(self, sock: socket.socket) -> None:
+        """Stop watching sock, to be done before closing it."""
+        if self.in_loop_thread():
+            try:
+                self.selector.unregister(sock)
+            except (KeyError, ValueError):
+                pass
+        else:
+            self.call_soon(self.remove_reader, sock)
+
+    def run(self) -> None:
+        """Run the loop forever."""
+        while True:
+            events = self.selector.select(self._timeout())
+            for key, _ in events:
+                self._run_callback(key.data, ())
+            self._run_timers()
+            self._run_ready()
+
+    def _schedule(self, timer: Timer) -> Timer:
+        """Add timer to the heap of timers."""
+        with self._lock:
+            heapq.heappush(self._timers, (timer.when, next(self._counter), timer))
+        if not self.in_loop_thread():
+            self._wake()
+        return timer
+
+    def _timeout(self) -> Optional[float]:
+        """Time to wait in select(), until the next timer or callback is due."""
+        with self._lock:
+            if self._ready:
+                return 0
+            if not self._timers:
+                return None
+            return max(0.0, self._timers[0][0] - time.monotonic())
+
+    def _run_timers(self) -> None:
+        """Run the timers that are due, and reschedule the repeated ones."""
+        now = time.monotonic()
+        due: List[Timer] = []
+        with self._lock:
+            while self._timers and self._timers[0][0] <= now:
+                due.append(heapq.heappop(self._timers)[2])
+        for timer in due:
+            if timer.cancelled:
+                continue
+            self._run_callback(timer.callback, timer.args)
+            if timer.interval is not None and not timer.cancelled:
+                timer.when += timer.interval
+                self._schedule(timer)
+
+    def _run_ready(self) -> None:
+        """Run the callbacks added with call_soon() so far."""
+        with self._lock:
+            ready, self._ready = self._ready, deque()
+        for callback, args in ready:
+            self._run_callback(callback, args)
+
+    def _run_callback(
+        self, callback: Callable[..., None], args: Tuple[Any, ...]
+    ) -> None:
+        """Run one callback, an exception must not stop the loop."""
+        try:
+            callback(*args)
+        except Exception as e:
+            logging.exception(f"FIXLoop callback {callback} failed: {e}")
+
+    def _wake(self) -> None:
+        """Wake up the loop thread from select()."""
+        try:
+            self._wake_w.send(b"\x00")
+        except BlockingIOError:
+            # the loop has already enough wake up bytes to read
+            pass
+
+    def _drain_wake(self) -> None:
+        """Read the wake up bytes."""
+        try:
+            while self._wake_r.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
@@ -0,0 +1,115 @@
+"""Module for the depth of the market of one symbol, as received by FIX.
+
+The entries of the depth (MDEntryID, side, price and size) are aggregated by
+price level, the prices as integer ticks of the digits of the symbol so that
+equal prices are the same level. The levels of each side are kept sorted in a
+list, found by binary search, so an entry is added or removed in O(log n)
+comparisons, and the best bid and ask are the ends of the lists, read in O(1).
+"""
+
+# python
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Tuple
+
+BID = 0
+ASK = 1
+
+
+class OrderBook:
+    """Entries of the depth of one symbol, aggregated by price level."""
+
+    def __init__(self, digits: int) -> None:
+        """Init with the number of digits of the prices of the symbol."""
+        self.digits = digits
+        self.scale = 10**digits
+        # MDEntryID to side, price in ticks and size
+        self.entries: Dict[str, Tuple[int, int, float]] = {}
+        # price in ticks to size and number of entries, per side
+        self.levels: Tuple[Dict[int, List[float]], Dict[int, List[float]]] = ({}, {})
+        # prices in ticks of the levels, ascending, per side
+        self.prices: Tuple[List[int], List[int]] = ([], [])
+
+    def __len__(self) -> int:
+        """Number of entries."""
+        return len(self.entries)
+
+    def add(self, entry_id: str, side: int, price: float, size: float) -> None:
+        """Add an entry, or replace the entry with the same MDEntryID."""
+        if entry_id in self.entries:
+            self.remove(entry_id)
+        tick = round(price * self.scale)
+        self.entries[entry_id] = (side, tick, size)
+        level = self.levels[side].get(tick)
+        if level is None:
+            self.levels[side][tick] = [size, 1]
+            insort(self.prices[side], tick)
+        else:
+            level[0] += size
+            level[1] += 1
+
+    def remove(self, entry_id: str) -> None:
+        """Remove an entry, if present."""
+        entry = self.entries.pop(entry_id, None)
+        if entry is None:
+            return
+        side, tick, size = entry
+        level = self.levels[side][tick]
+        level[1] -= 1
+        if level[1] == 0:
+            del self.levels[side][tick]
+            prices = self.prices[side]
+            del prices[bisect_left(prices, tick)]
+        else:
+            level[0] -= size
+
+    def clear(self) -> None:
+        """Remove all the entries, before a snapshot."""
+        self.entries.clear()
+        for side in (BID, ASK):
+            self.levels[side].clear()
+            self.prices[side].clear()
+
+    def best_bid(self) -> Optional[float]:
+        """Highest bid, None if there is none."""
+        bids = self.prices[BID]
+        return bids[-1] / self.scale if bids else None
+
+    def best_ask(self) -> Optional[float]:
+        """Lowest ask, None if there is none."""
+        asks = self.prices[ASK]
+        return asks[0] / self.scale if asks else None
+
+    def spread(self) -> Optional[float]:
+        """Best ask minus best bid, None if a side is empty."""
+        bids, asks = self.prices
+        if not bids or not asks:
+            return None
+        return (asks[0] - bids[-1]) / self.scale
+
+    def top(self) -> Tuple[float, float, float]:
+        """Best bid, best ask and the smaller of their sizes, 0.0 if not known."""
+        bids, asks = self.prices
+        bid = bids[-1] / self.scale if bids else 0.0
+        ask = asks[0] / self.scale if asks else 0.0
+        if not bids or not asks:
+            # one side is empty, no size can be traded on both
+            return bid, ask, 0.0
+        size = min(self.levels[BID][bids[-1]][0], self.levels[ASK][asks[0]][0])
+        return bid, ask, size
+
+    def size(self, side: int, price: float) -> float:
+        """Size of a price level, 0.0 if there is no such level."""
+        level = self.levels[side].get(round(price * self.scale))
+        return level[0] if level is not None else 0.0
+
+    def depth(
+        self, n: Optional[int] = None
+    ) -> Tuple[List[Tuple[float, float]], List[Tuple[float, float]]]:
+        """Price and size of the best n levels of each side, the best first."""
+        bids, asks = self.prices
+        top_bids = bids[::-1] if n is None else bids[: -n - 1 : -1]
+        top_asks = asks if n is None else asks[:n]
+        return (
+            [(tick / self.scale, self.levels[BID][tick][0]) for tick in top_bids],
+            [(tick / self.scale, self.levels[ASK][tick][0]) for tick in top_asks],
+        )
@@ -0,0 +1,91 @@
+"""Module for the index of the identities of the orders and positions of a session.
+
+An order sent by us is identified by its ClOrdID (the origin), the server then
+identifies the position it opens by PosMaintRptID and the pending orders (SL,
+TP, limit, stop) by OrderID. The index maps them in both directions with dicts,
+so each lookup is O(1), and it is updated from each execution report.
+"""
+
+# python
+from typing import Dict, List, Optional
+
+
+class OrderIndex:
+    """Origin to position, position to origin, origin to orders, order to origin."""
+
+    def __init__(self) -> None:
+        """Init."""
+        self.origin_to_pos: Dict[str, str] = {}
+        self.pos_to_origin: Dict[str, str] = {}
+        # the orders of one origin as a dict used as an ordered set
+        self.origin_to_orders: Dict[str, Dict[str, None]] = {}
+        self.order_to_origin: Dict[str, str] = {}
+
+    def link_position(self, origin: str, pos_id: str) -> None:
+        """Record that the order origin opened the position pos_id."""
+        old_pos_id = self.origin_to_pos.get(origin)
+        if old_pos_id == pos_id:
+            return
+        if old_pos_id is not None:
+            self.pos_to_origin.pop(old_pos_id, None)
+        old_origin = self.pos_to_origin.get(pos_id)
+        if old_origin is not None:
+            self.origin_to_pos.pop(old_origin, None)
+        self.origin_to_pos[origin] = pos_id
+        self.pos_to_origin[pos_id] = origin
+
+    def link_order(self, origin: str, order_id: str) -> None:
+        """Record that the pending order order_id belongs to origin."""
+        old_origin = self.order_to_origin.get(order_id)
+        if old_origin == origin:
+            return
+        if old_origin is not None:
+            self._unlink_order(old_origin, order_id)
+        self.origin_to_orders.setdefault(origin, {})[order_id] = None
+        self.order_to_origin[order_id] = origin
+
+    def position(self, origin: str) -> Optional[str]:
+        """Get the position opened by origin."""
+        return self.origin_to_pos.get(origin)
+
+    def origin_of_position(self, pos_id: str) -> Optional[str]:
+        """Get the origin of a position."""
+        return self.pos_to_origin.get(pos_id)
+
+    def orders(self, origin: str) -> List[str]:
+        """Get the pending orders of origin, in the order they were received."""
+        return list(self.origin_to_orders.get(origin, ()))
+
+    def origin_of_order(self, order_id: str) -> Optional[str]:
+        """Get the origin of a pending order."""
+        return self.order_to_origin.get(order_id)
+
+    def remove_position(self, pos_id: str) -> Optional[str]:
+        """Forget a position, return its origin."""
+        origin = self.pos_to_origin.pop(pos_id, None)
+        if origin is not None:
+            self.origin_to_pos.pop(origin, None)
+        return origin
+
+    def remove_order(self, order_id: str) -> Optional[str]:
+        """Forget a pending order, return its origin."""
+        origin = self.order_to_origin.pop(order_id, None)
+        if origin is not None:
+            self._unlink_order(origin, order_id)
+        return origin
+
+    def clear(self) -> None:
+        """Forget everything."""
+        self.origin_to_pos.clear()
+        self.pos_to_origin.clear()
+        self.origin_to_orders.clear()
+        self.order_to_origin.clear()
+
+    def _unlink_order(self, origin: str, order_id: str) -> None:
+        """Remove order_id from the orders of origin."""
+        orders = self.origin_to_orders.get(origin)
+        if orders is None:
+            return
+        orders.pop(order_id, None)
+        if not orders:
+            del self.origin_to_orders[origin]
@@ -0,0 +1,180 @@
+"""Module for the P&L of the positions of a session, kept current from the quotes.
+
+The positions are copied into NumPy arrays, one value per position, when they
+change, which is rare. A quote only stores its bid and ask, and marks its symbol
+as changed if a position needs it, as its symbol or as the pair converting its
+P&L to the currency of the account; a quote of any other symbol costs a lookup.
+When the rows are read, the positions of the symbols changed are recomputed
+together with NumPy, and only their rows are formatted again as strings.
+"""
+
+# python
+import threading
+from typing import Any, Dict, List, Optional, Set
+
+import numpy as np
+
+Row = Dict[str, Any]
+
+
+def float_format(fmt: str, num: float, force_sign: bool = True) -> str:
+    """Format a float as a string, with all its digits when it has more than fmt."""
+    return max(
+        ("{:+}" if force_sign else "{}").format(round(num, 6)),
+        fmt.format(num),
+        key=len,
+    )
+
+
+class PnLEngine:
+    """P&L of the positions, recomputed for the symbols quoted since the last read."""
+
+    def __init__(self) -> None:
+        """Init without positions."""
+        self.lock = threading.Lock()
+        # symbol to the index of its prices, 0 is the rate of no conversion
+        self.index: Dict[str, int] = {"": 0}
+        self.bids = np.array([1.0])
+        self.asks = np.array([1.0])
+        # the positions, by row
+        self.positions: List[Dict[str, Any]] = []
+        self.sign = np.zeros(0)
+        self.amount = np.zeros(0)
+        self.open = np.zeros(0)
+        self.symbol = np.zeros(0, np.int64)
+        self.convert = np.zeros(0, np.int64)
+        self.convert_dir = np.zeros(0, bool)
+        # price, difference, P&L and P&L in the currency of the account, by row
+        self.price = np.zeros(0)
+        self.diff = np.zeros(0)
+        self.pl = np.zeros(0)
+        self.gain = np.zeros(0)
+        # symbols needed by the positions, their indexes quoted since the last read
+        self.needed: Set[int] = set()
+        self.dirty: Set[int] = set()
+        # rows as strings, None when to be formatted again
+        self.rows_formatted: List[Optional[Row]] = []
+
+    def symbol_index(self, symbol: str) -> int:
+        """Index of the prices of a symbol, added with no price yet if new."""
+        i = self.index.get(symbol)
+        if i is None:
+            i = self.index[symbol] = len(self.bids)
+            self.bids = np.append(self.bids, np.nan)
+            self.asks = np.append(self.asks, np.nan)
+        return i
+
+    def set_positions(
+        self,
+        positions: Dict[str, Dict[str, Any]],
+        prices: Optional[Dict[str, Dict[str, float]]] = None,
+    ) -> None:
+        """Replace the positions, and the prices with the ones given, by symbol."""
+        with self.lock:
+            self.positions = list(positions.values())
+            n = len(self.positions)
+            self.sign = np.array(
+                [1.0 if p["long"] > 0 else -1.0 for p in self.positions]
+            )
+            self.amount = np.array(
+                [p["long"] if p["long"] > 0 else p["short"] for p in self.positions]
+            )
+            self.open = np.array([float(p["price"]) for p in self.positions])
+            self.symbol = np.array(
+                [self.symbol_index(p["name"]) for p in self.positions], np.int64
+            ).reshape(n)
+            self.convert = np.array(
+                [self.symbol_index(p.get("convert", "")) for p in self.positions],
+                np.int64,
+            ).reshape(n)
+            self.convert_dir = np.array(
+                [bool(p.get("convert_dir", 0)) for p in self.positions], bool
+            ).reshape(n)
+            self.needed = set(self.symbol.tolist()) | set(self.convert.tolist())
+            self.needed.discard(0)
+            for symbol, price in (prices or {}).items():
+                i = self.index.get(symbol)
+                if i is not None and "bid" in price and "ask" in price:
+                    self.bids[i] = price["bid"]
+                    self.asks[i] = price["ask"]
+            self.price = np.full(n, np.nan)
+            self.diff = np.full(n, np.nan)
+            self.pl = np.full(n, np.nan)
+            self.gain = np.full(n, np.nan)
+            self.rows_formatted = [None] * n
+            self.dirty = set(self.needed)
+
+    def update(
+        self, symbol: str, ts: int, bid: float, ask: float, size: float = 0.0
+    ) -> None:
+        """Store a quote, a quote listener of FIX."""
+        i = self.index.get(symbol)
+        if i is None or i not in self.needed or bid == 0.0 or ask == 0.0:
+            return
+        with self.lock:
+            self.bids[i] = bid
+            self.asks[i] = ask
+            self.dirty.add(i)
+
+    def recompute(self) -> None:
+        """Compute the P&L of the positions of the symbols quoted since the last time."""
+        if not self.dirty:
+            return
+        dirty = np.fromiter(self.dirty, np.int64, len(self.dirty))
+        self.dirty = set()
+        rows = np.flatnonzero(
+            np.isin(self.symbol, dirty) | np.isin(self.convert, dirty)
+        )
+        if len(rows) == 0:
+            return
+        symbol = self.symbol[rows]
+        sign = self.sign[rows]
+        # a buy is closed at the bid, a sell at the ask
+        price = np.where(sign > 0, self.bids[symbol], self.asks[symbol])
+        diff = (price - self.open[rows]) * sign
+        pl = self.amount[rows] * diff
+        # without a pair to convert, the position is quoted in the currency of the
+        # account: index 0, a rate of 1.0, and its gain is its P&L
+        convert = self.convert[rows]
+        with np.errstate(divide="ignore"):
+            rate = np.where(
+                self.convert_dir[rows], 1 / self.asks[convert], self.bids[convert]
+            )
+        self.price[rows] = price
+        self.diff[rows] = diff
+        self.pl[rows] = pl
+        self.gain[rows] = pl * rate
+        for row in rows.tolist():
+            self.rows_formatted[row] = None
+
+    def format_row(self, row: int) -> Row:
+        """Row of a position, with its prices and P&L as strings, empty if not known."""
+        p = self.positions[row]
+        digits = p["digits"]
+        row_formatted = {
+            "pos_id": p["pos_id"],
+            "name": p["name"],
+            "side": "Buy" if self.sign[row] > 0 else "Sell",
+            "amount": float(self.amount[row]),
+            "price": float_format("{:.%df}" % digits, p["price"], False),
+            "actual_price": "",
+            "diff": "",
+            "pl": "",
+            "gain": "",
+        }
+        if not np.isnan(self.price[row]):
+            row_formatted["actual_price"] = ("{:.%df}" % digits).format(self.price[row])
+            row_formatted["diff"] = float_format("{:+.%df}" % digits, self.diff[row])
+            row_formatted["pl"] = float_format("{:+.2f}", self.pl[row])
+        if not np.isnan(self.gain[row]):
+            row_formatted["gain"] = "{:+.2f}".format(round(self.gain[row], 2))
+        return row_formatted
+
+    def rows(self) -> List[Row]:
+        """Rows of all the positions, formatted again only for the ones changed."""
+        with self.lock:
+            self.recompute()
+            for row, row_formatted in enumerate(self.rows_formatted):
+                if row_formatted is None:
+                    self.rows_formatted[row] = self.format_row(row)
+            return list(self.rows_formatted)
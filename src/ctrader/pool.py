@@ -0,0 +1,157 @@
+"""Module for the pool of CTrader sessions kept logged on between orders.
+
+Logging on a session takes a few round trips (logon of QUOTE and TRADE, the
+security list, the positions and the orders), so it is done once per account
+and the session is reused by all the orders of that account. The sessions are
+kept alive by the heartbeats of FIX, and checked at an interval: a session that
+is not logged on anymore is closed and replaced in the background, so the next
+order finds a warm session.
+"""
+
+# python
+import logging
+import threading
+from typing import Dict, Optional, Set
+
+# our modules
+from configs.settings import SEC_LIST_CACHE_DIR
+from .ctrader import CTrader
+from .loop import FIXLoop, Timer
+
+
+class SessionPool:
+    """Logged on CTrader sessions, one per account."""
+
+    def __init__(
+        self,
+        server: str,
+        currency: str,
+        client_id: int = 1,
+        debug: bool = False,
+        sec_list_cache_dir: Optional[str] = SEC_LIST_CACHE_DIR,
+        health_check_interval: float = 10.0,
+        loop: Optional[FIXLoop] = None,
+    ) -> None:
+        """Init.
+
+        Args:
+            server ([str]): [an IP given by them]
+            currency ([str]): "EUR" or "USD"
+            client_id ([str]):[example 1 or trader-1 its comment on position label]
+            debug ([bool]): if true or false to add more logging info.
+            sec_list_cache_dir ([str]): folder of the saved security lists.
+            health_check_interval ([float]): seconds between two health checks.
+            loop ([FIXLoop]): loop running the health checks, the shared one by default.
+        """
+        self.server = server
+        self.currency = currency
+        self.client_id = client_id
+        self.debug = debug
+        self.sec_list_cache_dir = sec_list_cache_dir
+        self.sessions: Dict[str, CTrader] = {}
+        self.credentials: Dict[str, str] = {}
+        # one lock per account, so two accounts can log on at the same time
+        self.locks: Dict[str, threading.Lock] = {}
+        self.locks_lock = threading.Lock()
+        # accounts with a replacement running in the background
+        self.replacing: Set[str] = set()
+        self.loop = loop if loop is not None else FIXLoop.default()
+        self.health_timer: Optional[Timer] = self.loop.call_every(
+            health_check_interval, self.check_health
+        )
+
+    def get(self, account: str, password: str) -> CTrader:
+        """Get the logged on session of an account, logging on if needed.
+
+        Blocks while a new session logs on, so it must not be called from a
+        callback run by the loop.
+        """
+        with self.lock(account):
+            self.credentials[account] = password
+            api = self.sessions.get(account)
+            if api is None or not self.is_alive(api):
+                if api is not None:
+                    logging.info(f"Session of {account} is not alive, replacing it")
+                    self.close_session(api)
+                api = self.connect(account, password)
+                self.sessions[account] = api
+            return api
+
+    def warm_up(self, accounts: Dict[str, str]) -> None:
+        """Log on the sessions of accounts given as account to password."""
+        for account, password in accounts.items():
+            self.get(account, password)
+
+    def lock(self, account: str) -> threading.Lock:
+        """Get the lock of an account."""
+        with self.locks_lock:
+            return self.locks.setdefault(account, threading.Lock())
+
+    def connect(self, account: str, password: str) -> CTrader:
+        """Log on a new session."""
+        return CTrader(
+            server=self.server,
+            account=account,
+            password=password,
+            currency=self.currency,
+            client_id=self.client_id,
+            debug=self.debug,
+            sec_list_cache_dir=self.sec_list_cache_dir,
+        )
+
+    @staticmethod
+    def is_alive(api: CTrader) -> bool:
+        """Check a session can trade, a session that failed to log on cannot."""
+        try:
+            return api.fix.is_alive()
+        except AttributeError:
+            return False
+
+    @staticmethod
+    def close_session(api: CTrader) -> None:
+        """Close a session that is not usable anymore."""
+        try:
+            api.fix.close()
+        except AttributeError:
+            pass
+
+    def check_health(self) -> None:
+        """Replace the dead sessions, run by the loop at an interval."""
+        dead = [
+            account
+            for account, api in list(self.sessions.items())
+            if not self.is_alive(api)
+        ]
+        for account in dead:
+            if account in self.replacing:
+                continue
+            self.replacing.add(account)
+            # logging on blocks until the loop reads the answers, so not on the loop
+            threading.Thread(
+                target=self.replace,
+                args=(account,),
+                name=f"SessionPool-{account}",
+                daemon=True,
+            ).start()
+
+    def replace(self, account: str) -> None:
+        """Replace the session of an account if it is still dead."""
+        try:
+            self.get(account, self.credentials[account])
+        except Exception as e:
+            logging.error(f"Unable to replace the session of {account}: {e}")
+        finally:
+            self.loop.call_soon(self.replacing.discard, account)
+
+    def close(self) -> None:
+        """Logout all the sessions and stop the health checks."""
+        if self.health_timer is not None:
+            self.health_timer.cancel()
+            self.health_timer = None
+        for account in list(self.sessions):
+            with self.lock(account):
+                api = self.sessions.pop(account)
+                if self.is_alive(api):
+                    api.logout()
+                else:
+                    self.close_session(api)
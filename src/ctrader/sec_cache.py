@@ -0,0 +1,96 @@
+"""Module for the cache on disk of the security list of a broker.
+
+The security list (35=y) maps the symbol ids of the server to names and digits.
+It rarely changes, so it is saved after each download and loaded at the next
+start, when a session can trade right after logon instead of waiting for it.
+"""
+
+# python
+import json
+import logging
+import os
+from pathlib import Path
+import time
+from typing import Any, Dict, Optional, Tuple
+
+# increase when the format of the file changes, older files are then ignored
+CACHE_VERSION = 1
+
+SecIdTable = Dict[int, Dict[str, Any]]
+
+
+class SecurityListCache:
+    """Symbol tables of one broker and one server, saved as a JSON file."""
+
+    def __init__(self, directory: str, broker: str, server: str) -> None:
+        """Init."""
+        self.broker = broker
+        self.server = server
+        self.path = Path(directory) / f"sec_list_{broker}_{server}.json"
+
+    def load(self) -> Optional[SecIdTable]:
+        """Load the table of symbol id to name and digits, None if not usable."""
+        try:
+            with open(self.path, "r") as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if (
+            data.get("version") != CACHE_VERSION
+            or data.get("broker") != self.broker
+            or data.get("server") != self.server
+        ):
+            return None
+        return {
+            int(s["id"]): {"name": s["name"], "digits": int(s["digits"])}
+            for s in data["symbols"]
+        }
+
+    def save(self, sec_id_table: SecIdTable) -> None:
+        """Save the table, replacing the previous file in one step."""
+        data = {
+            "version": CACHE_VERSION,
+            "broker": self.broker,
+            "server": self.server,
+            "updated": int(time.time()),
+            "symbols": [
+                {"id": k, "name": v["name"], "digits": v["digits"]}
+                for k, v in sorted(sec_id_table.items())
+            ],
+        }
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            with open(tmp_path, "w") as file:
+                json.dump(data, file)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logging.error(f"Unable to save the security list to {self.path}: {e}")
+
+
+def apply_sec_list_diff(
+    sec_id_table: SecIdTable,
+    sec_name_table: Dict[str, Dict[str, Any]],
+    fresh: SecIdTable,
+) -> Tuple[int, int, int]:
+    """Update both symbol tables in place to match fresh.
+
+    Returns the number of symbols added, changed and removed.
+    """
+    added = changed = removed = 0
+    for symbol_id in [k for k in sec_id_table if k not in fresh]:
+        old = sec_id_table.pop(symbol_id)
+        sec_name_table.pop(old["name"], None)
+        removed += 1
+    for symbol_id, symbol in fresh.items():
+        old = sec_id_table.get(symbol_id)
+        if old == symbol:
+            continue
+        if old is None:
+            added += 1
+        else:
+            changed += 1
+            sec_name_table.pop(old["name"], None)
+        sec_id_table[symbol_id] = symbol
+        sec_name_table[symbol["name"]] = {"id": symbol_id, "digits": symbol["digits"]}
+    return added, changed, removed
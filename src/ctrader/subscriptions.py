@@ -0,0 +1,69 @@
+"""Module for the market data subscriptions of a session, counted by owner.
+
+An owner (a position, an order, a slot of market_request, the user) holds the
+symbols it needs, and holding again replaces them, so a snapshot received
+twice counts once. A symbol is subscribed while at least one owner holds it.
+The changes are not sent right away: flush() compares the symbols held with
+the ones subscribed and sends the new ones in one request, and the ones not
+held anymore in another, so the subscriptions of all the positions of a
+snapshot go in one MarketDataRequest. After a new logon, resubscribe() sends
+all the symbols held again, in one request.
+"""
+
+# python
+import threading
+from typing import Callable, Dict, Hashable, List, Set, Tuple
+
+
+class Subscriptions:
+    """Symbols held by owners, and the ones subscribed to on the server."""
+
+    def __init__(self, request: Callable[[List[str], bool], None]) -> None:
+        """Init with the function sending a request to subscribe or unsubscribe."""
+        self.request = request
+        self.lock = threading.Lock()
+        self.owners: Dict[Hashable, Tuple[str, ...]] = {}
+        # number of owners by symbol, in the order the symbols were first held
+        self.counts: Dict[str, int] = {}
+        self.subscribed: Set[str] = set()
+
+    def __contains__(self, symbol: object) -> bool:
+        """Check a symbol is held."""
+        return symbol in self.counts
+
+    def hold(self, owner: Hashable, *symbols: str) -> bool:
+        """Set the symbols held by an owner, return True if a flush is needed."""
+        with self.lock:
+            old = self.owners.pop(owner, ())
+            if symbols:
+                self.owners[owner] = symbols
+            for symbol in symbols:
+                self.counts[symbol] = self.counts.get(symbol, 0) + 1
+            for symbol in old:
+                self.counts[symbol] -= 1
+                if self.counts[symbol] == 0:
+                    del self.counts[symbol]
+            return self.counts.keys() != self.subscribed
+
+    def release(self, owner: Hashable) -> bool:
+        """Release the symbols held by an owner, return True if a flush is needed."""
+        return self.hold(owner)
+
+    def flush(self) -> None:
+        """Subscribe to the symbols held, unsubscribe from the others."""
+        with self.lock:
+            new = [symbol for symbol in self.counts if symbol not in self.subscribed]
+            old = sorted(
+                symbol for symbol in self.subscribed if symbol not in self.counts
+            )
+            if new:
+                self.request(new, True)
+            if old:
+                self.request(old, False)
+            self.subscribed = set(self.counts)
+
+    def resubscribe(self) -> None:
+        """Subscribe again to all the symbols held, after a new logon."""
+        with self.lock:
+            self.subscribed = set()
+        self.flush()
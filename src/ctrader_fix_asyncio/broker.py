@@ -5,13 +5,28 @@ import asyncio
 import json
 import random
 import re
-import socket
 import time
-from typing import Any, Dict, List, Optional, Set, Union
+from typing import Dict, List, Optional, Set, Union
 
 # our modules
-from configs.assets import assets_all, DICT_SYMBOL_ID_SYMBOL, get_info_quantity_to_trade
+from configs.assets import assets_all, get_info_quantity_to_trade
 from configs.settings import work_dir
+from ctrader.encoder import HeaderEncoder, encode_fields, sending_time
+from ctrader_fix_asyncio.framer import read_frames
+from ctrader_fix_asyncio.parser import (
+    MSG_TYPE,
+    ORDER_STATUS_DONE,
+    Fields,
+    decode_execution_report,
+    decode_position_report,
+    parse,
+    readable,
+)
+from ctrader_fix_asyncio.quotes import QuoteTable
+from ctrader_fix_asyncio.store import Store
+from ctrader_fix_asyncio.supervisor import Supervisor
+from market_data import QuoteListener
+from market_data.tick_store import TickStore
 
 # Open the JSON file
 filename = f"{work_dir()}/src/configs/assets.json"
@@ -21,15 +36,6 @@ with open(filename, "r") as file:
 # print(f"assets={assets}")
 
 
-def checksum(message: str) -> str:
-    """Calculates the checksum used for validating fix messages."""
-    sum = 0
-    message_array = bytes(message, "UTF-8")
-    for i in message_array:
-        sum += i
-    return str((sum % 256)).zfill(3)
-
-
 def random_string() -> str:
     """Generate random string for sendersubid."""
     characters = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
@@ -40,24 +46,13 @@ def random_string() -> str:
     return random_s
 
 
-def tcp_ping(host: str, port: int) -> bool:
-    """Check internet connection via ping."""
-    try:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(2)  # set timeout to 2 seconds
-        sock.connect((host, port))
-        sock.close()
-        return True
-    except Exception:
-        return False
-
-
 def get_time() -> str:
     """Get current time in UTC.
 
     Alternatively, you could use return datetime.utcnow().strftime("%Y%m%d-%H:%M:%S").
+    It is formatted only once per second, as for the SendingTime of the header.
     """
-    return time.strftime("%Y%m%d-%H:%M:%S", time.gmtime())
+    return sending_time().decode()
 
 
 class Broker:
@@ -71,8 +66,27 @@ class Broker:
     def __init__(
         self,
         credentials: Dict[str, str],
+        heart_bt_int: int = 30,
+        reconcile_interval: Optional[float] = 60.0,
+        reconnect_delay: float = 1.0,
+        max_reconnect_delay: float = 60.0,
+        close_timeout: float = 5.0,
+        tick_store_dir: Optional[str] = None,
     ):
-        """Init."""
+        """Init.
+
+        Args:
+            credentials ([dict]): broker, hostname, account, password and type.
+            heart_bt_int ([int]): seconds of silence before a heartbeat is sent.
+            reconcile_interval ([float]): seconds between two requests of all the
+                positions, besides the one at each logon, never again if None.
+            reconnect_delay ([float]): delay before the first reconnection of a stream.
+            max_reconnect_delay ([float]): cap of the delay between reconnections.
+            close_timeout ([float]): seconds to wait for a position not received yet
+                to close it.
+            tick_store_dir ([str]): folder where the quotes received are recorded,
+                per broker, None to not record them.
+        """
         # credentials
         self.broker = credentials["broker"]
         self.hostname = credentials["hostname"]
@@ -80,6 +94,8 @@ class Broker:
         self.password = credentials["password"]
         self.type = credentials["type"]
         self.sendercompid = f"{self.type}.{self.broker}.{self.account}"
+        self.price_port = int(credentials.get("price_port", 5201))
+        self.trade_port = int(credentials.get("trade_port", 5202))
         #
         self.price_reader = None
         self.price_writer = None
@@ -89,161 +105,197 @@ class Broker:
         self.trade_msgseqnum = 1
         self.price_sendersubid = ""
         self.trade_sendersubid = ""
-        self.bid = 0.0
-        self.ask = 0.0
+        self.price_encoder = HeaderEncoder(self.sendercompid, "cServer", "", "QUOTE")
+        self.trade_encoder = HeaderEncoder(self.sendercompid, "cServer", "", "TRADE")
+        # the symbols subscribed to, their names and their last quotes by symbol_id
+        self.symbols: List[str] = []
+        self.symbol_names: Dict[int, str] = {}
+        self.quotes = QuoteTable()
+        # called with each quote received, by symbol
+        self.quote_listeners: List[QuoteListener] = []
+        self.tick_store: Optional[TickStore] = None
+        if tick_store_dir is not None:
+            self.tick_store = TickStore(f"{tick_store_dir}/{self.broker}")
+            self.add_quote_listener(self.tick_store.append)
+        self.heart_bt_int = heart_bt_int
+        self.reconcile_interval = reconcile_interval
+        # time.monotonic() of the last message sent on each stream
+        self.price_last_sent = 0.0
+        self.trade_last_sent = 0.0
+        # reconnect each stream when it is lost or silent
+        self.price_supervisor = Supervisor(
+            "PRICE",
+            self.price_session,
+            heart_bt_int,
+            lambda: self.price_writer.write(self.fix_test_request_to_a_stream("QUOTE")),
+            reconnect_delay,
+            max_reconnect_delay,
+        )
+        self.trade_supervisor = Supervisor(
+            "TRADE",
+            self.trade_session,
+            heart_bt_int,
+            lambda: self.trade_writer.write(self.fix_test_request_to_a_stream("TRADE")),
+            reconnect_delay,
+            max_reconnect_delay,
+        )
 
-        self.positions: List[Dict[str, Union[str, int, float]]] = []
-        self.position_ids: Set[str] = set()
+        # by position_id, and by order_id, updated from the reports
+        self.positions = Store("position_id", indexes=("symbol",))
         self.num_opened_positions = 0
-        self.orders: List[Dict[str, Union[str, int, float]]] = []
+        self.orders = Store("order_id", indexes=("symbol", "position_id"))
         self.num_opened_orders: int = 0
+        # position_ids seen since the last request for positions, None when the
+        # snapshot is complete, and the number of position reports received
+        self.position_snapshot: Optional[Set[str]] = None
+        self.position_reports = 0
+        # CumQty seen of the orders partially filled, by order_id
+        self.filled_quantities: Dict[str, float] = {}
+        # ClOrdID of the close of the positions removed by it, by position_id,
+        # until the close is filled
+        self.closing: Dict[str, str] = {}
+        # futures of the callers waiting for a position, by position_id
+        self.position_waiters: Dict[str, List[asyncio.Future]] = {}
+        # position_ids to close as soon as they are received
+        self.pending_closes: Set[str] = set()
+        self.close_timeout = close_timeout
+        # OrderMassCancelRequest (35=q) until the server rejects it
+        self.mass_cancel_supported = True
+        # order_ids of the mass cancels sent, by ClOrdID, to cancel one by one
+        # if the mass cancel is rejected
+        self.mass_cancels: Dict[str, List[str]] = {}
 
     def set_asset(self, symbol: str) -> None:
         """Set Asset with name and ID as specific for cTrader."""
         self.symbol = symbol
         self.symbol_id = assets[symbol]["symbol_id"]
         self.symbol_num_digits = assets[symbol]["symbol_num_digits"]
+        self.symbols = [symbol]
+        self.symbol_names = {self.symbol_id: symbol}
         print(
             f"symbol={self.symbol}, "
             f"symbol_id={self.symbol_id}, "
             f"symbol_num_digits={self.symbol_num_digits}"
         )
 
+    def set_assets(self, symbols: List[str]) -> None:
+        """Set several Assets to receive the prices of, the first one as Asset."""
+        self.set_asset(symbols[0])
+        self.symbols = list(symbols)
+        self.symbol_names = {assets[symbol]["symbol_id"]: symbol for symbol in symbols}
+
+    def add_quote_listener(self, listener: QuoteListener) -> None:
+        """Call a listener with each quote received, like TickStore.append."""
+        self.quote_listeners.append(listener)
+
+    @property
+    def bid(self) -> float:
+        """Last bid of the Asset."""
+        return self.quotes.bid(self.symbol_id)
+
+    @property
+    def ask(self) -> float:
+        """Last ask of the Asset."""
+        return self.quotes.ask(self.symbol_id)
+
     """FIX message constructors."""
 
-    def fix_login_to_a_stream(self, stream_name: str) -> str:
-        """Login to a stream.
+    def fix_message_to_a_stream(
+        self, stream_name: str, msg_type: bytes, body: bytes = b""
+    ) -> bytes:
+        """Encode a message to a stream, with the next MsgSeqNum of that stream.
 
         Two choices: price (QUOTE) and trade (TRADE).
         """
-        stream_msgseqnum = (
-            self.price_msgseqnum if stream_name == "QUOTE" else self.price_msgseqnum
-        )
-        stream_sendersubid = (
-            self.price_sendersubid if stream_name == "QUOTE" else self.trade_sendersubid
-        )
-        bl = (
-            "35=A"
-            f"|34={stream_msgseqnum}"
-            f"|49={self.sendercompid}"
-            "|56=cServer"
-            f"|57={stream_name}"
-            f"|50={stream_sendersubid}"
-            f"|52={get_time()}"
-            "|98=0"
-            "|108=1"
-            "|141=Y"
-            f"|553={self.account}"
-            f"|554={self.password}"
-            "|"
-        )
+        # encoded just before being written, so this is when it is sent
         if stream_name == "QUOTE":
+            message = self.price_encoder.encode(msg_type, self.price_msgseqnum, body)
             self.price_msgseqnum += 1
+            self.price_last_sent = time.monotonic()
         else:
+            message = self.trade_encoder.encode(msg_type, self.trade_msgseqnum, body)
             self.trade_msgseqnum += 1
-        message = f"8=FIX.4.4|9={str(len(bl))}|{bl}".replace("|", "\u0001")
-        return message + f"10={checksum(message)}\u0001"
+            self.trade_last_sent = time.monotonic()
+        return message
 
-    def fix_heartbeat_to_a_stream(self, stream_name: str) -> str:
-        """Heartbeat to stream.
+    def fix_login_to_a_stream(self, stream_name: str) -> bytes:
+        """Login to a stream.
 
-        Two choises: price (QUOTE) and trade (TRADE).
+        Two choices: price (QUOTE) and trade (TRADE).
         """
-        stream_msgseqnum = (
-            self.price_msgseqnum if stream_name == "QUOTE" else self.trade_msgseqnum
-        )
-        stream_sendersubid = (
-            self.price_sendersubid if stream_name == "QUOTE" else self.trade_sendersubid
+        body = b"98=0\x01108=%d\x01141=Y\x01553=%b\x01554=%b\x01" % (
+            self.heart_bt_int,
+            self.account.encode(),
+            self.password.encode(),
         )
-        bl = (
-            "35=0"
-            f"|34={stream_msgseqnum}"
-            f"|49={self.sendercompid}"
-            "|56=cServer"
-            f"|57={stream_name}"
-            f"|50={stream_sendersubid}"
-            f"|52={get_time()}"
-            "|"
-        )
-        if stream_name == "QUOTE":
-            self.price_msgseqnum += 1
-        else:
-            self.trade_msgseqnum += 1
-        message = f"8=FIX.4.4|9={str(len(bl))}|{bl}".replace("|", "\u0001")
-        return message + f"10={checksum(message)}\u0001"
+        return self.fix_message_to_a_stream(stream_name, b"A", body)
+
+    def fix_heartbeat_to_a_stream(
+        self, stream_name: str, test_req_id: Optional[bytes] = None
+    ) -> bytes:
+        """Heartbeat to stream, answering a test request if test_req_id is given.
 
-    def fix_security_request(self) -> str:
+        Two choises: price (QUOTE) and trade (TRADE).
+        """
+        body = b"112=%b\x01" % test_req_id if test_req_id is not None else b""
+        return self.fix_message_to_a_stream(stream_name, b"0", body)
+
+    def fix_test_request_to_a_stream(self, stream_name: str) -> bytes:
+        """Test request to stream, the server answers with a heartbeat.
+
+        Two choices: price (QUOTE) and trade (TRADE).
+        """
+        body = b"112=%d\x01" % time.time_ns()
+        return self.fix_message_to_a_stream(stream_name, b"1", body)
+
+    def fix_security_request(self) -> bytes:
         """Security request to learn the list of symbols and their IDs."""
-        bl = (
-            f"35=x|34={self.price_msgseqnum}|49={self.sendercompid}|56=cServer|57=TRADE"
-            f"|50={self.price_sendersubid}"
-            f"|52={get_time()}"
-            f"|320=Sxo2Xlb1jzJC|559=0|"
+        return self.fix_message_to_a_stream(
+            "QUOTE", b"x", b"320=Sxo2Xlb1jzJC\x01559=0\x01"
         )
-        self.price_msgseqnum += 1
-        message = f"8=FIX.4.4|9={str(len(bl))}|{bl}".replace("|", "\u0001")
-        return message + f"10={checksum(message)}\u0001"
-
-    def fix_market_data_request(self, symbol: str, symbol_id: int) -> str:
-        """Request to market data using the price stream."""
-        bl = (
-            "35=V"
-            f"|34={self.price_msgseqnum}"
-            f"|49={self.sendercompid}"
-            "|56=cServer"
-            "|57=QUOTE"
-            f"|50={self.price_sendersubid}"
-            f"|52={get_time()}"
-            f"|262={symbol}"
-            "|263=1"
-            "|264=1"
-            "|265=1"
-            "|146=1"
-            f"|55={symbol_id}"
-            "|267=2"
-            "|269=0"
-            "|269=1"
-            "|"
-        )
-        self.price_msgseqnum += 1
-        message = f"8=FIX.4.4|9={str(len(bl))}|{bl}".replace("|", "\u0001")
-        return message + f"10={checksum(message)}\u0001"
-
-    def fix_request_positions(self) -> str:
-        """Request positions using the trade stream."""
-        bl = (
-            "35=AN"  # was AF
-            f"|34={self.trade_msgseqnum}"
-            f"|49={self.sendercompid}"
-            "|56=cServer"
-            "|57=TRADE"
-            f"|50={self.trade_sendersubid}"
-            f"|52={get_time()}"
-            f"|710={self.trade_msgseqnum}"
-            "|"
+
+    def fix_market_data_request(self, symbols: List[str]) -> bytes:
+        """Request to market data of several symbols using the price stream.
+
+        One request, with a NoRelatedSym group of all the symbols.
+        """
+        body = encode_fields(
+            [
+                (262, symbols[0] if len(symbols) == 1 else f"md{self.price_msgseqnum}"),
+                (263, 1),
+                (264, 1),
+                (265, 1),
+                (146, len(symbols)),
+            ]
+            + [(55, assets[symbol]["symbol_id"]) for symbol in symbols]
+            + [
+                (267, 2),
+                (269, 0),
+                (269, 1),
+            ]
         )
-        self.trade_msgseqnum += 1
-        message = f"8=FIX.4.4|9={str(len(bl))}|{bl}".replace("|", "\u0001")
-        return message + f"10={checksum(message)}\u0001"
-
-    def fix_request_orders(self) -> str:
-        """Request orders using the trade stream."""
-        bl = (
-            "35=AF"  # was AN
-            f"|34={self.trade_msgseqnum}"
-            f"|49={self.sendercompid}"
-            "|56=cServer"
-            "|57=TRADE"
-            f"|50={self.trade_sendersubid}"
-            f"|52={get_time()}"
-            f"|584={self.trade_msgseqnum}"
-            "|585=7"
-            f"|225={get_time()}"  # only orders before this datetime
-            "|"
+        return self.fix_message_to_a_stream("QUOTE", b"V", body)
+
+    def fix_request_positions(self) -> bytes:
+        """Request positions using the trade stream.
+
+        The positions not in the answer are removed once it is complete.
+        """
+        self.position_snapshot = set()
+        self.position_reports = 0
+        body = b"710=%d\x01" % self.trade_msgseqnum
+        return self.fix_message_to_a_stream("TRADE", b"AN", body)
+
+    def fix_request_orders(self) -> bytes:
+        """Request orders using the trade stream.
+
+        Field 225 asks only for orders before this datetime.
+        """
+        body = b"584=%d\x01585=7\x01225=%b\x01" % (
+            self.trade_msgseqnum,
+            get_time().encode(),
         )
-        self.trade_msgseqnum += 1
-        message = f"8=FIX.4.4|9={str(len(bl))}|{bl}".replace("|", "\u0001")
-        return message + f"10={checksum(message)}\u0001"
+        return self.fix_message_to_a_stream("TRADE", b"AF", body)
 
     def fix_set_order(
         self,
@@ -253,7 +305,7 @@ class Broker:
         quantity_to_trade: int,
         price: Optional[float],
         position_id: Optional[str] = None,
-    ) -> str:
+    ) -> bytes:
         """Code to create a general order.
 
         Field 55 corresponds to the symbol_id.
@@ -278,50 +330,34 @@ class Broker:
         else:
             raise ValueError
 
+        fields = [
+            (11, self.trade_msgseqnum),
+            (55, symbol_id),
+            (54, direction_id),
+            (60, get_time()),
+        ]
         if order_type == "market":
-            order_type_id = 1
-            price_info = ""
+            fields += [(40, 1), (38, quantity_to_trade)]
         elif order_type == "limit":
-            order_type_id = 2
             # limit price
-            price_info = f"|44={price}"
+            fields += [(40, 2), (38, quantity_to_trade), (44, price)]
         elif order_type == "stop":
-            order_type_id = 3
             # stop price
-            price_info = f"|99={price}"
+            fields += [(40, 3), (38, quantity_to_trade), (99, price)]
         else:
             raise ValueError
 
         # assign the position to a parent if given
-        position_info = "" if position_id is None else f"|721={position_id}"
-
-        bl = (
-            "35=D"
-            f"|49={self.sendercompid}"
-            "|56=cServer"
-            f"|34={self.trade_msgseqnum}"
-            f"|52={get_time()}"
-            f"|50={self.trade_sendersubid}"
-            "|57=TRADE"
-            f"|11={self.trade_msgseqnum}"
-            f"|55={symbol_id}"
-            f"|54={direction_id}"
-            f"|60={get_time()}"
-            f"|40={order_type_id}"
-            f"|38={quantity_to_trade}"
-            f"{price_info}"
-            f"{position_info}"
-        )
-        bl += "|"
-        self.trade_msgseqnum += 1
-        message = f"8=FIX.4.4|9={str(len(bl))}|{bl}".replace("|", "\u0001")
-        return message + f"10={checksum(message)}\u0001"
+        if position_id is not None:
+            fields.append((721, position_id))
+
+        return self.fix_message_to_a_stream("TRADE", b"D", encode_fields(fields))
 
     def fix_cancel_order(
         self,
         order_id: str,
         order_request_id: Optional[str] = None,
-    ) -> str:
+    ) -> bytes:
         """Code to cancel an order by its order_id, and order_request_id.
 
         It seems that it works with any value for the order_request_id,
@@ -329,354 +365,198 @@ class Broker:
         """
         if order_request_id is None:
             order_request_id = f"VAL{self.trade_msgseqnum}"
-        bl = (
-            "35=F"
-            f"|49={self.sendercompid}"
-            "|56=cServer"
-            f"|34={self.trade_msgseqnum}"
-            f"|52={get_time()}"
-            f"|50={self.trade_sendersubid}"
-            "|57=TRADE"
-            f"|11={self.trade_msgseqnum}"
-            f"|37={order_id}"
-            f"|41={order_request_id}"
-            "|"
+        body = encode_fields(
+            [
+                (11, self.trade_msgseqnum),
+                (37, order_id),
+                (41, order_request_id),
+            ]
         )
-        self.trade_msgseqnum += 1
-        message = f"8=FIX.4.4|9={str(len(bl))}|{bl}".replace("|", "\u0001")
-        return message + f"10={checksum(message)}\u0001"
+        return self.fix_message_to_a_stream("TRADE", b"F", body)
+
+    def fix_cancel_orders(self, order_ids: List[str]) -> bytes:
+        """Code to cancel several orders, one message each, to be written together."""
+        return b"".join(self.fix_cancel_order(order_id) for order_id in order_ids)
+
+    def fix_mass_cancel(
+        self,
+        cl_ord_id: str,
+        symbol: Optional[str] = None,
+        direction: Optional[str] = None,
+    ) -> bytes:
+        """Code to cancel all the orders, or those of one symbol and/or direction.
 
-    def print_fix_message(self, name: str, fix_message: str) -> None:
+        Field 530: mass cancel request type (1 = orders of one symbol, 7 = all orders)
+        """
+        fields = [(11, cl_ord_id), (530, 1 if symbol else 7)]
+        if symbol is not None:
+            fields.append((55, assets_all[symbol]["symbol_id"]))
+        if direction is not None:
+            fields.append((54, 1 if direction == "buy" else 2))
+        fields.append((60, get_time()))
+        return self.fix_message_to_a_stream("TRADE", b"q", encode_fields(fields))
+
+    def fix_close_positions(
+        self, positions: List[Dict[str, Union[str, int, float]]]
+    ) -> bytes:
+        """Code to close positions, one market order each, to be written together."""
+        return b"".join(
+            self.fix_set_order(
+                symbol=d["symbol"],
+                direction="buy" if d["direction"] == "sell" else "sell",
+                order_type="market",
+                quantity_to_trade=d["quantity"],
+                price=None,
+                position_id=d["position_id"],
+            )
+            for d in positions
+        )
+
+    def print_fix_message(self, name: str, fix_message: bytes) -> None:
         """Print fix message in a human readable format."""
-        readable_fix_message = fix_message.replace("\u0001", "|")
+        readable_fix_message = fix_message.decode().replace("\u0001", "|")
         print(f"{name}={readable_fix_message}")
 
-    def parse_one_position_message(self, full_message: str) -> Dict[str, Any]:
-        """Parse one position message."""
-        # print(f"full_message for position={full_message}")
-        d = None
-        if match := re.search("721=(\\d+)", full_message):
-            d = {}
-            d["position_id"] = match.group(1)
-            #
-            if match := re.search("55=(\\d+)", full_message):
-                symbol_id = int(match.group(1))
-            else:
-                symbol_id = 0
-            # quantity can be float for BTCUSD and ETHUSD as min is 0.01
-            if match := re.search("704=([\d.]+)\|", full_message):  # noqa
-                quantity_buy = float(match.group(1))
-            else:
-                quantity_buy = 0.0
-            if match := re.search("705=([\d.]+)\|", full_message):  # noqa
-                quantity_sell = float(match.group(1))
-            else:
-                quantity_sell = 0.0
-            if quantity_buy > 0.0 and quantity_sell == 0.0:
-                direction = "buy"
-                quantity = quantity_buy
-            elif quantity_buy == 0.0 and quantity_sell > 0.0:
-                direction = "sell"
-                quantity = quantity_sell
-            else:
-                raise ValueError
-            #
-            if match := re.search("730=([\d.]+)\|", full_message):  # noqa
-                cost_price = float(match.group(1))
-            else:
-                cost_price = 0.0
-            #
-            if match := re.search("727=(\\d+)", full_message):
-                num_opened_positions = int(match.group(1))
-            else:
-                num_opened_positions = 0
-            # build dictionary
-            d["symbol"] = DICT_SYMBOL_ID_SYMBOL[symbol_id]
-            d["symbol_id"] = symbol_id
-            d["direction"] = direction
-            d["quantity"] = quantity
-            d["cost_price"] = cost_price
-            d["num_opened_positions"] = num_opened_positions
-        # print(f"d={d}")
-        return d
-
-    def parse_one_order_message(self, full_message: str) -> Dict[str, Any]:
-        """Parse one order message."""
-        # print(f"full_message for order={full_message}")
-        d = None
-        if match := re.search("37=(\\d+)", full_message):
-            d = {}
-            d["order_id"] = match.group(1)
-            #
-            if match := re.search("11=(\\d+)", full_message):
-                order_request_id = match.group(1)
-            else:
-                order_request_id = None
-            #
-            if match := re.search("721=(\\d+)", full_message):
-                position_id = match.group(1)
-            else:
-                position_id = None
-            #
-            if match := re.search("55=(\\d+)", full_message):
-                symbol_id = int(match.group(1))
-            else:
-                symbol_id = 0
-            #
-            if match := re.search("38=([\d.]+)\|", full_message):  # noqa
-                quantity_ordered = float(match.group(1))
-            else:
-                quantity_ordered = 0.0
-            #
-            if match := re.search("14=([\d.]+)\|", full_message):  # noqa
-                quantity_filled = float(match.group(1))
-            else:
-                quantity_filled = 0.0
-            #
-            if match := re.search("151=([\d.]+)\|", full_message):  # noqa
-                quantity_not_filled = float(match.group(1))
-            else:
-                quantity_not_filled = 0.0
-            #
-            if match := re.search("39=(\\d+)", full_message):
-                value = match.group(1)
-                order_status = (
-                    "new"
-                    if value == "0"
-                    else "partially_filled"
-                    if value == "1"
-                    else "filled"
-                    if value == "2"
-                    else "rejected"
-                    if value == "8"
-                    else "cancelled"
-                    if value == "4"
-                    else "expired"
-                    if value == "C"
-                    else None
-                )  # noqa
-            else:
-                order_status = None
-            #
-            if match := re.search("54=(\\d+)", full_message):
-                value = match.group(1)
-                order_direction = (
-                    "buy" if value == "1" else "sell" if value == "2" else None
-                )  # noqa
-            else:
-                order_direction = None
-            #
-            if match := re.search("40=(\\d+)", full_message):
-                value = match.group(1)
-                order_type = (
-                    "market"
-                    if value == "1"
-                    else "limit"
-                    if value == "2"
-                    else "stop"
-                    if value == "3"
-                    else None
-                )  # noqa
-            else:
-                order_type = None
-            #
-            if match := re.search("44=([\d.]+)\|", full_message):  # noqa
-                price_limit = float(match.group(1))
-            else:
-                price_limit = None
-            #
-            if match := re.search("99=([\d.]+)\|", full_message):  # noqa
-                price_stop = float(match.group(1))
-            else:
-                price_stop = None
-            #
-            if match := re.search("59=(\\d+)", full_message):
-                value = match.group(1)
-                time_in_force = (
-                    "GTC"
-                    if value == "1"
-                    else "IOC"
-                    if value == "3"
-                    else "GTD"
-                    if value == 6
-                    else None
-                )  # noqa
-            else:
-                symbol_id = 0
-            #
-            # this to allow any character, numbers or letters from 150= to the first |
-            if match := re.search(r"150=([^|]+)", full_message):
-                value = match.group(1)
-                execution_type = (
-                    "new"
-                    if value == "0"
-                    else "canceled"
-                    if value == "4"
-                    else "replaced"
-                    if value == "5"
-                    else "rejected"
-                    if value == "8"
-                    else "expired"
-                    if value == "C"
-                    else "trade"
-                    if value == "F"
-                    else "order_status"
-                    if value == "I"
-                    else None
-                )  # noqa
-            #
-            if match := re.search(r"60=([^|]+)", full_message):
-                datetime = match.group(1)
-            else:
-                datetime = None
-            #
-            if match := re.search("911=(\\d+)", full_message):
-                num_opened_orders = int(match.group(1))
-            else:
-                num_opened_orders = 0
-            # build dictionary
-            d["position_id"] = position_id
-            d["datetime"] = datetime
-            d["symbol"] = DICT_SYMBOL_ID_SYMBOL[symbol_id]
-            d["symbol_id"] = symbol_id
-            d["order_direction"] = order_direction
-            d["order_type"] = order_type
-            d["price_limit"] = price_limit
-            d["price_stop"] = price_stop
-            d["quantity_ordered"] = quantity_ordered
-            d["quantity_filled"] = quantity_filled
-            d["quantity_not_filled"] = quantity_not_filled
-            d["order_status"] = order_status
-            d["time_in_force"] = time_in_force
-            d["execution_type"] = execution_type
-            d["order_request_id"] = order_request_id
-            d["num_opened_orders"] = num_opened_orders
-        # print(f"d={d}")
-        return d
-
-    def get_all_position_ids(
-        self, positions: Set[Dict[str, Union[str, int, float]]]
-    ) -> List[str]:
+    def get_all_position_ids(self, positions: Store) -> List[str]:
         """Get a list of the position_ids that we have from positions."""
-        return [position["position_id"] for position in positions]
+        return positions.keys()
 
-    def get_all_order_ids(
-        self, orders: Set[Dict[str, Union[str, int, float]]]
-    ) -> List[str]:
+    def get_all_order_ids(self, orders: Store) -> List[str]:
         """Get a list of the order_ids that we have from orders."""
-        return [order["order_id"] for order in orders]
+        return orders.keys()
 
     """Login to price and trade streams."""
 
     async def price_login(self) -> None:
-        """Login to price stream on port 5201.
+        """Login to price stream on port 5201, and again each time it is lost.
 
         So far supporting only one asset.
         """
+        await self.price_supervisor.run()
+
+    async def trade_login(self) -> None:
+        """Login to trade stream on port 5202, and again each time it is lost."""
+        await self.trade_supervisor.run()
+
+    async def price_session(self) -> None:
+        """One connection to the price stream, until it is lost.
+
+        Logs on with the sequence numbers reset, subscribes again to the symbols,
+        and sends the heartbeats while reading.
+        """
+        print(f"INFO: Logging into broker='{self.broker}' for PRICE stream...")
+        self.price_reader, self.price_writer = await asyncio.open_connection(
+            self.hostname, self.price_port
+        )
+        self.price_msgseqnum = 1
+        self.price_sendersubid = random_string()
+        self.price_encoder = HeaderEncoder(
+            self.sendercompid, "cServer", self.price_sendersubid, "QUOTE"
+        )
+        #
+        fix_price_login = self.fix_login_to_a_stream("QUOTE")
+        self.print_fix_message("fix_price_login", fix_price_login)
+        #
+        fix_market_data_request = self.fix_market_data_request(self.symbols)
+        self.print_fix_message("fix_market_data_request", fix_market_data_request)
+        #
+        self.price_writer.write(fix_price_login + fix_market_data_request)
+        heartbeat = asyncio.create_task(self.send_price_heartbeat())
+        flush = asyncio.create_task(self.flush_ticks())
         try:
-            print(f"INFO: Logging into broker='{self.broker}' for PRICE stream...")
-            self.price_reader, self.price_writer = await asyncio.open_connection(
-                self.hostname, 5201
-            )
-            # print("Price A")
-            self.price_sendersubid = random_string()
-            # print("Price B")
-            #
-            fix_price_login = self.fix_login_to_a_stream("QUOTE")
-            self.print_fix_message("fix_price_login", fix_price_login)
-            #
-            fix_market_data_request = self.fix_market_data_request(
-                self.symbol, self.symbol_id
-            )
-            self.print_fix_message("fix_market_data_request", fix_market_data_request)
-            #
-            fix_message = ""
-            fix_message += fix_price_login
-            fix_message += fix_market_data_request
-            self.price_writer.write(bytes(fix_message, "UTF-8"))
-            # print("Price C")
-            asyncio.create_task(self.send_price_heartbeat())
-            # print("Price D")
             await self.read_price_data()
-            # print("Price E")
-        except Exception as e:
-            await asyncio.sleep(1)
-            print(f"ERROR PRICE connection refused login error! exception={e}.")
+        finally:
+            heartbeat.cancel()
+            flush.cancel()
+            self.price_writer.close()
+            if self.tick_store is not None:
+                self.tick_store.flush()
+
+    async def flush_ticks(self) -> None:
+        """Write the ticks recorded every flush_interval, even of a quiet symbol."""
+        if self.tick_store is None:
+            return
+        while True:
+            await asyncio.sleep(self.tick_store.flush_interval)
+            self.tick_store.flush()
 
-    async def trade_login(self) -> None:
-        """Login to trade stream on port 5202."""
+    async def trade_session(self) -> None:
+        """One connection to the trade stream, until it is lost.
+
+        Logs on with the sequence numbers reset, the positions are requested
+        once logged on, and sends the heartbeats while reading.
+        """
+        print(f"INFO: Logging into broker='{self.broker}' for TRADE stream...")
+        self.trade_reader, self.trade_writer = await asyncio.open_connection(
+            self.hostname, self.trade_port
+        )
+        self.trade_msgseqnum = 1
+        self.trade_sendersubid = random_string()
+        self.trade_encoder = HeaderEncoder(
+            self.sendercompid, "cServer", self.trade_sendersubid, "TRADE"
+        )
+        fix_trade_login = self.fix_login_to_a_stream("TRADE")
+        self.print_fix_message("fix_trade_login", fix_trade_login)
+        #
+        self.trade_writer.write(fix_trade_login)
+        heartbeat = asyncio.create_task(self.send_trade_heartbeat())
         try:
-            print(f"INFO: Logging into broker='{self.broker}' for TRADE stream...")
-            self.trade_reader, self.trade_writer = await asyncio.open_connection(
-                self.hostname, 5202
-            )
-            self.trade_sendersubid = random_string()
-            fix_trade_login = self.fix_login_to_a_stream("TRADE")
-            self.print_fix_message("fix_trade_login", fix_trade_login)
-            #
-            fix_message = ""
-            fix_message += fix_trade_login
-            self.trade_writer.write(bytes(fix_message, "UTF-8"))
-            #
-            asyncio.create_task(self.send_trade_heartbeat())
-            # print("Trade D")
             await self.read_trade_data()
-            # print("Trade E")
-        except Exception as e:
-            await asyncio.sleep(1)
-            print(f"ERROR: TRADE connection refused login error! exception={e}.")
+        finally:
+            heartbeat.cancel()
+            self.trade_writer.close()
 
     """Heartbeat methods for price and trade streams."""
 
     async def send_price_heartbeat(self) -> None:
-        """Price heartbeat used to send heartbeat to server every 1 second.
+        """Price heartbeat, sent when nothing was sent for HeartBtInt seconds.
 
         If I send with every heartbeat also the market_data_request()
         I get an error that I am already subscribed.
+        Stops when the stream is replaced by a new login.
         """
-        while True:
+        writer = self.price_writer
+        while self.price_writer is writer:
             try:
-                #
-                fix_price_heartbeat = self.fix_heartbeat_to_a_stream("QUOTE")
-                # self.print_fix_message("fix_price_heartbeat", fix_price_heartbeat)
-                #
-                fix_message = ""
-                fix_message += fix_price_heartbeat
-                #
-                self.price_writer.write(bytes(fix_message, "UTF-8"))
+                if time.monotonic() - self.price_last_sent >= self.heart_bt_int:
+                    self.price_writer.write(self.fix_heartbeat_to_a_stream("QUOTE"))
             except Exception as e:
                 print(f"ERROR There was a PRICE heartbeat error... {e}")
                 break
-            await asyncio.sleep(1)
+            await asyncio.sleep(
+                max(self.price_last_sent + self.heart_bt_int - time.monotonic(), 0.1)
+            )
 
     async def send_trade_heartbeat(self) -> None:
-        """Trade heartbeat used to send heartbeat to server every 1 second.
+        """Trade heartbeat, sent when nothing was sent for HeartBtInt seconds.
 
-        In adition, also request the positions.
+        In adition, request the positions every reconcile_interval seconds, as
+        they are kept current from the execution reports meanwhile.
+        Stops when the stream is replaced by a new login.
         """
-        while True:
+        writer = self.trade_writer
+        last_reconcile = time.monotonic()
+        while self.trade_writer is writer:
             try:
-                #
-                fix_trade_heartbeat = self.fix_heartbeat_to_a_stream("TRADE")
-                # self.print_fix_message("fix_trade_heartbeat", fix_trade_heartbeat)
-                fix_request_positions = self.fix_request_positions()
-                # self.print_fix_message("fix_request_positions", fix_request_positions)
-                # fix_request_orders = self.fix_request_orders()
-                # self.print_fix_message("fix_request_orders", fix_request_orders)
-                #
-                fix_message = ""
-                fix_message += fix_trade_heartbeat
-                fix_message += fix_request_positions
-                # fix_message += fix_request_orders
-                #
-                # self.positions = []
-                # self.orders = []
-                #
-                self.trade_writer.write(bytes(fix_message, "UTF-8"))
+                now = time.monotonic()
+                fix_message = b""
+                if (
+                    self.reconcile_interval is not None
+                    and now - last_reconcile >= self.reconcile_interval
+                ):
+                    fix_message += self.fix_request_positions()
+                    last_reconcile = now
+                elif now - self.trade_last_sent >= self.heart_bt_int:
+                    fix_message += self.fix_heartbeat_to_a_stream("TRADE")
+                if fix_message:
+                    self.trade_writer.write(fix_message)
             except Exception as e:
                 print(f"ERROR: There was a TRADE heartbeat error... {e}")
                 break
-            await asyncio.sleep(1)
+            deadline = self.trade_last_sent + self.heart_bt_int
+            if self.reconcile_interval is not None:
+                deadline = min(deadline, last_reconcile + self.reconcile_interval)
+            await asyncio.sleep(max(deadline - time.monotonic(), 0.1))
 
     """Methods to set orders."""
 
@@ -702,7 +582,7 @@ class Broker:
             print("*************************************")
             self.print_fix_message("set_order", set_order)
             print("*************************************")
-            self.trade_writer.write(bytes(set_order, "UTF-8"))
+            self.trade_writer.write(set_order)
         except Exception as e:
             print(f"ERROR: {self.broker}, async_set_order not working! exception={e}")
 
@@ -714,9 +594,11 @@ class Broker:
         num_repeats: int,
     ) -> None:
         """Set order examples of 6 types, each N times."""
-        min_quantity_to_trade, our_quantity_to_trade = get_info_quantity_to_trade(symbol)
+        min_quantity_to_trade, our_quantity_to_trade = get_info_quantity_to_trade(
+            symbol
+        )
 
-        fix_set_orders = ""
+        fix_set_orders = b""
         for i in range(num_repeats):
             # buy orders
             fix_set_orders += self.fix_set_order(
@@ -770,7 +652,7 @@ class Broker:
             )
         try:
             self.print_fix_message("fix_set_orders", fix_set_orders)
-            self.trade_writer.write(bytes(fix_set_orders, "UTF-8"))
+            self.trade_writer.write(fix_set_orders)
         except Exception as e:
             print(f"ERROR: {self.broker} setting orders not working! {e}")
 
@@ -780,170 +662,183 @@ class Broker:
         order_request_id: Optional[str] = None,
     ) -> None:
         """Async close order based on order_id."""
-        fix_cancel_orders = ""
+        fix_cancel_orders = b""
         fix_cancel_orders += self.fix_cancel_order(order_id, order_request_id)
         try:
             self.print_fix_message("fix_cancel_orders", fix_cancel_orders)
-            self.trade_writer.write(bytes(fix_cancel_orders, "UTF-8"))
-            self.orders = [d for d in self.orders if d["order_id"] != order_id]
+            self.trade_writer.write(fix_cancel_orders)
+            self.orders.remove(order_id)
         except Exception as e:
             print(
                 f"ERROR: Unable to cancel order of order_id={order_id}, "
                 f"on {self.broker}, with exception={e}."
             )
-        # remove all the orders that have order_id we want
-        # usually it should be only one, but just in case
-        # use list comprehension to be faster and more concise
-        # self.orders = [d for d in self.orders if d["order_id"] != order_id]
-        # self.orders.discard(order_id)
 
     async def cancel_all_orders_for_one_position(
         self,
         position_id: str,
     ) -> List[str]:
         """Close all orders for one position."""
-        order_ids = [
-            d["order_id"] for d in self.orders if d["position_id"] == position_id
-        ]
-        fix_cancel_orders = ""
+        order_ids = self.orders.keys_by("position_id", position_id)
+        fix_cancel_orders = b""
         for order_id in order_ids:
             fix_cancel_orders += self.fix_cancel_order(order_id)
         try:
             self.print_fix_message("fix_cancel_orders", fix_cancel_orders)
-            self.trade_writer.write(bytes(fix_cancel_orders, "UTF-8"))
-            self.orders = [d for d in self.orders if d["order_id"] not in order_ids]
+            self.trade_writer.write(fix_cancel_orders)
+            self.orders.remove_many(order_ids)
         except Exception as e:
             print(
                 f"Unable to cancel order of order_id={order_id}, "
                 f"on {self.broker}, with exception={e}."
             )
-        # remove all the orders that have order_id we want
-        # usually it should be only one, but just in case
-        # use list comprehension to be faster and more concise
-        # self.orders = [d for d in self.orders if d["order_id"] not in order_ids]
         return order_ids
 
-    async def cancel_all_orders_for_one_symbol(
+    async def cancel_orders_in_scope(
         self,
-        symbol: str,
+        symbols: Optional[List[str]] = None,
+        direction: Optional[str] = None,
     ) -> List[str]:
-        """Close all orders for one symbol."""
-        order_ids = [d["order_id"] for d in self.orders if d["symbol"] == symbol]
-        fix_cancel_orders = ""
-        for order_id in order_ids:
-            fix_cancel_orders += self.fix_cancel_order(order_id)
+        """Cancel the orders of symbols and direction, all if None, in one write.
+
+        With one OrderMassCancelRequest per symbol (or one for all the symbols),
+        or if the server does not support it, with one cancel per order.
+        """
+        # order_ids by symbol, or all of them under None
+        scope = {
+            symbol: [
+                order_id
+                for order_id in (
+                    self.orders.keys()
+                    if symbol is None
+                    else self.orders.keys_by("symbol", symbol)
+                )
+                if direction is None
+                or self.orders.get(order_id)["order_direction"] == direction
+            ]
+            for symbol in (symbols if symbols is not None else [None])
+        }
+        order_ids = [order_id for ids in scope.values() for order_id in ids]
+        if not order_ids:
+            return order_ids
+        if self.mass_cancel_supported:
+            fix_cancel_orders = b""
+            for symbol, ids in scope.items():
+                cl_ord_id = f"mc{self.trade_msgseqnum}"
+                self.mass_cancels[cl_ord_id] = ids
+                fix_cancel_orders += self.fix_mass_cancel(cl_ord_id, symbol, direction)
+        else:
+            fix_cancel_orders = self.fix_cancel_orders(order_ids)
         try:
             self.print_fix_message("fix_cancel_orders", fix_cancel_orders)
-            self.trade_writer.write(bytes(fix_cancel_orders, "UTF-8"))
-            # remove all the orders that have order_id we want
-            # for order_id in order_ids:
-            #    self.orders.discard(order_id)
-            self.orders = [d for d in self.orders if d["order_id"] not in order_ids]
+            self.trade_writer.write(fix_cancel_orders)
+            self.orders.remove_many(order_ids)
         except Exception as e:
             print(
-                f"Unable to cancel order of order_id={order_id}, "
+                f"Unable to cancel orders of order_ids={order_ids}, "
                 f"on {self.broker}, with exception={e}."
             )
-        # remove all the orders that have order_id we want
-        # usually it should be only one, but just in case
-        # use list comprehension to be faster and more concise
-        # self.orders = [d for d in self.orders if d["order_id"] not in order_ids]
         return order_ids
 
+    def cancel_mass_cancelled_orders(self, cl_ord_id: Optional[str] = None) -> None:
+        """Cancel one by one the orders of rejected mass cancels, all if None."""
+        if cl_ord_id is None:
+            order_ids = [o for ids in self.mass_cancels.values() for o in ids]
+            self.mass_cancels = {}
+        else:
+            order_ids = self.mass_cancels.pop(cl_ord_id, [])
+        if order_ids:
+            self.trade_writer.write(self.fix_cancel_orders(order_ids))
+
+    async def cancel_all_orders_for_one_symbol(
+        self,
+        symbol: str,
+        direction: Optional[str] = None,
+    ) -> List[str]:
+        """Close all orders for one symbol."""
+        return await self.cancel_orders_in_scope([symbol], direction)
+
     async def cancel_all_orders_for_several_symbols(
         self,
         symbols: List[str],
+        direction: Optional[str] = None,
     ) -> List[str]:
         """Close all orders for several symbols."""
-        order_ids = [d["order_id"] for d in self.orders if d["symbol"] in symbols]
-        fix_cancel_orders = ""
-        for order_id in order_ids:
-            fix_cancel_orders += self.fix_cancel_order(order_id)
-        try:
-            self.print_fix_message("fix_cancel_orders", fix_cancel_orders)
-            self.trade_writer.write(bytes(fix_cancel_orders, "UTF-8"))
-            # remove all the orders that have order_id we want
-            for order_id in order_ids:
-                self.orders.discard(order_id)
-        except Exception as e:
-            print(
-                f"Unable to cancel order of order_id={order_id}, "
-                f"on {self.broker}, with exception={e}."
-            )
-        # remove all the orders that have order_id we want
-        # usually it should be only one, but just in case
-        # use list comprehension to be faster and more concise
-        # self.orders = [d for d in self.orders if d["order_id"] not in order_ids]
-        return order_ids
+        return await self.cancel_orders_in_scope(symbols, direction)
 
     async def cancel_all_orders(
         self,
+        direction: Optional[str] = None,
     ) -> List[str]:
         """Close all orders."""
-        order_ids = [d["order_id"] for d in self.orders]
-        fix_cancel_orders = ""
-        for order_id in order_ids:
-            fix_cancel_orders += self.fix_cancel_order(order_id)
+        return await self.cancel_orders_in_scope(None, direction)
+
+    async def wait_for_position(
+        self, position_id: str, timeout: Optional[float] = None
+    ) -> Optional[Dict]:
+        """Wait until a position is received, None if not within timeout seconds."""
+        d = self.positions.get(position_id)
+        if d is not None:
+            return d
+        future = asyncio.get_running_loop().create_future()
+        self.position_waiters.setdefault(position_id, []).append(future)
         try:
-            self.print_fix_message("fix_cancel_orders", fix_cancel_orders)
-            self.trade_writer.write(bytes(fix_cancel_orders, "UTF-8"))
-            # remove all the orders that have order_id we want
-            for order_id in order_ids:
-                self.orders.discard(order_id)
-        except Exception as e:
-            print(
-                f"Unable to cancel order of order_id={order_id}, "
-                f"on {self.broker}, with exception={e}."
-            )
-        # remove all the orders that have order_id we want
-        # usually it should be only one, but just in case
-        # use list comprehension to be faster and more concise
-        # self.orders = [d for d in self.orders if d["order_id"] not in order_ids]
-        return order_ids
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            waiters = self.position_waiters.get(position_id)
+            if waiters is not None and future in waiters:
+                waiters.remove(future)
+                if not waiters:
+                    del self.position_waiters[position_id]
 
     async def close_position(
         self,
         position_id: str,
+        timeout: Optional[float] = None,
     ) -> None:
-        """Close a position by creating a market order of oppoiste sign same quantity."""
+        """Close a position by creating a market order of oppoiste sign same quantity.
+
+        A position not received yet, as when the close comes right after the open,
+        is closed as soon as its position report or the last fill of its order is
+        received, within timeout seconds (close_timeout by default).
+        """
         print(f"In close_position, self.positions={self.positions}")
-        positions = [d for d in self.positions if d["position_id"] == position_id]
-        if len(positions) == 0:
-            await asyncio.sleep(0.001)
-            positions = [d for d in self.positions if d["position_id"] == position_id]
-        if len(positions) == 0:
-            await asyncio.sleep(0.001)
-            positions = [d for d in self.positions if d["position_id"] == position_id]
-        if len(positions) == 0:
+        d = self.positions.get(position_id)
+        if d is not None:
+            self.write_close(d)
+            return
+        if position_id in self.closing:
+            return
+        self.pending_closes.add(position_id)
+        timeout = self.close_timeout if timeout is None else timeout
+        if await self.wait_for_position(position_id, timeout) is None:
+            self.pending_closes.discard(position_id)
             print(
-                f"WARNING!!! position_id={position_id} not found, "
+                f"WARNING!!! position_id={position_id} not found within {timeout}s, "
                 f"so can not close. self.positions={self.positions}"
             )
-            return
 
-        position_ids = [d["position_id"] for d in positions]
-        fix_close_positions = ""
-        for d in positions:
-            fix_close_positions += self.fix_set_order(
-                symbol=d["symbol"],
-                direction="buy" if d["direction"] == "sell" else "sell",
-                order_type="market",
-                quantity_to_trade=d["quantity"],
-                price=None,
-                position_id=d["position_id"],
-            )
+    def write_close(self, d: Dict) -> None:
+        """Close a position received, with a market order of opposite direction."""
+        position_id = d["position_id"]
+        # the ClOrdID of an order is the MsgSeqNum of its message
+        cl_ord_id = str(self.trade_msgseqnum)
+        fix_close_positions = self.fix_set_order(
+            symbol=d["symbol"],
+            direction="buy" if d["direction"] == "sell" else "sell",
+            order_type="market",
+            quantity_to_trade=d["quantity"],
+            price=None,
+            position_id=position_id,
+        )
         try:
             self.print_fix_message("fix_close_positions", fix_close_positions)
-            self.trade_writer.write(bytes(fix_close_positions, "UTF-8"))
-            # remove from the list of positions
-            # wait asyncio.sleep(0.1)
-            ds = [d for d in self.positions if d["position_id"] in position_ids]
-            for d in ds:
-                self.positions.remove(d)
-            # self.positions = [
-            #    d for d in self.positions if d["position_id"] != position_id
-            # ]
-            # self.position_ids.discard(position_id)
+            self.trade_writer.write(fix_close_positions)
+            # remove from the positions, the fill of the close is not applied
+            self.positions.remove(position_id)
+            self.closing[position_id] = cl_ord_id
             # also close all orders for that position
             # await self.cancel_all_orders_for_one_position(position_id)
         except Exception as e:
@@ -952,16 +847,43 @@ class Broker:
                 f"on {self.broker}, with exception={e}."
             )
 
+    async def close_positions(
+        self,
+        position_ids: List[str],
+    ) -> None:
+        """Close several positions, with one market order each, in one write."""
+        positions = [
+            self.positions.get(position_id)
+            for position_id in position_ids
+            if position_id in self.positions
+        ]
+        if not positions:
+            return
+        # the ClOrdIDs of the orders are the MsgSeqNums of their messages
+        first = self.trade_msgseqnum
+        fix_close_positions = self.fix_close_positions(positions)
+        try:
+            self.print_fix_message("fix_close_positions", fix_close_positions)
+            self.trade_writer.write(fix_close_positions)
+            # remove from the positions, the fills of the closes are not applied
+            self.positions.remove_many(position_ids)
+            self.closing.update(
+                (d["position_id"], str(first + i)) for i, d in enumerate(positions)
+            )
+        except Exception as e:
+            print(
+                f"Unable to close positions of position_ids={position_ids}, "
+                f"on {self.broker}, with exception={e}."
+            )
+
     async def close_all_positions_for_one_symbol(
         self,
         symbol: str,
     ) -> None:
         """Close all positions for one symbol."""
         print(f"In close_all_positions_for_one_symbol, self.positions={self.positions}")
-        position_ids = [d["position_id"] for d in self.positions if d["symbol"] == symbol]
-        for position_id in position_ids:
-            print(f"Closing position_id={position_id}")
-            asyncio.create_task(self.close_position(position_id))
+        position_ids = self.positions.keys_by("symbol", symbol)
+        await self.close_positions(position_ids)
 
     async def close_all_positions_for_several_symbols(
         self,
@@ -969,66 +891,70 @@ class Broker:
     ) -> None:
         """Close all positions for several symbols."""
         position_ids = [
-            d["position_id"] for d in self.positions if d["symbol"] in symbols
+            position_id
+            for symbol in symbols
+            for position_id in self.positions.keys_by("symbol", symbol)
         ]
-        for position_id in position_ids:
-            asyncio.create_task(self.close_position(position_id))
+        await self.close_positions(position_ids)
 
     async def close_all_positions(
         self,
     ) -> None:
         """Close all positions."""
-        position_ids = [d["position_id"] for d in self.positions]
-        for position_id in position_ids:
-            asyncio.create_task(self.close_position(position_id))
+        position_ids = self.positions.keys()
+        await self.close_positions(position_ids)
 
     async def read_price_data(self) -> None:
-        """Reads data asynchronously from the price stream."""
-        while True:
-            # print("Read price data again.")
-            # await asyncio.sleep(2)
+        """Reads data asynchronously from the price stream, until it ends."""
+        async for frame in read_frames(self.price_reader):
+            self.price_supervisor.received()
             try:
-                # print("Read price data first 16 bytes that represent the header")
-                header_bytes = await self.price_reader.read(16)
-                # print(f"header={header}")
-                header = header_bytes.decode().replace("\u0001", "|")
-                # print(f"header={header}")
-                if match := re.search("9=(\\d+)", header):
-                    index = int(match.group(1))
-                    ti = index - 1 if index < 100 else index
-                    # print(f"ti={ti}, then read the following 7 in second")
-                    second = await self.price_reader.read(ti + 7)
-                    # print(f"second={second}")
-                    full_message = header + second.decode().replace("\u0001", "|")
-                    # print(f"INFO: Read price data: full_message={full_message}")
-                    if "35=W" in full_message:
-                        # print("Price stream 35=W was found, "
-                        #       "so search for prices the fields with 270"
-                        # )
-                        prices = re.findall("270=([^|]*)", full_message)
-                        # print(f"prices={prices}")
-                        self.bid = prices[0]
-                        self.ask = prices[1]
-                        # print(f"self.bid={self.bid}, self.ask={self.ask}")
-                    # print("Print again the full message")
-                    # print(full_message)
-                    # print("Done read the full message")
+                self.handle_price_message(frame)
             except Exception as e:
-                print(
-                    f"PRICE Unable to read from server for {self.broker}, "
-                    f"for self.price_msgseqnum={self.price_msgseqnum}, "
-                    f"with exception='{e}'."
+                print(f"ERROR: PRICE message not handled: {frame!r}, {e}")
+        print(f"PRICE stream closed by the server for {self.broker}.")
+
+    def handle_price_message(self, frame: bytes) -> None:
+        """Handle one message of the price stream, as received."""
+        if b"\x0135=1\x01" in frame:
+            # test request, answered by a heartbeat
+            test_req_id = re.search(b"\x01112=([^\x01]*)", frame)
+            self.price_writer.write(
+                self.fix_heartbeat_to_a_stream(
+                    "QUOTE", test_req_id.group(1) if test_req_id else b""
+                )
+            )
+        elif b"\x0135=A\x01" in frame:
+            print(f"price response LOGON: full_message={readable(frame)}")
+            self.price_supervisor.connected()
+        elif b"\x0135=W\x01" in frame or b"\x0135=X\x01" in frame:
+            # snapshot or incremental refresh of the prices
+            if not self.quote_listeners:
+                self.quotes.apply(frame)
+                return
+            updated: List[int] = []
+            self.quotes.apply(frame, updated=updated)
+            now = time.time_ns()
+            for symbol_id in updated:
+                self.notify_quote(
+                    self.symbol_names.get(symbol_id, str(symbol_id)),
+                    now,
+                    self.quotes.bids[symbol_id],
+                    self.quotes.asks[symbol_id],
                 )
-                # if we could not connect to the server
-                if tcp_ping("www.google.com", 80):
-                    # we check if we have internet by pinging google
-                    # and we have internet we sent async task to login again to price
-                    asyncio.create_task(self.price_login())
-                    break
-            await asyncio.sleep(0.001)
+
+    def notify_quote(
+        self, symbol: str, ts: int, bid: float, ask: float, size: float = 0.0
+    ) -> None:
+        """Call the quote listeners with a quote."""
+        for listener in self.quote_listeners:
+            try:
+                listener(symbol, ts, bid, ask, size)
+            except Exception as e:
+                print(f"ERROR: quote listener failed for {symbol}, {e}")
 
     async def read_trade_data(self) -> None:
-        """Reads data asynchronously from the trade stream.
+        """Reads data asynchronously from the trade stream, until it ends.
 
         Will positions also be removed when I close them? To check.
         But the code seems only to append or not append.
@@ -1036,166 +962,242 @@ class Broker:
         But we need to add a function to close only one position, or a list of positions,
         and then we need to remove only that position from the list.
         """
-        while True:
+        async for frame in read_frames(self.trade_reader):
+            self.trade_supervisor.received()
             try:
-                # print("Read trade data: Read first 16 bytes that represent the header")
-                header_bytes = await self.trade_reader.read(16)
-                header = header_bytes.decode().replace("\u0001", "|")
-                # print(f"header={header}")
-                if match := re.search("9=(\\d+)", header):
-                    index = int(match.group(1))
-                    ti = index - 1 if index < 100 else index
-                    # print(f"ti={ti}, then read the following 7 in second")
-                    second = await self.trade_reader.read(ti + 7)
-                    # print(f"second={second}")
-                    full_message = header + second.decode().replace("\u0001", "|")
-                    # print(f"INFO: trade response: full_message={full_message}")
-                    if "35=AP" in full_message:
-                        # this is a response to a request for positions
-                        print(f"trade response position: full_message={full_message}")
-                        d = self.parse_one_position_message(full_message)
-                        # print(d)
-                        # print(f"len(self.positions)={len(self.positions)}")
-                        # print(f"len(positions)={len(self.positions)}")
-                        # print(f"len(self.positions)={len(self.positions)}")
-                        # print("Z")
-                        # print(f"self.get_all_position_ids(self.orders)={self.get_all_position_ids(self.positions)}")  # noqa
-                        # print("W")
-                        # print(f"len(self.positions)={len(self.positions)}")
-                        # print(self.positions)
-                        # print("our new position received")
-                        # print(f"d={d}")
-                        # print("Check if it exists in the set of positions")
-                        # if d is not None:
-                        # self.positions.add(d)
-                        # self.position_ids.add(d["position_id"])
-
-                        # print("BBB")
-                        # print(self.positions)
-                        # print(self.position_ids)
-                        # print(f"d={d}")
-                        # print("CCC")
-                        if (
-                            True
-                            and (d is not None)
-                            and d["position_id"]
-                            not in self.get_all_position_ids(self.positions)
-                        ):
-                            # ] not in self.position_ids:
-                            # print("A")
-                            # print("position does not exist in the set of positions")
-                            self.positions.append(d)
-                            # print("B")
-                            # self.position_ids.add(d["position_id"])
-                            # print("C")
-                            # print("We added it to the set of possitions")
-                            self.num_opened_positions = d["num_opened_positions"]
-                            # print("D")
-                        # print("E")
-                        # print(
-                        # f"after adding position len(self.positions)={len(self.positions)}, "
-                        # f"num_opened_positions={self.num_opened_positions},"
-                        # f"position_ids={self.position_ids}"
-                        # )
-                        # print(self.positions)
-                    elif "35=8" in full_message:
-                        # this is a response to a request for orders
-                        # if "543140337" in full_message:
-                        print(
-                            f"INFO: trade response order EXECUTION REPORT: full_message={full_message}"
-                        )
-                        d = self.parse_one_order_message(full_message)
-                        # print(d)
-                        # print(f"len(self.orders)={len(self.orders)}")
-                        # print(f"len(orders)={len(self.orders)}")
-                        # print(f"len(self.orders)={len(self.orders)}")
-                        # print("Z")
-                        # print(f"self.get_all_order_ids(self.orders)={self.get_all_order_ids(self.orders)}")  # noqa
-                        # print("W")
-                        if (d is not None) and d[
-                            "order_id"
-                        ] not in self.get_all_order_ids(self.orders):
-                            self.orders.append(d)
-                            self.num_opened_orders = d["num_opened_orders"]
-                    elif "35=j" in full_message:
-                        if True:
-                            print(
-                                f"trade response order SET ORDER NOT EXECUTED: "
-                                f"full_message={full_message}"
-                            )
-                    elif "35=9" in full_message:
-                        if True:
-                            print(
-                                f"trade response order CANCEL ORDER NOT EXECUTED: "
-                                f"full_message={full_message}"
-                            )
-                    elif "35=0" in full_message:
-                        if True:
-                            print(
-                                f"trade response HEARTBEAT: "
-                                f"full_message={full_message}"
-                            )
-                    elif "35=1" in full_message:
-                        if True:
-                            print(
-                                f"trade response FORCED HEARTBEAT: "
-                                f"full_message={full_message}"
-                            )
-                    elif "35=2" in full_message:
-                        if True:
-                            print(
-                                f"trade response RESEND REQUEST: "
-                                f"full_message={full_message}"
-                            )
-                    elif "35=A" in full_message:
-                        if True:
-                            print(
-                                f"trade response LOGON BIRECTIONAL: "
-                                f"full_message={full_message}"
-                            )
-                    elif "35=3" in full_message:
-                        # self.trade_msgseqnum += 1
-                        if True:
-                            print(
-                                f"trade response REJECT BIRECTIONAL MUST BE INCREMENTED SEQUENCE NUMBER: "
-                                f"full_message={full_message}"
-                            )
-                    elif "35=4" in full_message:
-                        if True:
-                            print(
-                                f"trade response SEQUENCE RESET: "
-                                f"full_message={full_message}"
-                            )
-                    elif "35=5" in full_message:
-                        if True:
-                            print(
-                                f"trade response LOGOUT message sent: "
-                                f"full_message={full_message}"
-                            )
-                    else:
-                        print(
-                            f"WARNING: trade response order UNKNOWN CATEGORY: "
-                            f"full_message={full_message}"
-                        )
-
-                    # print(
-                    #    f"len(self.positions)={len(self.positions)}, "
-                    #    f"num_opened_positions={self.num_opened_positions}"
-                    #    )
-                    # print(f"opened_positions={self.opened_positions}")
-                    # print(full_message)
-            except Exception:
-                print(f"TRADE Unable to read from server for {self.broker}")
-                # if we could not connect to the server
-                if tcp_ping("www.google.com", 80):
-                    print("But we have internet, so creating a new trade_login_main()")
-                    # we check if we have internet by pinging google
-                    # and we have internet we sent async task to login again to trade
-                    asyncio.create_task(self.trade_login())
-                    print("Done create trade_login_main()")
-                    break
-            # print("Finish read_trade_data")
-            # for position in self.positions:
-            #    print(f"position={position}")
-            await asyncio.sleep(0.001)
-            # print("Finish await 0.001 seconds")
+                self.handle_trade_message(frame)
+            except Exception as e:
+                print(f"ERROR: TRADE message not handled: {frame!r}, {e}")
+        print(f"TRADE stream closed by the server for {self.broker}.")
+
+    def handle_trade_message(self, frame: bytes) -> None:
+        """Handle one message of the trade stream, as received."""
+        fields = parse(frame)
+        handler = Broker.trade_dispatch.get(fields.get(MSG_TYPE))
+        if handler is None:
+            print(
+                f"WARNING: trade response order UNKNOWN CATEGORY: "
+                f"full_message={readable(frame)}"
+            )
+            return
+        handler(self, frame, fields)
+
+    def process_position_report(self, frame: bytes, fields: Fields) -> None:
+        """Process a position report (35=AP), answering a request for positions."""
+        print(f"trade response position: full_message={readable(frame)}")
+        if fields.get(b"728") == b"2":
+            # PosReqResult: no positions
+            self.positions.clear()
+            self.num_opened_positions = 0
+            self.position_snapshot = None
+            return
+        d = decode_position_report(fields)
+        if d is None:
+            return
+        if d["position_id"] not in self.closing:
+            self.positions.upsert(d)
+            self.num_opened_positions = d["num_opened_positions"]
+            self.position_received(d)
+        if self.position_snapshot is None:
+            return
+        # a position being closed is not kept, but counts in the snapshot
+        self.position_snapshot.add(d["position_id"])
+        self.position_reports += 1
+        if self.position_reports >= d["num_opened_positions"]:
+            # complete, the positions not in it were closed meanwhile
+            self.positions.remove_many(
+                [k for k in self.positions.keys() if k not in self.position_snapshot]
+            )
+            self.position_snapshot = None
+
+    def process_execution_report(self, frame: bytes, fields: Fields) -> None:
+        """Process an execution report (35=8), also answering a request for orders."""
+        print(
+            f"INFO: trade response order EXECUTION REPORT: full_message={readable(frame)}"
+        )
+        d = decode_execution_report(fields)
+        if d is None:
+            return
+        if d["execution_type"] == "trade":
+            self.apply_fill(d)
+        elif d["execution_type"] in ("rejected", "canceled", "expired"):
+            self.close_not_filled(d)
+        if d["order_status"] in ORDER_STATUS_DONE:
+            # filled, cancelled, rejected or expired, not an order anymore
+            self.orders.remove(d["order_id"])
+        else:
+            self.orders.upsert(d)
+            self.num_opened_orders = d["num_opened_orders"]
+
+    def apply_fill(self, d: Dict) -> None:
+        """Apply a fill, or a partial fill, of an order to its position."""
+        order_id = d["order_id"]
+        position_id = d["position_id"]
+        # CumQty is the total of the order, the fill is what was not seen yet
+        quantity = d["quantity_filled"] - self.filled_quantities.pop(order_id, 0.0)
+        if d["quantity_not_filled"] > 0:
+            self.filled_quantities[order_id] = d["quantity_filled"]
+        elif self.closing.get(position_id) == d["order_request_id"]:
+            # the close is filled
+            del self.closing[position_id]
+            return
+        if quantity <= 0 or position_id is None or position_id in self.closing:
+            return
+        if self.position_snapshot is not None:
+            # not in the snapshot being received, but not closed
+            self.position_snapshot.add(position_id)
+        signed = quantity if d["order_direction"] == "buy" else -quantity
+        position = self.positions.get(position_id)
+        if position is None:
+            self.num_opened_positions = len(self.positions) + 1
+            position = {
+                "position_id": position_id,
+                "symbol": d["symbol"],
+                "symbol_id": d["symbol_id"],
+                "direction": d["order_direction"],
+                "quantity": quantity,
+                "cost_price": d["price_last"],
+                "num_opened_positions": self.num_opened_positions,
+            }
+            self.positions.upsert(position)
+            if d["quantity_not_filled"] == 0:
+                self.position_received(position)
+            return
+        net = (
+            position["quantity"]
+            if position["direction"] == "buy"
+            else -position["quantity"]
+        )
+        new_net = net + signed
+        if abs(new_net) < 1e-9:
+            self.positions.remove(position_id)
+            self.num_opened_positions = len(self.positions)
+            return
+        cost_price = position["cost_price"]
+        if net * signed > 0:
+            # increased, the price is the average of the two
+            cost_price = (abs(net) * cost_price + quantity * d["price_last"]) / abs(
+                new_net
+            )
+        position = {
+            **position,
+            "direction": "buy" if new_net > 0 else "sell",
+            "quantity": abs(new_net),
+            "cost_price": cost_price,
+        }
+        self.positions.upsert(position)
+        if d["quantity_not_filled"] == 0:
+            # a close pending since the order was sent closes all it opened
+            self.position_received(position)
+
+    def close_not_filled(self, d: Dict) -> None:
+        """Keep a position whose close is rejected, requesting the positions again.
+
+        The position was removed when its close was written, and the close may
+        have been partially filled before, so the positions are requested.
+        """
+        position_id = d["position_id"]
+        if (
+            self.closing.get(position_id) != d["order_request_id"]
+            or position_id in self.positions
+        ):
+            return
+        print(f"WARNING: close of position_id={position_id} not filled, {d}")
+        del self.closing[position_id]
+        self.filled_quantities.pop(d["order_id"], None)
+        self.trade_writer.write(self.fix_request_positions())
+
+    def position_received(self, d: Dict) -> None:
+        """Close a position if a close is pending, then wake up its waiters."""
+        position_id = d["position_id"]
+        if position_id in self.pending_closes:
+            self.pending_closes.discard(position_id)
+            self.write_close(d)
+        for future in self.position_waiters.pop(position_id, []):
+            if not future.done():
+                future.set_result(d)
+
+    def process_mass_cancel_report(self, frame: bytes, fields: Fields) -> None:
+        """Process an order mass cancel report (35=r)."""
+        print(f"trade response MASS CANCEL REPORT: full_message={readable(frame)}")
+        cl_ord_id = fields.get(b"11")
+        if cl_ord_id is None:
+            return
+        if fields.get(b"531") == b"0":
+            # rejected, cancel the orders one by one
+            self.cancel_mass_cancelled_orders(cl_ord_id.decode())
+        else:
+            self.mass_cancels.pop(cl_ord_id.decode(), None)
+
+    def process_reject(self, frame: bytes, fields: Fields) -> None:
+        """Process a reject (35=3) or a business message reject (35=j)."""
+        if fields.get(b"372") == b"q":
+            # the server does not know OrderMassCancelRequest
+            print(
+                f"trade response MASS CANCEL NOT SUPPORTED: "
+                f"full_message={readable(frame)}"
+            )
+            self.mass_cancel_supported = False
+            self.cancel_mass_cancelled_orders()
+        elif fields[MSG_TYPE] == b"j":
+            print(
+                f"trade response order SET ORDER NOT EXECUTED: "
+                f"full_message={readable(frame)}"
+            )
+        else:
+            print(
+                f"trade response REJECT BIRECTIONAL MUST BE INCREMENTED SEQUENCE NUMBER: "
+                f"full_message={readable(frame)}"
+            )
+
+    def process_cancel_reject(self, frame: bytes, fields: Fields) -> None:
+        """Process an order cancel reject (35=9)."""
+        print(
+            f"trade response order CANCEL ORDER NOT EXECUTED: "
+            f"full_message={readable(frame)}"
+        )
+
+    def process_heartbeat(self, frame: bytes, fields: Fields) -> None:
+        """Process a heartbeat (35=0)."""
+        print(f"trade response HEARTBEAT: full_message={readable(frame)}")
+
+    def process_test_request(self, frame: bytes, fields: Fields) -> None:
+        """Process a test request (35=1), answered by a heartbeat."""
+        print(f"trade response FORCED HEARTBEAT: full_message={readable(frame)}")
+        self.trade_writer.write(
+            self.fix_heartbeat_to_a_stream("TRADE", fields.get(b"112", b""))
+        )
+
+    def process_resend_request(self, frame: bytes, fields: Fields) -> None:
+        """Process a resend request (35=2)."""
+        print(f"trade response RESEND REQUEST: full_message={readable(frame)}")
+
+    def process_logon(self, frame: bytes, fields: Fields) -> None:
+        """Process a logon (35=A), then request the positions."""
+        print(f"trade response LOGON BIRECTIONAL: full_message={readable(frame)}")
+        self.trade_supervisor.connected()
+        self.trade_writer.write(self.fix_request_positions())
+
+    def process_sequence_reset(self, frame: bytes, fields: Fields) -> None:
+        """Process a sequence reset (35=4)."""
+        print(f"trade response SEQUENCE RESET: full_message={readable(frame)}")
+
+    def process_logout(self, frame: bytes, fields: Fields) -> None:
+        """Process a logout (35=5)."""
+        print(f"trade response LOGOUT message sent: full_message={readable(frame)}")
+
+    # MsgType to the method handling the messages of the trade stream
+    trade_dispatch = {
+        b"0": process_heartbeat,
+        b"1": process_test_request,
+        b"2": process_resend_request,
+        b"3": process_reject,
+        b"4": process_sequence_reset,
+        b"5": process_logout,
+        b"8": process_execution_report,
+        b"9": process_cancel_reject,
+        b"A": process_logon,
+        b"j": process_reject,
+        b"r": process_mass_cancel_report,
+        b"AP": process_position_report,
+    }
@@ -0,0 +1,128 @@
+"""Module to split the FIX messages received on an asyncio stream.
+
+Each frame is located from its header: BeginString (8=FIX.4.4), then
+BodyLength (9=N), then exactly N bytes of body and the 7 bytes of the
+CheckSum trailer (10=NNN). The frames already buffered by the StreamReader
+are returned without waiting, so a burst of messages is drained at once.
+The bytes of a frame found wrong are read again from the next BeginString in
+them, so a frame following a corrupt header is not lost with it.
+"""
+
+# python
+import asyncio
+import logging
+from typing import AsyncIterator, Optional
+
+BEGIN_STRING = b"8=FIX"
+BODY_LENGTH = b"9="
+CHECKSUM = b"10="
+SOH = b"\x01"
+# 10=NNN<SOH>
+TRAILER_LENGTH = 7
+# BodyLength values are small, more digits than this means a corrupt header
+MAX_BODY_LENGTH_DIGITS = 9
+# bytes kept of a field longer than the limit of the reader, enough for the
+# BeginString of the next frame: 8=FIX.4.4 or 8=FIXT.1.1
+BEGIN_FIELD_LENGTH = 10
+
+
+async def read_field(reader: asyncio.StreamReader, pending: bytearray) -> bytes:
+    """Read up to the next SOH, keeping only the end of a field over the limit.
+
+    The bytes pending, read again after a wrong frame, come first. Without a SOH
+    within the limit of the reader, readuntil() raises LimitOverrunError and
+    leaves the bytes buffered: they are skipped, except the last ones, where a
+    BeginString may start.
+    """
+    soh = pending.find(SOH)
+    if soh != -1:
+        field = bytes(pending[: soh + 1])
+        del pending[: soh + 1]
+        return field
+    head = bytes(pending)
+    pending.clear()
+    while True:
+        try:
+            return head + await reader.readuntil(SOH)
+        except asyncio.LimitOverrunError as e:
+            skipped = head + await reader.readexactly(e.consumed)
+            logging.warning(f"Field over the limit of the stream: {skipped[:20]!r}")
+            head = skipped[-BEGIN_FIELD_LENGTH:]
+
+
+async def read_exactly(
+    reader: asyncio.StreamReader, pending: bytearray, n: int
+) -> bytes:
+    """Read n bytes, the bytes pending first."""
+    data = bytes(pending[:n])
+    del pending[:n]
+    if len(data) < n:
+        data += await reader.readexactly(n - len(data))
+    return data
+
+
+def read_again(skipped: bytes, pending: bytearray) -> None:
+    """Put back the bytes of a wrong frame from the next BeginString in them."""
+    start = skipped.find(BEGIN_STRING, 1)
+    if start != -1:
+        pending[:0] = skipped[start:]
+
+
+async def read_frame(
+    reader: asyncio.StreamReader, pending: bytearray
+) -> Optional[bytes]:
+    """Read the next frame as raw bytes, None at the end of the stream.
+
+    Bytes before a BeginString, and frames with a wrong header, trailer or
+    checksum, are skipped, up to the next BeginString in them.
+    """
+    try:
+        while True:
+            begin = await read_field(reader, pending)
+            start = begin.rfind(BEGIN_STRING)
+            if start == -1:
+                # not at the start of a frame, skip up to the next field
+                continue
+            begin = begin[start:]
+            length = await read_field(reader, pending)
+            if (
+                not length.startswith(BODY_LENGTH)
+                or not length[2:-1].isdigit()
+                or len(length) - 3 > MAX_BODY_LENGTH_DIGITS
+            ):
+                logging.warning(f"Frame without BodyLength: {begin + length!r}")
+                read_again(begin + length, pending)
+                continue
+            rest = await read_exactly(
+                reader, pending, int(length[2:-1]) + TRAILER_LENGTH
+            )
+            frame = begin + length + rest
+            trailer = rest[-TRAILER_LENGTH:]
+            if (
+                not trailer.startswith(CHECKSUM)
+                or not trailer.endswith(SOH)
+                or not trailer[3:6].isdigit()
+            ):
+                logging.warning(f"Frame with a wrong BodyLength: {frame!r}")
+                read_again(frame, pending)
+                continue
+            if int(trailer[3:6]) != sum(frame[:-TRAILER_LENGTH]) % 256:
+                logging.warning(f"Frame with a wrong CheckSum: {frame!r}")
+                read_again(frame, pending)
+                continue
+            return frame
+    except asyncio.IncompleteReadError as e:
+        if e.partial:
+            logging.warning(f"Stream closed inside a frame: {e.partial!r}")
+        return None
+
+
+async def read_frames(reader: asyncio.StreamReader) -> AsyncIterator[bytes]:
+    """Iterate over the frames of a stream, until it ends."""
+    # bytes read from the stream, to be read again after a wrong frame
+    pending = bytearray()
+    while True:
+        frame = await read_frame(reader, pending)
+        if frame is None:
+            return
+        yield frame
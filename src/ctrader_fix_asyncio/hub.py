@@ -0,0 +1,66 @@
+"""Module for the hub sharing one price stream between the Brokers of a host.
+
+The accounts on the same cServer host receive the same quotes, so only the
+first Broker added for a host and price port logs on to the price stream,
+subscribed to the symbols of all of them. The other Brokers share its table of
+quotes, so each message is parsed once and their bid and ask are current
+without any work per account, and their quote listeners are called with the
+quotes of their own symbols. The trade stream of each account is its own.
+"""
+
+# python
+import asyncio
+from typing import Dict, List, Tuple
+
+# our modules
+from ctrader_fix_asyncio.broker import Broker, assets
+from market_data import QuoteListener
+
+
+class MarketDataHub:
+    """One price stream per host, fanned out to the Brokers of its accounts."""
+
+    def __init__(self) -> None:
+        """Init without Brokers."""
+        # the Brokers by host and price port, the first one runs the price stream
+        self.groups: Dict[Tuple[str, int], List[Broker]] = {}
+
+    def add(self, broker: Broker) -> Broker:
+        """Add a Broker with its symbols set, return the one of its price stream."""
+        group = self.groups.setdefault((broker.hostname, broker.price_port), [])
+        group.append(broker)
+        source = group[0]
+        if broker is source:
+            return source
+        broker.quotes = source.quotes
+        source.add_quote_listener(self.forward(broker))
+        new = [symbol for symbol in broker.symbols if symbol not in source.symbols]
+        if new:
+            source.symbols = source.symbols + new
+            source.symbol_names.update(
+                {assets[symbol]["symbol_id"]: symbol for symbol in new}
+            )
+            if source.price_writer is not None and not source.price_writer.is_closing():
+                # already subscribed to the others
+                source.price_writer.write(source.fix_market_data_request(new))
+        return source
+
+    @staticmethod
+    def forward(broker: Broker) -> QuoteListener:
+        """Listener of the shared stream passing a Broker the quotes of its symbols."""
+
+        def listener(
+            symbol: str, ts: int, bid: float, ask: float, size: float = 0.0
+        ) -> None:
+            if symbol in broker.symbols:
+                broker.notify_quote(symbol, ts, bid, ask, size)
+
+        return listener
+
+    def sources(self) -> List[Broker]:
+        """The Brokers running a price stream, one per host."""
+        return [group[0] for group in self.groups.values()]
+
+    async def price_login(self) -> None:
+        """Login to the price stream of each host, and again each time it is lost."""
+        await asyncio.gather(*(source.price_login() for source in self.sources()))
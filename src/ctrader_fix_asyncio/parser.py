@@ -0,0 +1,135 @@
+"""Module to parse the FIX messages received by Broker.
+
+A frame is split once into a mapping of tag to value, both kept as bytes, and
+the execution reports (35=8) and position reports (35=AP) are decoded from that
+mapping into the dictionaries used by Broker.
+"""
+
+# python
+from typing import Any, Dict, Optional
+
+# our modules
+from configs.assets import DICT_SYMBOL_ID_SYMBOL
+
+SOH = b"\x01"
+MSG_TYPE = b"35"
+
+Fields = Dict[bytes, bytes]
+
+ORDER_STATUS = {
+    b"0": "new",
+    b"1": "partially_filled",
+    b"2": "filled",
+    b"4": "cancelled",
+    b"8": "rejected",
+    b"C": "expired",
+}
+# the orders with these statuses are not pending anymore
+ORDER_STATUS_DONE = ("filled", "cancelled", "rejected", "expired")
+DIRECTION = {b"1": "buy", b"2": "sell"}
+ORDER_TYPE = {b"1": "market", b"2": "limit", b"3": "stop"}
+TIME_IN_FORCE = {b"1": "GTC", b"3": "IOC", b"6": "GTD"}
+EXECUTION_TYPE = {
+    b"0": "new",
+    b"4": "canceled",
+    b"5": "replaced",
+    b"8": "rejected",
+    b"C": "expired",
+    b"F": "trade",
+    b"I": "order_status",
+}
+
+
+def parse(frame: bytes) -> Fields:
+    """Split a frame into a mapping of tag to value, in one pass.
+
+    For a tag repeated in a repeating group, the last value is kept.
+    """
+    # tags and values alternate once each = is a separator too
+    parts = frame.replace(b"=", SOH).split(SOH)
+    if len(parts) == 2 * frame.count(SOH) + 1:
+        return dict(zip(parts[::2], parts[1:-1:2]))
+    # a value with = in it, as in a Text
+    return dict(field.split(b"=", 1) for field in frame.split(SOH)[:-1])
+
+
+def readable(frame: bytes) -> str:
+    """Frame as a string with | between the fields, to be printed."""
+    return frame.decode().replace("\u0001", "|")
+
+
+def _str(fields: Fields, tag: bytes) -> Optional[str]:
+    """Value of a tag as a string, None if missing."""
+    value = fields.get(tag)
+    return value.decode() if value is not None else None
+
+
+def _float(
+    fields: Fields, tag: bytes, default: Optional[float] = 0.0
+) -> Optional[float]:
+    """Value of a tag as a float, default if missing."""
+    value = fields.get(tag)
+    return float(value) if value else default
+
+
+def _int(fields: Fields, tag: bytes) -> int:
+    """Value of a tag as an int, 0 if missing."""
+    value = fields.get(tag)
+    return int(value) if value else 0
+
+
+def decode_position_report(fields: Fields) -> Optional[Dict[str, Any]]:
+    """Decode a position report (35=AP), None if it has no position."""
+    position_id = _str(fields, b"721")
+    if position_id is None:
+        return None
+    symbol_id = _int(fields, b"55")
+    # quantity can be float for BTCUSD and ETHUSD as min is 0.01
+    quantity_buy = _float(fields, b"704")
+    quantity_sell = _float(fields, b"705")
+    if quantity_buy > 0.0 and quantity_sell == 0.0:
+        direction = "buy"
+        quantity = quantity_buy
+    elif quantity_buy == 0.0 and quantity_sell > 0.0:
+        direction = "sell"
+        quantity = quantity_sell
+    else:
+        raise ValueError(f"Position {position_id} neither buy nor sell")
+    return {
+        "position_id": position_id,
+        "symbol": DICT_SYMBOL_ID_SYMBOL.get(symbol_id),
+        "symbol_id": symbol_id,
+        "direction": direction,
+        "quantity": quantity,
+        "cost_price": _float(fields, b"730"),
+        "num_opened_positions": _int(fields, b"727"),
+    }
+
+
+def decode_execution_report(fields: Fields) -> Optional[Dict[str, Any]]:
+    """Decode an execution report (35=8), None if it has no order."""
+    order_id = _str(fields, b"37")
+    if order_id is None:
+        return None
+    symbol_id = _int(fields, b"55")
+    return {
+        "order_id": order_id,
+        "position_id": _str(fields, b"721"),
+        "datetime": _str(fields, b"60"),
+        "symbol": DICT_SYMBOL_ID_SYMBOL.get(symbol_id),
+        "symbol_id": symbol_id,
+        "order_direction": DIRECTION.get(fields.get(b"54")),
+        "order_type": ORDER_TYPE.get(fields.get(b"40")),
+        "price_limit": _float(fields, b"44", None),
+        "price_stop": _float(fields, b"99", None),
+        "price_average": _float(fields, b"6"),
+        "price_last": _float(fields, b"31"),
+        "quantity_ordered": _float(fields, b"38"),
+        "quantity_filled": _float(fields, b"14"),
+        "quantity_not_filled": _float(fields, b"151"),
+        "order_status": ORDER_STATUS.get(fields.get(b"39")),
+        "time_in_force": TIME_IN_FORCE.get(fields.get(b"59")),
+        "execution_type": EXECUTION_TYPE.get(fields.get(b"150")),
+        "order_request_id": _str(fields, b"11"),
+        "num_opened_orders": _int(fields, b"911"),
+    }
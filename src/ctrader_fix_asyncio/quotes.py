@@ -0,0 +1,108 @@
+"""Module for the table of the quotes received by Broker on the price stream.
+
+The last bid, ask and time of each symbol are kept in arrays of floats indexed
+by symbol_id, so a quote is read or written in O(1) and a tick allocates no
+dictionary. Both the snapshots (35=W) and the incremental refreshes (35=X) are
+applied, each entry with a price (270) setting the bid (269=0) or the ask
+(269=1) of its symbol (55).
+"""
+
+# python
+from array import array
+import re
+import time
+from typing import List, Optional
+
+# the fields of the entries of a market data message, in the order they come
+ENTRY_FIELDS = re.compile(b"\x01(55|269|270|279)=([^\x01]*)")
+# MDUpdateAction of an entry deleted
+DELETE = b"2"
+
+
+class QuoteTable:
+    """Bid, ask and time of the last quote of each symbol, by symbol_id."""
+
+    def __init__(self, size: int = 1024) -> None:
+        """Init with room for the symbol_ids below size, grown when needed."""
+        self.bids = array("d", bytes(8 * size))
+        self.asks = array("d", bytes(8 * size))
+        # time.time() of the last quote, 0.0 if none yet
+        self.times = array("d", bytes(8 * size))
+
+    def __len__(self) -> int:
+        """Number of symbol_ids with room in the table."""
+        return len(self.bids)
+
+    def grow(self, symbol_id: int) -> None:
+        """Make room for a symbol_id, doubling the size as needed."""
+        size = len(self.bids)
+        if symbol_id < size:
+            return
+        extra = max(symbol_id + 1, 2 * size) - size
+        for values in (self.bids, self.asks, self.times):
+            values.frombytes(bytes(8 * extra))
+
+    def bid(self, symbol_id: int) -> float:
+        """Last bid of a symbol, 0.0 if none yet."""
+        return self.bids[symbol_id] if symbol_id < len(self.bids) else 0.0
+
+    def ask(self, symbol_id: int) -> float:
+        """Last ask of a symbol, 0.0 if none yet."""
+        return self.asks[symbol_id] if symbol_id < len(self.asks) else 0.0
+
+    def time(self, symbol_id: int) -> float:
+        """Time of the last quote of a symbol, 0.0 if none yet."""
+        return self.times[symbol_id] if symbol_id < len(self.times) else 0.0
+
+    def update(
+        self,
+        symbol_id: int,
+        bid: Optional[float] = None,
+        ask: Optional[float] = None,
+        now: Optional[float] = None,
+    ) -> None:
+        """Set the bid and/or the ask of a symbol."""
+        self.grow(symbol_id)
+        if bid is not None:
+            self.bids[symbol_id] = bid
+        if ask is not None:
+            self.asks[symbol_id] = ask
+        self.times[symbol_id] = time.time() if now is None else now
+
+    def apply(
+        self,
+        frame: bytes,
+        now: Optional[float] = None,
+        updated: Optional[List[int]] = None,
+    ) -> int:
+        """Apply a 35=W or 35=X message, return the number of prices set.
+
+        The symbol_ids with a price set are appended to updated, if given.
+        """
+        now = time.time() if now is None else now
+        symbol_id = -1
+        entry_type = b""
+        action = b""
+        count = 0
+        for tag, value in ENTRY_FIELDS.findall(frame):
+            if tag == b"55":
+                symbol_id = int(value)
+            elif tag == b"269":
+                entry_type = value
+            elif tag == b"279":
+                action = value
+            elif action != DELETE and symbol_id >= 0:
+                # 270, the price comes last in an entry
+                if symbol_id >= len(self.bids):
+                    self.grow(symbol_id)
+                if entry_type == b"0":
+                    self.bids[symbol_id] = float(value)
+                elif entry_type == b"1":
+                    self.asks[symbol_id] = float(value)
+                else:
+                    continue
+                self.times[symbol_id] = now
+                count += 1
+                if updated is not None and symbol_id not in updated:
+                    updated.append(symbol_id)
+        return count
@@ -0,0 +1,110 @@
+"""Module for the stores of the positions and of the orders of Broker.
+
+The records are the dictionaries decoded from the position and execution
+reports. They are kept by their id, and indexed by some of their fields (the
+symbol, the position_id, the status), so that the reports are applied and the
+records of a symbol or of a position are found in O(1), without scanning.
+A record is never changed in place: a report replaces it, so the snapshots
+given to the readers stay as they were when taken.
+"""
+
+# python
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+Record = Dict[str, Any]
+
+
+class Store:
+    """Records by a key field, with indexes on other fields."""
+
+    def __init__(self, key: str, indexes: Iterable[str] = ()) -> None:
+        """Init with the field of the key and the fields to index."""
+        self.key = key
+        self.records: Dict[str, Record] = {}
+        # field to value to keys, the keys in a dict used as an ordered set
+        self.indexes: Dict[str, Dict[Any, Dict[str, None]]] = {
+            field: {} for field in indexes
+        }
+        self._snapshot: Optional[Tuple[Mapping[str, Any], ...]] = None
+
+    def __repr__(self) -> str:
+        """The records, as a list."""
+        return repr(list(self.records.values()))
+
+    def __len__(self) -> int:
+        """Number of records."""
+        return len(self.records)
+
+    def __contains__(self, key: object) -> bool:
+        """Check a key has a record."""
+        return key in self.records
+
+    def __iter__(self) -> Iterator[Mapping[str, Any]]:
+        """Iterate over a snapshot, so the store can change meanwhile."""
+        return iter(self.snapshot())
+
+    def get(self, key: str) -> Optional[Record]:
+        """Get the record of a key."""
+        return self.records.get(key)
+
+    def keys(self) -> List[str]:
+        """Get the keys, in the order they were first added."""
+        return list(self.records)
+
+    def upsert(self, record: Record) -> None:
+        """Add a record, or replace the record with the same key."""
+        key = record[self.key]
+        old = self.records.get(key)
+        if old is not None:
+            self._unindex(key, old)
+        self.records[key] = record
+        for field, index in self.indexes.items():
+            index.setdefault(record.get(field), {})[key] = None
+        self._snapshot = None
+
+    def remove(self, key: str) -> Optional[Record]:
+        """Remove the record of a key, return it."""
+        record = self.records.pop(key, None)
+        if record is not None:
+            self._unindex(key, record)
+            self._snapshot = None
+        return record
+
+    def remove_many(self, keys: Iterable[str]) -> None:
+        """Remove the records of several keys."""
+        for key in keys:
+            self.remove(key)
+
+    def clear(self) -> None:
+        """Remove all the records."""
+        self.records.clear()
+        for index in self.indexes.values():
+            index.clear()
+        self._snapshot = None
+
+    def keys_by(self, field: str, value: Any) -> List[str]:
+        """Get the keys of the records with a value of an indexed field."""
+        return list(self.indexes[field].get(value, ()))
+
+    def by(self, field: str, value: Any) -> List[Record]:
+        """Get the records with a value of an indexed field."""
+        return [self.records[key] for key in self.indexes[field].get(value, ())]
+
+    def snapshot(self) -> Tuple[Mapping[str, Any], ...]:
+        """Get the records as read-only views, the same until the next change."""
+        if self._snapshot is None:
+            self._snapshot = tuple(
+                MappingProxyType(record) for record in self.records.values()
+            )
+        return self._snapshot
+
+    def _unindex(self, key: str, record: Record) -> None:
+        """Remove a key from the indexes of the fields of its record."""
+        for field, index in self.indexes.items():
+            keys = index.get(record.get(field))
+            if keys is None:
+                continue
+            keys.pop(key, None)
+            if not keys:
+                del index[record.get(field)]
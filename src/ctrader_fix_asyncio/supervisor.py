@@ -0,0 +1,123 @@
+"""Module for the supervisor keeping one stream of Broker connected.
+
+A session connects, logs on and reads until the connection is lost. The
+supervisor runs it again after a delay growing exponentially with the failed
+attempts, with a random jitter so that the accounts do not reconnect all at
+once, and reset once a session logs on. Liveness is detected from the stream
+itself: after HeartBtInt and a margin without receiving anything, a test
+request is sent, and if nothing is received for another HeartBtInt the session
+is cancelled and started again. Nothing blocks the event loop.
+"""
+
+# python
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, Optional
+
+# margin added to HeartBtInt before the stream is considered silent
+LIVENESS_MARGIN = 0.2
+
+
+class Supervisor:
+    """Run a session again each time it ends, with backoff and liveness checks."""
+
+    def __init__(
+        self,
+        name: str,
+        session: Callable[[], Awaitable[None]],
+        heart_bt_int: float,
+        test_request: Callable[[], None],
+        reconnect_delay: float = 1.0,
+        max_reconnect_delay: float = 60.0,
+    ) -> None:
+        """Init.
+
+        Args:
+            name ([str]): name of the stream, for the prints.
+            session ([callable]): coroutine function of one connection.
+            heart_bt_int ([float]): seconds between two heartbeats of the server.
+            test_request ([callable]): sends a test request on the stream.
+            reconnect_delay ([float]): delay before the first reconnection.
+            max_reconnect_delay ([float]): cap of the delay between reconnections.
+        """
+        self.name = name
+        self.session = session
+        self.heart_bt_int = heart_bt_int
+        self.test_request = test_request
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        # failed attempts since the last logon
+        self.attempts = 0
+        # number of sessions started
+        self.sessions = 0
+        self.last_received = time.monotonic()
+        self.stopped = False
+        self.task: Optional[asyncio.Task] = None
+
+    def received(self) -> None:
+        """Record that a message was received, called for each message."""
+        self.last_received = time.monotonic()
+
+    def connected(self) -> None:
+        """Record that the session logged on, the next delay is the first one."""
+        self.attempts = 0
+
+    def backoff(self) -> float:
+        """Delay before the next attempt, exponential with an equal jitter."""
+        cap = min(self.max_reconnect_delay, self.reconnect_delay * 2**self.attempts)
+        return cap / 2 + random.uniform(0, cap / 2)
+
+    async def run(self) -> None:
+        """Run the session until stopped."""
+        while not self.stopped:
+            self.sessions += 1
+            self.last_received = time.monotonic()
+            self.task = asyncio.create_task(self.session())
+            watchdog = asyncio.create_task(self.watch(self.task))
+            try:
+                await asyncio.wait({self.task})
+            finally:
+                watchdog.cancel()
+                if not self.task.done():
+                    # run() itself is cancelled
+                    self.task.cancel()
+            if self.task.cancelled():
+                print(f"{self.name} session cancelled.")
+            elif self.task.exception() is not None:
+                print(f"{self.name} session failed, exception={self.task.exception()}")
+            else:
+                print(f"{self.name} session ended.")
+            if self.stopped:
+                break
+            delay = self.backoff()
+            self.attempts += 1
+            print(f"{self.name} reconnecting in {delay:.1f}s, attempt {self.attempts}.")
+            await asyncio.sleep(delay)
+
+    async def watch(self, task: asyncio.Task) -> None:
+        """Send a test request when the stream is silent, cancel it if it stays so."""
+        silent_after = self.heart_bt_int * (1 + LIVENESS_MARGIN)
+        dead_after = silent_after + self.heart_bt_int
+        test_sent = False
+        while not task.done():
+            silent = time.monotonic() - self.last_received
+            if silent >= dead_after:
+                print(f"{self.name} nothing received for {silent:.1f}s, reconnecting.")
+                task.cancel()
+                return
+            if silent < silent_after:
+                test_sent = False
+            elif not test_sent:
+                test_sent = True
+                try:
+                    self.test_request()
+                except Exception as e:
+                    print(f"{self.name} unable to send a test request, exception={e}")
+            await asyncio.sleep(min(1.0, self.heart_bt_int / 10))
+
+    def stop(self) -> None:
+        """Stop running the session, and cancel the current one."""
+        self.stopped = True
+        if self.task is not None:
+            self.task.cancel()
@@ -0,0 +1,8 @@
+"""A module for the market data received from the FIX sessions."""
+
+# python
+from typing import Callable
+
+# called with the symbol, the time.time_ns() of the quote, the bid, the ask and
+# the size, 0.0 for a side or a size not known
+QuoteListener = Callable[[str, int, float, float, float], None]
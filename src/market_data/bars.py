@@ -0,0 +1,162 @@
+"""Module for the bars built from the quotes as they are received.
+
+A builder makes the bars of one interval for all the symbols, from the bid,
+the ask or the mid of each quote. The bar being built is kept in plain floats,
+so a quote only compares its start with the current one and updates the high,
+the low and the close, in O(1). A bar is written in the ring buffer of its
+symbol when the first quote of the next one arrives, so no bar is made for the
+intervals without quotes. The ring buffers keep the last capacity bars, and
+the latest ones are read as NumPy arrays, oldest first.
+
+The builders are given the quotes as listeners of FIX or Broker:
+fix.add_quote_listener(bars.update).
+"""
+
+# python
+from typing import Dict, Iterable, NamedTuple
+
+import numpy as np
+
+SOURCES = ("bid", "ask", "mid")
+
+
+class Bars(NamedTuple):
+    """Columns of the bars of a symbol, oldest first."""
+
+    # time.time_ns() of the start of each bar
+    ts: np.ndarray
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    # number of quotes in each bar
+    ticks: np.ndarray
+
+
+class BarSeries:
+    """Bars of one symbol and interval, the last ones in a ring buffer."""
+
+    def __init__(self, capacity: int) -> None:
+        """Init with the number of bars kept."""
+        self.capacity = capacity
+        self.ts = np.zeros(capacity, np.int64)
+        # open, high, low, close and ticks of each bar, by row
+        self.values = np.zeros((capacity, 5))
+        # number of bars completed, the next one written at count % capacity
+        self.count = 0
+        # the bar being built, start -1 before the first quote
+        self.start = -1
+        self.open = self.high = self.low = self.close = 0.0
+        self.ticks = 0
+
+    def add(self, start: int, price: float) -> None:
+        """Add a price to the bar starting at start, completing the current one."""
+        if start > self.start:
+            if self.ticks:
+                self.complete()
+            self.start = start
+            self.open = self.high = self.low = self.close = price
+            self.ticks = 1
+            return
+        if start < self.start:
+            # late, its bar is completed already
+            return
+        if price > self.high:
+            self.high = price
+        elif price < self.low:
+            self.low = price
+        self.close = price
+        self.ticks += 1
+
+    def complete(self) -> None:
+        """Write the bar being built in the ring buffer."""
+        i = self.count % self.capacity
+        self.ts[i] = self.start
+        self.values[i] = self.open, self.high, self.low, self.close, self.ticks
+        self.count += 1
+
+    def latest(self, n: int, with_current: bool = False) -> Bars:
+        """Copies of the last n bars completed, and the current one if asked."""
+        n = min(n, self.count, self.capacity)
+        rows = np.arange(self.count - n, self.count) % self.capacity
+        ts = self.ts[rows]
+        values = self.values[rows]
+        if with_current and self.ticks:
+            ts = np.append(ts, self.start)
+            current = (self.open, self.high, self.low, self.close, self.ticks)
+            values = np.vstack([values, current])
+        return Bars(ts, *values[:, :4].T, values[:, 4].astype(np.int64))
+
+
+class BarBuilder:
+    """Bars of one interval for all the symbols, from one side of the quotes."""
+
+    def __init__(
+        self, interval: float, source: str = "mid", capacity: int = 1000
+    ) -> None:
+        """Init.
+
+        Args:
+            interval ([float]): seconds of a bar, the bars start at multiples of it.
+            source ([str]): price of the quotes used, bid, ask or mid.
+            capacity ([int]): bars kept per symbol.
+        """
+        if source not in SOURCES:
+            raise ValueError(f"source must be one of {SOURCES}, not {source}")
+        self.interval = interval
+        self.interval_ns = int(interval * 1e9)
+        self.source = source
+        self.capacity = capacity
+        self.series: Dict[str, BarSeries] = {}
+
+    def update(
+        self, symbol: str, ts: int, bid: float, ask: float, size: float = 0.0
+    ) -> None:
+        """Add a quote, skipped if the price of the source is not known yet."""
+        if self.source == "mid":
+            if bid == 0.0 or ask == 0.0:
+                return
+            price = (bid + ask) / 2
+        else:
+            price = bid if self.source == "bid" else ask
+            if price == 0.0:
+                return
+        series = self.series.get(symbol)
+        if series is None:
+            series = self.series[symbol] = BarSeries(self.capacity)
+        series.add(ts - ts % self.interval_ns, price)
+
+    def latest(self, symbol: str, n: int, with_current: bool = False) -> Bars:
+        """Get the last n bars of a symbol, empty arrays if none yet."""
+        series = self.series.get(symbol)
+        if series is None:
+            series = BarSeries(1)
+        return series.latest(n, with_current)
+
+
+class BarAggregator:
+    """Bars of several intervals for all the symbols."""
+
+    def __init__(
+        self,
+        intervals: Iterable[float] = (1, 60, 300, 3600),
+        source: str = "mid",
+        capacity: int = 1000,
+    ) -> None:
+        """Init with the intervals in seconds, and the source and capacity of all."""
+        self.builders = {
+            interval: BarBuilder(interval, source, capacity) for interval in intervals
+        }
+
+    def update(
+        self, symbol: str, ts: int, bid: float, ask: float, size: float = 0.0
+    ) -> None:
+        """Add a quote to the bars of all the intervals."""
+        for builder in self.builders.values():
+            builder.update(symbol, ts, bid, ask, size)
+
+    def latest(
+        self, symbol: str, interval: float, n: int, with_current: bool = False
+    ) -> Bars:
+        """Get the last n bars of a symbol, for one of the intervals."""
+        return self.builders[interval].latest(symbol, n, with_current)
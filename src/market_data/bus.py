@@ -0,0 +1,132 @@
+"""Module for the bus publishing the quotes received to the consumers of a process.
+
+The quotes are published by the thread receiving them, the loop of FIX or of
+Broker, as a quote listener: fix.add_quote_listener(bus.publish). Each
+consumer subscribes a mailbox holding only the latest quote not read yet of
+each symbol: a newer quote of the same symbol replaces it (conflated), and a
+quote of a new symbol when the mailbox is full is dropped, both counted. So
+publishing never waits for a consumer, only for the short lock of a mailbox,
+however slow the consumer is, and a consumer reading late gets the last
+prices instead of a backlog.
+
+A quote is an immutable tuple, and the latest quote of each symbol is replaced
+in one assignment, so latest() reads it without a lock and never sees the bid
+of one quote with the ask of another.
+"""
+
+# python
+import threading
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Set
+
+
+class Quote(NamedTuple):
+    """A quote of a symbol, with its time.time_ns()."""
+
+    symbol: str
+    ts: int
+    bid: float
+    ask: float
+    size: float
+
+
+class Mailbox:
+    """Latest quote not read yet of each symbol, for one consumer."""
+
+    def __init__(
+        self,
+        symbols: Optional[Iterable[str]] = None,
+        capacity: int = 1024,
+        notify: Optional[Callable[[], None]] = None,
+    ) -> None:
+        """Init.
+
+        Args:
+            symbols ([list]): symbols received, all of them if None.
+            capacity ([int]): symbols with a quote not read yet, more are dropped.
+            notify ([callable]): called from the publishing thread when a quote
+                arrives in the empty mailbox, for example to wake an asyncio
+                consumer with loop.call_soon_threadsafe.
+        """
+        self.symbols: Optional[Set[str]] = None if symbols is None else set(symbols)
+        self.capacity = capacity
+        self.notify = notify
+        self.lock = threading.Lock()
+        self.ready = threading.Event()
+        self.pending: Dict[str, Quote] = {}
+        # quotes put, replaced by a newer one before being read, and dropped
+        self.received = 0
+        self.conflated = 0
+        self.dropped = 0
+
+    def put(self, quote: Quote) -> None:
+        """Keep a quote, replacing the one of the same symbol not read yet."""
+        with self.lock:
+            self.received += 1
+            if quote.symbol in self.pending:
+                self.conflated += 1
+            elif len(self.pending) >= self.capacity:
+                self.dropped += 1
+                return
+            was_empty = not self.pending
+            self.pending[quote.symbol] = quote
+        if was_empty:
+            self.ready.set()
+            if self.notify is not None:
+                self.notify()
+
+    def drain(self) -> List[Quote]:
+        """Take the quotes not read yet, in the order of their symbols' arrival."""
+        with self.lock:
+            quotes = list(self.pending.values())
+            self.pending.clear()
+            self.ready.clear()
+        return quotes
+
+    def get(self, timeout: Optional[float] = None) -> List[Quote]:
+        """Wait for quotes, from a thread, empty if none came within timeout."""
+        self.ready.wait(timeout)
+        return self.drain()
+
+
+class QuoteBus:
+    """Latest quote of each symbol, published to the mailboxes subscribed."""
+
+    def __init__(self) -> None:
+        """Init without subscribers."""
+        self.quotes: Dict[str, Quote] = {}
+        # replaced, never changed in place, so publish() iterates without a lock
+        self.mailboxes: List[Mailbox] = []
+        self.lock = threading.Lock()
+        self.published = 0
+
+    def publish(
+        self, symbol: str, ts: int, bid: float, ask: float, size: float = 0.0
+    ) -> None:
+        """Publish a quote, a quote listener of FIX or Broker."""
+        quote = Quote(symbol, ts, bid, ask, size)
+        self.quotes[symbol] = quote
+        self.published += 1
+        for mailbox in self.mailboxes:
+            if mailbox.symbols is None or symbol in mailbox.symbols:
+                mailbox.put(quote)
+
+    def latest(self, symbol: str) -> Optional[Quote]:
+        """Latest quote of a symbol, None if none yet."""
+        return self.quotes.get(symbol)
+
+    def subscribe(
+        self,
+        symbols: Optional[Iterable[str]] = None,
+        capacity: int = 1024,
+        notify: Optional[Callable[[], None]] = None,
+    ) -> Mailbox:
+        """Subscribe a new mailbox, see Mailbox for the arguments."""
+        mailbox = Mailbox(symbols, capacity, notify)
+        with self.lock:
+            self.mailboxes = self.mailboxes + [mailbox]
+        return mailbox
+
+    def unsubscribe(self, mailbox: Mailbox) -> None:
+        """Stop publishing to a mailbox."""
+        with self.lock:
+            self.mailboxes = [m for m in self.mailboxes if m is not mailbox]
@@ -0,0 +1,180 @@
+"""Module for the store of the ticks received, to replay them later.
+
+The ticks of each symbol are kept in columns, one file per column in the
+folder of the symbol: the timestamps in nanoseconds as int64, then the bid, the
+ask and the size as float64. The files are only appended to. A tick is first
+written in a buffer allocated once per symbol, and the buffer is appended to
+the files when it is full, when a tick arrives flush_interval after the last
+flush, or when the ticks are read, so that the feed never waits for the disk.
+The owner of a store also flushes it every flush_interval and at the end of
+its session, so the last ticks of a quiet symbol are written too. A side not
+quoted yet, given as 0.0 by the quote listeners, is recorded as NaN.
+
+The ticks are read as NumPy arrays mapped on the files, so a range of time is a
+view found by binary search on the timestamps, without copying the columns.
+A store is used from one thread, the one receiving the quotes.
+"""
+
+# python
+from array import array
+from pathlib import Path
+import re
+import time
+from typing import Dict, NamedTuple, Optional, Union
+
+import numpy as np
+
+# name, type code of the buffer and dtype of each column, in the order of a tick
+COLUMNS = (
+    ("ts", "q", np.int64),
+    ("bid", "d", np.float64),
+    ("ask", "d", np.float64),
+    ("size", "d", np.float64),
+)
+# characters not kept in the name of the folder of a symbol
+UNSAFE = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+class Ticks(NamedTuple):
+    """Columns of the ticks of a symbol, views on the files."""
+
+    ts: np.ndarray
+    bid: np.ndarray
+    ask: np.ndarray
+    size: np.ndarray
+
+
+class TickBuffer:
+    """Ticks of one symbol not written to the files yet."""
+
+    def __init__(self, folder: Path, size: int) -> None:
+        """Init with the folder of the files and the number of ticks buffered."""
+        self.folder = folder
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self.columns = [array(code, bytes(8 * size)) for _, code, _ in COLUMNS]
+        self.ts, self.bid, self.ask, self.size = self.columns
+        self.count = 0
+        for name, _, _ in COLUMNS:
+            (self.folder / f"{name}.bin").touch()
+        # ticks in the files, the same number in all of them: a flush interrupted
+        # leaves the last ticks in some columns only
+        self.written = min(
+            (self.folder / f"{name}.bin").stat().st_size // 8 for name, _, _ in COLUMNS
+        )
+        for name, _, _ in COLUMNS:
+            with open(self.folder / f"{name}.bin", "r+b") as file:
+                file.truncate(8 * self.written)
+        # timestamp of the last tick flushed
+        self.last_flush = time.time_ns()
+        # the columns mapped at the last read
+        self.mapped: Optional[Ticks] = None
+
+    def flush(self) -> None:
+        """Append the ticks buffered to the files."""
+        if self.count == 0:
+            return
+        for (name, _, _), column in zip(COLUMNS, self.columns):
+            with open(self.folder / f"{name}.bin", "ab") as file:
+                file.write(memoryview(column)[: self.count])
+        self.written += self.count
+        self.last_flush = self.ts[self.count - 1]
+        self.count = 0
+
+    def read(self) -> Ticks:
+        """All the ticks written, mapped again only if more were written since."""
+        if self.mapped is None or len(self.mapped.ts) != self.written:
+            if self.written == 0:
+                # an empty file can not be mapped
+                self.mapped = Ticks(*(np.empty(0, dtype) for _, _, dtype in COLUMNS))
+            else:
+                self.mapped = Ticks(
+                    *(
+                        np.memmap(
+                            self.folder / f"{name}.bin",
+                            dtype=dtype,
+                            mode="r",
+                            shape=(self.written,),
+                        )
+                        for name, _, dtype in COLUMNS
+                    )
+                )
+        return self.mapped
+
+
+class TickStore:
+    """Ticks of all the symbols, in a folder with one folder per symbol."""
+
+    def __init__(
+        self,
+        folder: Union[str, Path],
+        buffer_size: int = 4096,
+        flush_interval: float = 1.0,
+    ) -> None:
+        """Init.
+
+        Args:
+            folder ([str]): folder of the files, created if missing.
+            buffer_size ([int]): ticks of a symbol buffered before they are written.
+            flush_interval ([float]): seconds after which the ticks buffered are
+                written, checked when a tick of the same symbol arrives, and
+                interval of the flushes of the owner of the store.
+        """
+        self.folder = Path(folder)
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.flush_interval_ns = int(flush_interval * 1e9)
+        self.buffers: Dict[str, TickBuffer] = {}
+
+    def buffer(self, symbol: str) -> TickBuffer:
+        """Buffer of a symbol, with its files created at the first tick."""
+        buffer = self.buffers.get(symbol)
+        if buffer is None:
+            buffer = TickBuffer(self.folder / UNSAFE.sub("_", symbol), self.buffer_size)
+            self.buffers[symbol] = buffer
+        return buffer
+
+    def append(
+        self,
+        symbol: str,
+        ts: Optional[int] = None,
+        bid: float = 0.0,
+        ask: float = 0.0,
+        size: float = 0.0,
+    ) -> None:
+        """Add a tick, with its time.time_ns() timestamp, now if not given.
+
+        A bid or an ask of 0.0, not quoted yet, is recorded as NaN.
+        """
+        buffer = self.buffers.get(symbol) or self.buffer(symbol)
+        if ts is None:
+            ts = time.time_ns()
+        i = buffer.count
+        buffer.ts[i] = ts
+        buffer.bid[i] = bid if bid else np.nan
+        buffer.ask[i] = ask if ask else np.nan
+        buffer.size[i] = size
+        buffer.count = i + 1
+        if (
+            i + 1 == self.buffer_size
+            or ts - buffer.last_flush >= self.flush_interval_ns
+        ):
+            buffer.flush()
+
+    def flush(self) -> None:
+        """Write the ticks buffered of all the symbols."""
+        for buffer in self.buffers.values():
+            buffer.flush()
+
+    def read(
+        self, symbol: str, start: Optional[int] = None, end: Optional[int] = None
+    ) -> Ticks:
+        """Get the ticks of a symbol with start <= ts < end, as views on the files.
+
+        The ticks are expected in the order of their timestamps, as received.
+        """
+        buffer = self.buffer(symbol)
+        buffer.flush()
+        ticks = buffer.read()
+        first = 0 if start is None else int(np.searchsorted(ticks.ts, start, "left"))
+        last = len(ticks.ts) if end is None else int(np.searchsorted(ticks.ts, end))
+        return Ticks(*(column[first:last] for column in ticks))
@@ -21,8 +21,11 @@ from selenium.webdriver.common.keys import Keys
 from cli.cli_send_message import CLI
 from configs.settings import work_dir
 from configs.assets import get_info_quantity_to_trade
-from ctrader.ctrader import CTrader, get_volume_symbol
+from ctrader.ctrader import get_volume_symbol
+from ctrader.pool import SessionPool
 from ctrader_fix_asyncio.broker import Broker
+from ctrader_fix_asyncio.hub import MarketDataHub
+from market_data.bars import BarAggregator
 from utils.logger import request_logger
 from trading.order import Order
 from trading.parse_InvestorsWizard import Parse_InvestorsWizard
@@ -79,6 +82,10 @@ class ReadMessages:
         self.loop = loop
         # create the connection to several accounts
         self.accounts = {}
+        # one price stream per host, shared by the accounts
+        self.hub = MarketDataHub()
+        # recent bars of the symbols, to compare the prices of the signals with
+        self.bars = BarAggregator()
         for account_name in account_names:
             credentials = [c for c in yaml_data["accounts"] if c["name"] == account_name][
                 0
@@ -86,6 +93,13 @@ class ReadMessages:
             self.accounts[account_name] = Broker(credentials=credentials)
             # for now we receive the prices for just one symbol
             self.accounts[account_name].set_asset(symbol="EURUSD")
+            self.hub.add(self.accounts[account_name])
+        # all the accounts receive the same quotes, the bars are built from the first
+        next(iter(self.accounts.values())).add_quote_listener(self.bars.update)
+        # sessions of CTrader kept logged on between the orders of self.trade()
+        self.pool = SessionPool(
+            server=HOST, currency=CURRENCY, client_id=CLIENT_ID, debug=DEBUG
+        )
         print("Demo FIX API Application - 2023")
         time.sleep(1)
         print("Create task for self.login()")
@@ -135,11 +149,8 @@ class ReadMessages:
         then the ansewrs can come right away.
         """
         if DO_CTRADER and True:
-            print("A")
-            # login to the price streams for all brokers
-            for account_name in self.accounts:
-                print("B")
-                asyncio.create_task(self.accounts[account_name].price_login())
+            # login to the price stream of each host, shared by its brokers
+            asyncio.create_task(self.hub.price_login())
         if DO_CTRADER and True:
             # login to the trade streams for all brokers
             for account_name in self.accounts:
@@ -244,7 +255,7 @@ class ReadMessages:
                                 )
                                 # print(f"positions = {self.accounts[account_name].positions}")
                                 sorted_positions = sorted(
-                                    self.accounts[account_name].positions,
+                                    self.accounts[account_name].positions.snapshot(),
                                     key=lambda x: x["position_id"],
                                     reverse=True,
                                 )
@@ -259,7 +270,8 @@ class ReadMessages:
                                     f"len(orders) = {len(self.accounts[account_name].orders)}"
                                 )
                                 # print(f"positions = {self.accounts[account_name].positions}")
-                                for order in self.accounts[account_name].orders:
+                                orders = self.accounts[account_name].orders.snapshot()
+                                for order in orders:
                                     print(f"order = {order}")
 
                             if DO_CTRADER and False and counter == 2:
@@ -659,18 +671,8 @@ class ReadMessages:
             account = SENDER_COMP_ID_1
             password = PASSWORD_1
 
-        print("Start CTrader")
-        # build trader object
-        api = CTrader(
-            server=HOST,
-            account=account,
-            password=password,
-            currency=CURRENCY,
-            client_id=CLIENT_ID,
-            debug=DEBUG,
-        )
-        print("logged in")
-        await asyncio.sleep(1)
+        # logged on session of the account, logging on only if there is none alive
+        api = await asyncio.to_thread(self.pool.get, account, password)
         positions = api.positions()
         print(pformat(positions))
         # do the trade
@@ -693,12 +695,6 @@ class ReadMessages:
             api.close(symbol)
         else:
             print(f"Action {o.action} not known, need open or close, for {text}.")
-        await asyncio.sleep(1)
-        # close the connection
-        api.logout()
-        await asyncio.sleep(2)
-        # to be safe delete the api object
-        # del api
 
     async def trade_async(self, o: Order) -> None:
         """Trade based on the order received."""
@@ -786,7 +782,7 @@ class ReadMessages:
                         f"len(positions) = {len(self.accounts[account_name].positions)}"
                     )
                     # print(f"positions = {self.accounts[account_name].positions}")
-                    for position in self.accounts[account_name].positions:
+                    for position in self.accounts[account_name].positions.snapshot():
                         print(f"position = {position}")
                 # orders
                 if False:
@@ -797,7 +793,7 @@ class ReadMessages:
                         f"len(orders) = {len(self.accounts[account_name].orders)}"
                     )
                     # print(f"positions = {self.accounts[account_name].positions}")
-                    for order in self.accounts[account_name].orders:
+                    for order in self.accounts[account_name].orders.snapshot():
                         print(f"order = {order}")
 
                 if True and counter == 2:
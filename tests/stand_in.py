@@ -0,0 +1,315 @@
+"""Module for a local stand-in of the cTrader FIX server, for tests and benchmarks.
+
+It answers the logon, the security list, the snapshots of positions and orders,
+and fills the market orders at once. It counts the messages and the reads of
+each stream, so that the number of TCP writes of a client can be measured.
+make_frame builds the frames given to the parsers by the tests.
+"""
+
+# python
+import itertools
+import socket
+import socketserver
+import threading
+from typing import Dict, List, Optional, Tuple, Union
+
+# our modules
+from ctrader.buffer import Buffer
+from ctrader.encoder import HeaderEncoder, encode_fields
+from ctrader.fix import Field, ReceivedMessage, Side, SubID
+
+# symbol id to name and digits
+SYMBOLS = {1: ("EURUSD", 5), 2: ("GBPUSD", 5), 3: ("USDJPY", 3)}
+
+
+def make_frame(body: Union[bytes, str]) -> bytes:
+    """Build a valid FIX frame around a body of fields, a str with | as separator."""
+    if isinstance(body, str):
+        body = body.replace("|", "\x01").encode()
+    head = b"8=FIX.4.4\x019=%d\x01" % len(body)
+    checksum = sum(head + body) % 256
+    return head + body + b"10=%03d\x01" % checksum
+
+
+class StandInServer:
+    """QUOTE and TRADE servers on local ports, sharing one account."""
+
+    def __init__(
+        self,
+        positions: int = 0,
+        orders: int = 0,
+        heart_bt_int: int = 30,
+        mass_cancel: bool = True,
+        market_orders: str = "fill",
+    ) -> None:
+        """Init with a number of positions and of limit orders open on EURUSD.
+
+        With mass_cancel False, OrderMassCancelRequest is rejected as unknown.
+        The market orders are filled at once, or with market_orders "reject"
+        rejected, or with "ignore" never answered.
+        """
+        self.heart_bt_int = heart_bt_int
+        self.mass_cancel = mass_cancel
+        self.market_orders = market_orders
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        # pos_id to symbol id, side, quantity and price
+        self.positions: Dict[str, Tuple[int, Side, float, float]] = {
+            str(next(self.ids)): (1, Side.Buy, 1000.0, 1.1) for _ in range(positions)
+        }
+        # order_id to symbol id, side, quantity, type, price and pos_id
+        self.orders: Dict[str, Tuple[int, Side, float, int, float, str]] = {
+            str(next(self.ids)): (1, Side.Buy, 1000.0, 2, 1.0, "")
+            for _ in range(orders)
+        }
+        self.received: Dict[SubID, List[ReceivedMessage]] = {sub: [] for sub in SubID}
+        self.reads: Dict[SubID, int] = {sub: 0 for sub in SubID}
+        self.servers = {sub: self._server(sub) for sub in SubID}
+        self.quote_port = self.servers[SubID.QUOTE].server_address[1]
+        self.trade_port = self.servers[SubID.TRADE].server_address[1]
+
+    def _server(self, sub: SubID) -> socketserver.ThreadingTCPServer:
+        """Serve one stream on an ephemeral port, in a thread."""
+        stand_in = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            """Handler of one connection, served by the stand-in."""
+
+            def handle(self) -> None:
+                """Serve the connection until the client closes it."""
+                stand_in.serve(sub, self.request)
+
+        server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+    def close(self) -> None:
+        """Stop both servers."""
+        for server in self.servers.values():
+            server.shutdown()
+            server.server_close()
+
+    def count(self, sub: SubID, msg_type: str) -> int:
+        """Number of messages of a type received on a stream."""
+        return sum(1 for msg in self.received[sub] if msg[Field.MsgType] == msg_type)
+
+    def serve(self, sub: SubID, sock: socket.socket) -> None:
+        """Answer the messages of one client connection until it closes."""
+        stream = Buffer()
+        encoder: Optional[HeaderEncoder] = None
+        seq = itertools.count(1)
+        while True:
+            try:
+                data = sock.recv(65535)
+            except OSError:
+                return
+            if not data:
+                return
+            stream.write(data)
+            with self.lock:
+                self.reads[sub] += 1
+            replies: List[bytes] = []
+            for frame in stream.frames():
+                msg = ReceivedMessage(frame)
+                with self.lock:
+                    self.received[sub].append(msg)
+                if encoder is None:
+                    encoder = HeaderEncoder(
+                        "CSERVER", msg[Field.SenderCompID], str(sub), str(sub)
+                    )
+                for msg_type, fields in self.answer(msg):
+                    replies.append(
+                        encoder.encode(
+                            msg_type.encode(), next(seq), encode_fields(fields)
+                        )
+                    )
+            if replies:
+                sock.sendall(b"".join(replies))
+
+    def answer(
+        self, msg: ReceivedMessage
+    ) -> List[Tuple[str, List[Tuple[int, object]]]]:
+        """Messages answering msg, as message types and fields."""
+        msg_type = msg[Field.MsgType]
+        if msg_type == "A":
+            return [
+                ("A", [(Field.EncryptMethod, 0), (Field.HeartBtInt, self.heart_bt_int)])
+            ]
+        if msg_type == "1":
+            return [("0", [(Field.TestReqID, msg[Field.TestReqID])])]
+        if msg_type == "x":
+            fields: List[Tuple[int, object]] = [
+                (Field.SecurityReqID, msg[Field.SecurityReqID]),
+                (Field.SecurityResponseID, 1),
+                (Field.SecurityRequestResult, 0),
+                (Field.NoRelatedSym, len(SYMBOLS)),
+            ]
+            for symbol_id, (name, digits) in SYMBOLS.items():
+                fields += [
+                    (Field.Symbol, symbol_id),
+                    (Field.SymbolName, name),
+                    (Field.SymbolDigits, digits),
+                ]
+            return [("y", fields)]
+        if msg_type == "AN":
+            return self.answer_positions(msg)
+        if msg_type == "AF":
+            return self.answer_orders(msg)
+        if msg_type == "D":
+            return self.answer_new_order(msg)
+        if msg_type == "F":
+            return self.answer_cancel(msg[Field.OrderID])
+        if msg_type == "q":
+            return self.answer_mass_cancel(msg)
+        if msg_type == "5":
+            return [("5", [])]
+        return []
+
+    def answer_positions(self, msg: ReceivedMessage) -> List[Tuple[str, list]]:
+        """Snapshot of the positions."""
+        with self.lock:
+            positions = list(self.positions.items())
+        if not positions:
+            return [
+                ("AP", [(Field.PosReqID, msg[Field.PosReqID]), (Field.PosReqResult, 2)])
+            ]
+        return [
+            (
+                "AP",
+                [
+                    (Field.PosReqID, msg[Field.PosReqID]),
+                    (Field.PosMaintRptID, pos_id),
+                    (Field.TotalNumPosReports, len(positions)),
+                    (Field.PosReqResult, 0),
+                    (Field.Symbol, symbol_id),
+                    (Field.LongQty, qty if side == Side.Buy else 0),
+                    (Field.ShortQty, qty if side == Side.Sell else 0),
+                    (Field.SettlPrice, price),
+                ],
+            )
+            for pos_id, (symbol_id, side, qty, price) in positions
+        ]
+
+    def answer_orders(self, msg: ReceivedMessage) -> List[Tuple[str, list]]:
+        """Snapshot of the pending orders."""
+        with self.lock:
+            orders = list(self.orders.items())
+        if not orders:
+            return [("j", [(Field.Text, "INVALID_REQUEST:no orders found")])]
+        return [
+            (
+                "8",
+                self.order_fields(order_id, "I", order)
+                + [(Field.TotNumReports, len(orders))],
+            )
+            for order_id, order in orders
+        ]
+
+    def answer_new_order(self, msg: ReceivedMessage) -> List[Tuple[str, list]]:
+        """Fill a market order at once, accept a pending order."""
+        symbol_id = int(msg[Field.Symbol])
+        side = Side(int(msg[Field.Side]))
+        qty = float(msg[Field.OrderQty])
+        order_type = int(msg[Field.OrdType])
+        pos_id = msg[Field.PosMaintRptID]
+        with self.lock:
+            order_id = str(next(self.ids))
+            if order_type > 1:
+                price = float(msg[Field.Price] or msg[Field.StopPx])
+                order = (symbol_id, side, qty, order_type, price, pos_id or "")
+                self.orders[order_id] = order
+                return [
+                    ("8", self.order_fields(order_id, "0", order, msg[Field.ClOrdId]))
+                ]
+            if self.market_orders == "ignore":
+                return []
+            if self.market_orders == "reject":
+                order = (symbol_id, side, qty, order_type, 0.0, pos_id or "")
+                fields = self.order_fields(order_id, "8", order, msg[Field.ClOrdId])
+                return [
+                    ("8", fields + [(Field.OrdStatus, 8), (Field.Text, "NO_MONEY")])
+                ]
+            price = 1.1
+            if pos_id in self.positions:
+                # closing, fully or partially
+                old = self.positions.pop(pos_id)
+                if old[2] > qty:
+                    self.positions[pos_id] = (old[0], old[1], old[2] - qty, old[3])
+            else:
+                pos_id = str(next(self.ids))
+                self.positions[pos_id] = (symbol_id, side, qty, price)
+        order = (symbol_id, side, qty, order_type, price, pos_id)
+        fields = self.order_fields(order_id, "F", order, msg[Field.ClOrdId])
+        return [("8", fields + [(Field.CumQty, qty), (Field.AvgPx, price)])]
+
+    def answer_cancel(self, order_id: str) -> List[Tuple[str, list]]:
+        """Cancel a pending order."""
+        with self.lock:
+            order = self.orders.pop(order_id, None)
+        if order is None:
+            return [("9", [(Field.OrderID, order_id), (Field.Text, "ORDER_NOT_FOUND")])]
+        return [("8", self.order_fields(order_id, "4", order))]
+
+    def answer_mass_cancel(self, msg: ReceivedMessage) -> List[Tuple[str, list]]:
+        """Cancel the orders of a symbol and side, or reject the message type."""
+        if not self.mass_cancel:
+            return [
+                (
+                    "3",
+                    [
+                        (Field.RefSeqNum, msg[Field.MsgSeqNum]),
+                        (Field.RefMsgType, "q"),
+                        (Field.Text, "Unsupported message type"),
+                    ],
+                )
+            ]
+        symbol_id = int(msg[Field.Symbol]) if msg[Field.Symbol] else None
+        side = Side(int(msg[Field.Side])) if msg[Field.Side] else None
+        with self.lock:
+            cancelled = [
+                (order_id, self.orders.pop(order_id))
+                for order_id, order in list(self.orders.items())
+                if (symbol_id is None or order[0] == symbol_id)
+                and (side is None or order[1] == side)
+            ]
+        report = (
+            "r",
+            [
+                (Field.ClOrdId, msg[Field.ClOrdId]),
+                (Field.MassCancelRequestType, msg[Field.MassCancelRequestType]),
+                (Field.MassCancelResponse, msg[Field.MassCancelRequestType]),
+            ],
+        )
+        return [report] + [
+            ("8", self.order_fields(order_id, "4", order))
+            for order_id, order in cancelled
+        ]
+
+    @staticmethod
+    def order_fields(
+        order_id: str,
+        exec_type: str,
+        order: Tuple[int, Side, float, int, float, str],
+        cl_ord_id: Optional[str] = None,
+    ) -> List[Tuple[int, object]]:
+        """Fields of an execution report of an order."""
+        symbol_id, side, qty, order_type, price, pos_id = order
+        filled = exec_type == "F"
+        fields: List[Tuple[int, object]] = [
+            (Field.OrderID, order_id),
+            (Field.ClOrdId, cl_ord_id or order_id),
+            (Field.ExecType, exec_type),
+            (Field.Symbol, symbol_id),
+            (Field.Side, side.value),
+            (Field.OrdType, order_type),
+            (Field.OrderQty, qty),
+            (Field.LeavesQty, 0 if filled else qty),
+        ]
+        if pos_id:
+            fields.append((Field.PosMaintRptID, pos_id))
+        if order_type == 2:
+            fields.append((Field.Price, price))
+        elif order_type == 3:
+            fields.append((Field.StopPx, price))
+        return fields
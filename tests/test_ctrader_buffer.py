@@ -0,0 +1,50 @@
+"""Tests for the framing of FIX messages in ctrader.buffer."""
+
+from ctrader.buffer import Buffer
+from stand_in import make_frame
+
+
+HEARTBEAT = make_frame(b"35=0\x0134=2\x0149=CSERVER\x0156=demo.icmarkets.1\x01")
+QUOTE = make_frame(b"35=W\x0134=3\x0155=1\x01268=2\x01269=0\x01270=1.1\x01")
+
+
+def test_frames_in_one_write() -> None:
+    """Several frames received in one recv are all decoded."""
+    buffer = Buffer()
+    buffer.write(HEARTBEAT + QUOTE + HEARTBEAT)
+    assert list(buffer.frames()) == [HEARTBEAT, QUOTE, HEARTBEAT]
+    assert len(buffer) == 0
+
+
+def test_partial_frame() -> None:
+    """A frame split across recv calls is decoded once it is complete."""
+    buffer = Buffer()
+    data = HEARTBEAT + QUOTE
+    for i in range(len(data)):
+        buffer.write(data[i : i + 1])
+        frames = list(buffer.frames())
+        if i == len(HEARTBEAT) - 1:
+            assert frames == [HEARTBEAT]
+        elif i == len(data) - 1:
+            assert frames == [QUOTE]
+        else:
+            assert frames == []
+
+
+def test_garbage_is_skipped() -> None:
+    """Bytes that are not a frame are skipped up to the next BeginString."""
+    buffer = Buffer()
+    buffer.write(b"xx\x0110=123\x01" + QUOTE)
+    assert list(buffer.frames()) == [QUOTE]
+
+
+def test_burst_of_frames() -> None:
+    """A large backlog is drained completely and the buffer compacts."""
+    buffer = Buffer()
+    for _ in range(5000):
+        buffer.write(QUOTE)
+    assert sum(1 for _ in buffer.frames()) == 5000
+    buffer.write(HEARTBEAT[:10])
+    assert buffer.count() == 10
+    buffer.write(HEARTBEAT[10:])
+    assert buffer.next_frame() == HEARTBEAT
@@ -0,0 +1,61 @@
+"""Tests for the orders sent by ctrader.ctrader.CTrader."""
+
+import functools
+import time
+
+import pytest
+
+import ctrader.ctrader
+from ctrader.ctrader import CTrader
+from ctrader.fix import FIX, SubID
+from stand_in import StandInServer
+
+
+def connect(monkeypatch: pytest.MonkeyPatch, server: StandInServer) -> CTrader:
+    """Log on a CTrader session to the stand-in server."""
+    monkeypatch.setattr(
+        ctrader.ctrader,
+        "FIX",
+        functools.partial(
+            FIX, quote_port=server.quote_port, trade_port=server.trade_port
+        ),
+    )
+    return CTrader(
+        "127.0.0.1",
+        "demo.icmarkets.1234567",
+        "password",
+        "USD",
+        sec_list_cache_dir=None,
+        fill_timeout=0.2,
+    )
+
+
+def test_sl_and_tp_sent_after_the_fill(monkeypatch: pytest.MonkeyPatch) -> None:
+    """The SL and TP orders of a market order are sent for its position."""
+    server = StandInServer()
+    trader = connect(monkeypatch, server)
+    assert (
+        trader.trade("EURUSD", "OPEN", 0, "buy", 0.01, 1.0, 1.2, 0, 0, "cl1") == "cl1"
+    )
+    deadline = time.monotonic() + 5
+    while server.count(SubID.TRADE, "D") < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert server.count(SubID.TRADE, "D") == 3
+    pos_id = next(iter(server.positions))
+    assert [order[5] for order in server.orders.values()] == [pos_id, pos_id]
+    assert trader.fix.fills == {}
+    trader.fix.close()
+    server.close()
+
+
+def test_no_fill_within_the_timeout(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Without a fill, trade() returns without SL and TP and forgets the future."""
+    server = StandInServer(market_orders="ignore")
+    trader = connect(monkeypatch, server)
+    assert (
+        trader.trade("EURUSD", "OPEN", 0, "buy", 0.01, 1.0, 1.2, 0, 0, "cl1") == "cl1"
+    )
+    assert server.count(SubID.TRADE, "D") == 1
+    assert trader.fix.fills == {}
+    trader.fix.close()
+    server.close()
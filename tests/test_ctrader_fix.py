@@ -0,0 +1,363 @@
+"""Tests for the FIX messages in ctrader.fix."""
+
+import threading
+import time
+from typing import Optional
+
+import pytest
+
+from ctrader.buffer import Buffer
+from ctrader.encoder import HeaderEncoder, encode_fields
+from ctrader.fix import FIX, Field, ReceivedMessage, Side, SubID
+from stand_in import StandInServer, make_frame
+
+
+def test_received_message_lookup() -> None:
+    """Fields are found by tag, missing tags give None."""
+    msg = ReceivedMessage(
+        make_frame(b"35=8\x0134=5\x0111=dt1\x01150=F\x01721=101\x019999=x\x01")
+    )
+    assert msg[Field.MsgType] == "8"
+    assert msg[Field.ExecType] == "F"
+    assert msg[Field.PosMaintRptID] == "101"
+    assert msg[9999] == "x"
+    assert msg[Field.Text] is None
+    assert Field.ClOrdId in msg
+
+
+def test_received_message_groups() -> None:
+    """Market data entries are decoded into one dict per entry."""
+    msg = ReceivedMessage(
+        make_frame(
+            b"35=X\x0134=7\x01268=2\x01"
+            b"279=0\x01269=0\x01278=a\x0155=1\x01270=1.1\x01271=100\x01"
+            b"279=2\x01278=b\x0155=1\x01"
+        )
+    )
+    entries = msg.get_repeating_groups(Field.NoMDEntries, Field.MDUpdateAction)
+    assert len(entries) == 2
+    assert entries[0][Field.MDEntryPx] == "1.1"
+    assert entries[1] == {279: "2", 278: "b", 55: "1"}
+    assert msg[Field.Symbol] == "1"
+
+
+def test_received_message_group_bounded_by_count() -> None:
+    """A tag after the last entry is not folded into it."""
+    msg = ReceivedMessage(
+        make_frame(
+            b"35=W\x0155=1\x01268=2\x01"
+            b"269=0\x01270=1.1\x01269=1\x01270=1.2\x01"
+            b"58=trailing\x01"
+        )
+    )
+    entries = msg.get_repeating_groups(Field.NoMDEntries, Field.MDEntryType)
+    assert entries == [{269: "0", 270: "1.1"}, {269: "1", 270: "1.2"}]
+    assert msg[Field.Text] == "trailing"
+    # an entry more than counted is not decoded
+    msg = ReceivedMessage(
+        make_frame(b"35=W\x0155=1\x01268=1\x01269=0\x01270=1.1\x01269=1\x01270=1.2\x01")
+    )
+    assert msg.get_repeating_groups(Field.NoMDEntries) == [{269: "0", 270: "1.1"}]
+
+
+def test_received_message_empty_group() -> None:
+    """A counter of zero gives no entries."""
+    msg = ReceivedMessage(make_frame(b"35=W\x0155=1\x01268=0\x01"))
+    assert msg.get_repeating_groups(Field.NoMDEntries, Field.MDEntryType) == []
+
+
+def test_header_encoder() -> None:
+    """Encoded messages have the right BodyLength and CheckSum."""
+    encoder = HeaderEncoder("demo.icmarkets.1", "CSERVER", "TRADE", "TRADE")
+    data = encoder.encode(b"D", 7, b"11=dt1\x0155=1\x01", b"20231010-10:10:10")
+    buffer = Buffer()
+    buffer.write(data)
+    assert buffer.next_frame() == data
+    assert data.endswith(b"10=%03d\x01" % (sum(data[:-7]) % 256))
+    msg = ReceivedMessage(data)
+    assert msg[Field.MsgType] == "D"
+    assert msg[Field.SenderCompID] == "demo.icmarkets.1"
+    assert msg[Field.MsgSeqNum] == "7"
+    assert msg[Field.ClOrdId] == "dt1"
+
+
+def test_close_all_in_one_write() -> None:
+    """The closes of all the positions reach the server in one read."""
+    server = StandInServer(positions=3)
+    closed = threading.Event()
+
+    def position_list_callback(positions: dict, price_data: dict) -> None:
+        if not positions:
+            closed.set()
+
+    fix = FIX(
+        "127.0.0.1",
+        "demo.icmarkets",
+        "1234567",
+        "password",
+        "USD",
+        "1",
+        position_list_callback,
+        lambda orders, price_data: None,
+        quote_port=server.quote_port,
+        trade_port=server.trade_port,
+    )
+    deadline = time.monotonic() + 5
+    while len(fix.position_list) < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    reads = server.reads[SubID.TRADE]
+    fix.close_all()
+    assert closed.wait(5)
+    assert server.reads[SubID.TRADE] - reads == 1
+    assert server.count(SubID.TRADE, "D") == 3
+    assert fix.index.pos_to_origin == {}
+    fix.close()
+    server.close()
+
+
+@pytest.mark.parametrize("mass_cancel", [True, False])
+def test_cancel_all_of_one_side(mass_cancel: bool) -> None:
+    """One OrderMassCancelRequest, or one cancel per order when it is rejected."""
+    server = StandInServer(orders=4, mass_cancel=mass_cancel)
+    fix = FIX(
+        "127.0.0.1",
+        "demo.icmarkets",
+        "1234567",
+        "password",
+        "USD",
+        "1",
+        lambda positions, price_data: None,
+        lambda orders, price_data: None,
+        quote_port=server.quote_port,
+        trade_port=server.trade_port,
+    )
+    deadline = time.monotonic() + 5
+    while len(fix.order_list) < 4 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    fix.cancel_all("GBPUSD")
+    fix.cancel_all("EURUSD", Side.Buy)
+    while fix.order_list and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert fix.order_list == {}
+    assert fix.mass_cancel_supported == mass_cancel
+    assert server.count(SubID.TRADE, "F") == (0 if mass_cancel else 4)
+    fix.close()
+    server.close()
+
+
+def connect(server: StandInServer) -> FIX:
+    """Log on a FIX session to the stand-in server."""
+    return FIX(
+        "127.0.0.1",
+        "demo.icmarkets",
+        "1234567",
+        "password",
+        "USD",
+        "1",
+        lambda positions, price_data: None,
+        lambda orders, price_data: None,
+        quote_port=server.quote_port,
+        trade_port=server.trade_port,
+    )
+
+
+def test_fill_future_resolves_with_the_position() -> None:
+    """The future of a ClOrdID gets the position id of its fill, not of others."""
+    server = StandInServer()
+    fix = connect(server)
+    fill = fix.expect_fill("cl1")
+    other = fix.expect_fill("cl2")
+    fix.new_market_order("EURUSD", Side.Buy, 1000, "cl1")
+    assert fill.result(timeout=5) in server.positions
+    assert not other.done()
+    assert list(fix.fills) == ["cl2"]
+    fix.close()
+    server.close()
+
+
+def test_fill_future_raises_on_reject() -> None:
+    """An order rejected with ExecType 8 raises in the waiting thread."""
+    server = StandInServer(market_orders="reject")
+    fix = connect(server)
+    fill = fix.expect_fill("cl1")
+    fix.new_market_order("EURUSD", Side.Buy, 1000, "cl1")
+    with pytest.raises(RuntimeError, match="NO_MONEY"):
+        fill.result(timeout=5)
+    assert fix.fills == {}
+    fix.close()
+    server.close()
+
+
+def connect_synced(server: StandInServer) -> FIX:
+    """Log on a FIX session, once the snapshots asked at logon are applied."""
+    positions, orders = threading.Event(), threading.Event()
+    fix = FIX(
+        "127.0.0.1",
+        "demo.icmarkets",
+        "1234567",
+        "password",
+        "USD",
+        "1",
+        lambda position_list, price_data: positions.set(),
+        lambda order_list, price_data: orders.set(),
+        quote_port=server.quote_port,
+        trade_port=server.trade_port,
+    )
+    assert positions.wait(5) and orders.wait(5)
+    return fix
+
+
+def receive(fix: FIX, msg_type: str, fields: list, seq: int = 0) -> None:
+    """Parse a trade message on the loop, with the next MsgSeqNum if seq is 0."""
+    encoder = HeaderEncoder("CSERVER", "demo.icmarkets.1234567", "TRADE", "TRADE")
+    done = threading.Event()
+
+    def parse() -> None:
+        frame = encoder.encode(
+            msg_type.encode(), seq or fix.trecv_seq, encode_fields(fields)
+        )
+        fix.tstream.write(frame)
+        fix.parse_trade_message()
+        done.set()
+
+    fix.loop.call_soon(parse)
+    assert done.wait(5)
+
+
+def fill(
+    order_id: str,
+    side: Side,
+    cum_qty: float,
+    leaves_qty: float,
+    price: float,
+    average: Optional[float] = None,
+) -> list:
+    """Fields of a fill of a market order on the position p1 of EURUSD.
+
+    The fill is at price (LastPx), the order at average (AvgPx), price if None.
+    """
+    return [
+        (Field.OrderID, order_id),
+        (Field.ClOrdId, "c" + order_id),
+        (Field.ExecType, "F"),
+        (Field.Symbol, 1),
+        (Field.Side, side.value),
+        (Field.OrdType, 1),
+        (Field.CumQty, cum_qty),
+        (Field.LeavesQty, leaves_qty),
+        (Field.LastPx, price),
+        (Field.AvgPx, price if average is None else average),
+        (Field.PosMaintRptID, "p1"),
+    ]
+
+
+def test_fills_applied_to_the_position() -> None:
+    """Partial fills add up, a fill reducing the position to zero removes it."""
+    server = StandInServer()
+    fix = connect_synced(server)
+    receive(fix, "8", fill("o1", Side.Buy, 400, 600, 1.1))
+    assert fix.position_list["p1"]["long"] == 400
+    assert fix.filled_qty == {"o1": 400}
+    # 600 at 1.2, the order at 1.16 on average
+    receive(fix, "8", fill("o1", Side.Buy, 1000, 0, 1.2, 1.16))
+    position = fix.position_list["p1"]
+    assert position["long"] == 1000 and position["short"] == 0
+    assert position["price"] == pytest.approx(1.16)
+    assert fix.filled_qty == {}
+    assert "EURUSD" in fix.spot_subscriptions
+    receive(fix, "8", fill("o2", Side.Sell, 1000, 0, 1.3))
+    assert fix.position_list == {}
+    assert "EURUSD" not in fix.spot_subscriptions
+    fix.close()
+    server.close()
+
+
+def test_order_replaced() -> None:
+    """A replaced order is updated in place, a cancelled one is removed."""
+    server = StandInServer()
+    fix = connect_synced(server)
+    order = [
+        (Field.OrderID, "o1"),
+        (Field.ClOrdId, "c1"),
+        (Field.Symbol, 1),
+        (Field.Side, Side.Buy.value),
+        (Field.OrdType, 2),
+        (Field.OrderQty, 1000),
+    ]
+    receive(
+        fix,
+        "8",
+        order + [(Field.ExecType, "0"), (Field.LeavesQty, 1000), (Field.Price, 1.0)],
+    )
+    receive(
+        fix,
+        "8",
+        order + [(Field.ExecType, "5"), (Field.LeavesQty, 500), (Field.Price, 1.05)],
+    )
+    assert list(fix.order_list) == ["o1"]
+    assert fix.order_list["o1"]["price"] == 1.05
+    assert fix.order_list["o1"]["amount"] == 500
+    assert fix.index.orders("c1") == ["o1"]
+    receive(fix, "8", order + [(Field.ExecType, "4"), (Field.LeavesQty, 0)])
+    assert fix.order_list == {}
+    fix.close()
+    server.close()
+
+
+def test_snapshots_replace_the_lists() -> None:
+    """A complete snapshot replaces the positions and the orders kept."""
+    server = StandInServer()
+    fix = connect_synced(server)
+    receive(fix, "8", fill("o1", Side.Buy, 1000, 0, 1.1))
+    report = [
+        (Field.TotalNumPosReports, 2),
+        (Field.PosReqResult, 0),
+        (Field.Symbol, 2),
+        (Field.LongQty, 0),
+        (Field.ShortQty, 2000),
+        (Field.SettlPrice, 1.3),
+    ]
+    receive(fix, "AP", [(Field.PosMaintRptID, "p2")] + report)
+    # not replaced before the last report of the snapshot
+    assert list(fix.position_list) == ["p1"]
+    receive(fix, "AP", [(Field.PosMaintRptID, "p3")] + report)
+    assert list(fix.position_list) == ["p2", "p3"]
+    assert fix.position_list["p2"]["short"] == 2000
+    receive(
+        fix,
+        "8",
+        [
+            (Field.OrderID, "o9"),
+            (Field.ClOrdId, "c9"),
+            (Field.ExecType, "I"),
+            (Field.Symbol, 3),
+            (Field.Side, Side.Sell.value),
+            (Field.OrdType, 3),
+            (Field.LeavesQty, 1000),
+            (Field.StopPx, 150.0),
+            (Field.TotNumReports, 1),
+        ],
+    )
+    assert list(fix.order_list) == ["o9"]
+    assert fix.order_list["o9"]["price"] == 150.0
+    fix.close()
+    server.close()
+
+
+def test_sequence_gap_reconciles() -> None:
+    """A gap in the trade MsgSeqNum asks for the snapshots again."""
+    server = StandInServer()
+    fix = connect_synced(server)
+    requests = server.count(SubID.TRADE, "AN"), server.count(SubID.TRADE, "AF")
+    receive(fix, "0", [])
+    assert server.count(SubID.TRADE, "AN") == requests[0]
+    receive(fix, "0", [], seq=fix.trecv_seq + 3)
+    deadline = time.monotonic() + 5
+    while (
+        server.count(SubID.TRADE, "AF") == requests[1] and time.monotonic() < deadline
+    ):
+        time.sleep(0.01)
+    assert server.count(SubID.TRADE, "AN") == requests[0] + 1
+    assert server.count(SubID.TRADE, "AF") == requests[1] + 1
+    fix.close()
+    server.close()
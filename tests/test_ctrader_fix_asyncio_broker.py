@@ -0,0 +1,194 @@
+"""Tests for the handling of the trade messages in ctrader_fix_asyncio.broker."""
+
+import asyncio
+
+import pytest
+
+from ctrader_fix_asyncio.broker import Broker
+from stand_in import make_frame
+
+
+class Writes(list):
+    """Writer of a stream keeping what is written."""
+
+    def write(self, data: bytes) -> None:
+        """Keep the data written."""
+        self.append(data)
+
+
+def make_broker() -> Broker:
+    """Broker with a trade stream that keeps what is written."""
+    broker = Broker(
+        {
+            "broker": "b",
+            "hostname": "h",
+            "account": "1",
+            "password": "p",
+            "type": "demo",
+        }
+    )
+    broker.trade_writer = Writes()
+    return broker
+
+
+def position(position_id: str, long: int, short: int, total: int) -> bytes:
+    """Position report of EURUSD."""
+    return make_frame(
+        f"35=AP|55=1|721={position_id}|727={total}|730=1.1|704={long}|705={short}|"
+    )
+
+
+def fill(
+    order_id: str,
+    position_id: str,
+    side: int,
+    cum: int,
+    leaves: int,
+    cl_ord_id: str = "",
+    last: float = 1.2,
+    average: float = 1.2,
+) -> bytes:
+    """Execution report of a fill of a market order on EURUSD, of a ClOrdID.
+
+    Its price is last (LastPx), the average of the fills of the order average.
+    """
+    status = 2 if leaves == 0 else 1
+    cl_ord_id = cl_ord_id or f"c{order_id}"
+    return make_frame(
+        f"35=8|11={cl_ord_id}|37={order_id}|721={position_id}|55=1|54={side}|40=1"
+        f"|38={cum + leaves}|14={cum}|151={leaves}|31={last}|6={average}"
+        f"|39={status}|150=F|"
+    )
+
+
+ORDER = make_frame(
+    "35=8|11=1696932610|14=0|37=543140337|38=1000|39=0|40=2|44=1.05|54=1"
+    "|55=1|59=1|150=0|151=1000|911=1|"
+)
+
+
+def test_broker_dispatches_on_msg_type() -> None:
+    """Positions and orders are added once, a logon is not a position report."""
+    broker = make_broker()
+    for frame in [
+        position("1", 0, 2000, 1),
+        position("1", 0, 2000, 1),
+        ORDER,
+        make_frame("35=A|98=0|108=30|"),
+    ]:
+        broker.handle_trade_message(frame)
+    assert [(p["position_id"], p["direction"]) for p in broker.positions] == [
+        ("1", "sell")
+    ]
+    assert [o["order_id"] for o in broker.orders] == ["543140337"]
+    # the logon is answered by a request for positions
+    assert [b"\x0135=AN\x01" in data for data in broker.trade_writer] == [True]
+
+
+def test_fills_update_positions_between_snapshots() -> None:
+    """Fills open, increase and reduce positions, a snapshot removes the closed."""
+    broker = make_broker()
+    broker.trade_writer.write(broker.fix_request_positions())
+    for frame in [position("1", 1000, 0, 2), position("2", 1000, 0, 2)]:
+        broker.handle_trade_message(frame)
+    assert broker.positions.keys() == ["1", "2"]
+    for frame in [
+        # partial fills of a new position, each at its own price, then of an increase
+        fill("10", "3", 2, 400, 600, last=1.1, average=1.1),
+        fill("10", "3", 2, 1000, 0, last=1.2, average=1.16),
+        fill("11", "1", 1, 1000, 0),
+        # reduced, then closed
+        fill("12", "2", 2, 500, 0),
+        fill("13", "2", 2, 500, 0),
+    ]:
+        broker.handle_trade_message(frame)
+    assert [
+        (p["position_id"], p["direction"], p["quantity"]) for p in broker.positions
+    ] == [
+        ("1", "buy", 2000.0),
+        ("3", "sell", 1000.0),
+    ]
+    assert broker.positions.get("1")["cost_price"] == 1.15
+    assert broker.positions.get("3")["cost_price"] == pytest.approx(1.16)
+    # position 1 was closed meanwhile, position 3 is not known yet by the server
+    broker.trade_writer.write(broker.fix_request_positions())
+    broker.handle_trade_message(fill("14", "4", 1, 1000, 0))
+    broker.handle_trade_message(position("3", 0, 1000, 1))
+    assert broker.positions.keys() == ["3", "4"]
+    broker.trade_writer.write(broker.fix_request_positions())
+    broker.handle_trade_message(make_frame("35=AP|710=5|728=2|"))
+    assert len(broker.positions) == 0
+
+
+def test_close_waits_for_the_position() -> None:
+    """A close before the position is received is sent as soon as its fill is."""
+
+    async def run() -> Broker:
+        broker = make_broker()
+        broker.set_asset("EURUSD")
+        close = asyncio.create_task(broker.close_position("5", timeout=5.0))
+        missing = asyncio.create_task(broker.close_position("6", timeout=0.01))
+        await asyncio.sleep(0.05)
+        assert not close.done() and missing.done()
+        assert broker.trade_writer == []
+        broker.handle_trade_message(fill("20", "5", 1, 1000, 0))
+        # written by the handler, before the caller is woken up
+        assert [b"\x01721=5\x01" in data for data in broker.trade_writer] == [True]
+        await asyncio.wait_for(close, 1.0)
+        return broker
+
+    broker = asyncio.run(run())
+    assert len(broker.positions) == 0 and list(broker.closing) == ["5"]
+    assert broker.pending_closes == set() and broker.position_waiters == {}
+    # another order of the position filled is not its close
+    broker.handle_trade_message(fill("21", "5", 2, 1000, 0))
+    assert list(broker.closing) == ["5"]
+    broker.handle_trade_message(fill("22", "5", 2, 1000, 0, broker.closing["5"]))
+    assert broker.closing == {} and len(broker.positions) == 0
+
+
+def test_close_waits_for_the_whole_fill() -> None:
+    """A close pending on a partially filled order closes all of it when filled."""
+
+    async def run() -> Broker:
+        broker = make_broker()
+        broker.set_asset("EURUSD")
+        close = asyncio.create_task(broker.close_position("5", timeout=5.0))
+        await asyncio.sleep(0)
+        broker.handle_trade_message(fill("20", "5", 1, 400, 600))
+        assert broker.trade_writer == [] and not close.done()
+        assert broker.positions.get("5")["quantity"] == 400.0
+        broker.handle_trade_message(fill("20", "5", 1, 1000, 0))
+        assert [b"\x0138=1000.0\x01" in data for data in broker.trade_writer] == [True]
+        await asyncio.wait_for(close, 1.0)
+        return broker
+
+    broker = asyncio.run(run())
+    assert len(broker.positions) == 0 and broker.pending_closes == set()
+
+
+def test_rejected_close_keeps_the_position() -> None:
+    """A closing position counts in a snapshot, and is back if its close fails."""
+    broker = make_broker()
+    broker.trade_writer.write(broker.fix_request_positions())
+    for frame in [position("1", 1000, 0, 2), position("2", 1000, 0, 2)]:
+        broker.handle_trade_message(frame)
+    broker.write_close(broker.positions.get("1"))
+    assert broker.positions.keys() == ["2"] and list(broker.closing) == ["1"]
+    # a snapshot received before the answer to the close is complete
+    broker.trade_writer.write(broker.fix_request_positions())
+    for frame in [position("1", 1000, 0, 2), position("2", 1000, 0, 2)]:
+        broker.handle_trade_message(frame)
+    assert broker.positions.keys() == ["2"] and broker.position_snapshot is None
+    broker.trade_writer.clear()
+    broker.handle_trade_message(
+        make_frame(
+            f"35=8|11={broker.closing['1']}|37=30|721=1|55=1|54=2|40=1|38=1000|14=0"
+            "|151=0|39=8|150=8|58=NOT_ENOUGH_MONEY|"
+        )
+    )
+    assert broker.closing == {}
+    assert [b"\x0135=AN\x01" in data for data in broker.trade_writer] == [True]
+    for frame in [position("1", 1000, 0, 2), position("2", 1000, 0, 2)]:
+        broker.handle_trade_message(frame)
+    assert broker.positions.keys() == ["2", "1"] and broker.position_snapshot is None
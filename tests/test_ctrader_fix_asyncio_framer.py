@@ -0,0 +1,60 @@
+"""Tests for the framing of FIX messages in ctrader_fix_asyncio.framer."""
+
+import asyncio
+from typing import List
+
+from ctrader_fix_asyncio.framer import read_frames
+from stand_in import make_frame
+
+
+HEARTBEAT = make_frame(b"35=0\x0134=2\x0149=cServer\x0156=demo.icmarkets.1\x01")
+QUOTE = make_frame(b"35=W\x0134=3\x0155=1\x01268=2\x01269=0\x01270=1.1\x01")
+
+
+def frames_of(chunks: List[bytes], limit: int = 2**16) -> List[bytes]:
+    """Frames read from a stream receiving chunks."""
+
+    async def read() -> List[bytes]:
+        reader = asyncio.StreamReader(limit)
+        for chunk in chunks:
+            reader.feed_data(chunk)
+        reader.feed_eof()
+        return [frame async for frame in read_frames(reader)]
+
+    return asyncio.run(read())
+
+
+def test_frames_split_anywhere() -> None:
+    """Frames are rebuilt whatever the size of the reads."""
+    data = HEARTBEAT + QUOTE + HEARTBEAT
+    assert frames_of([data]) == [HEARTBEAT, QUOTE, HEARTBEAT]
+    assert frames_of([data[i : i + 1] for i in range(len(data))]) == [
+        HEARTBEAT,
+        QUOTE,
+        HEARTBEAT,
+    ]
+
+
+def test_bad_frames_are_skipped() -> None:
+    """Garbage and frames with a wrong checksum are skipped."""
+    bad = QUOTE[:-4] + b"%03d\x01" % ((int(QUOTE[-4:-1]) + 1) % 256)
+    assert frames_of([b"xx\x0110=1\x01", bad, HEARTBEAT, QUOTE[:20]]) == [HEARTBEAT]
+
+
+def test_frames_in_a_wrong_frame_are_read_again() -> None:
+    """A wrong BodyLength does not take the frames after it with its frame."""
+    longer = HEARTBEAT.replace(b"\x019=41\x01", b"\x019=51\x01")
+    assert frames_of([longer, QUOTE, HEARTBEAT]) == [QUOTE, HEARTBEAT]
+    # a frame cut, the next one starting inside its BodyLength
+    assert frames_of([longer[:-30] + QUOTE + HEARTBEAT]) == [QUOTE, HEARTBEAT]
+    too_long = b"8=FIX.4.4\x019=" + b"9" * 20 + b"\x01"
+    assert frames_of([too_long + HEARTBEAT, QUOTE]) == [HEARTBEAT, QUOTE]
+    assert frames_of([b"8=FIX.4.4\x01" + QUOTE]) == [QUOTE]
+
+
+def test_resync_after_a_field_over_the_limit() -> None:
+    """Bytes without SOH over the limit of the reader are skipped, not fatal."""
+    garbage = b"x" * 300
+    assert frames_of([garbage + HEARTBEAT, QUOTE], limit=64) == [HEARTBEAT, QUOTE]
+    chunks = [garbage[:100], garbage[100:] + HEARTBEAT[:5], HEARTBEAT[5:]]
+    assert frames_of(chunks, limit=64) == [HEARTBEAT]
@@ -0,0 +1,80 @@
+"""Tests for the price stream shared by the Brokers in ctrader_fix_asyncio.hub."""
+
+import asyncio
+from typing import List, Tuple
+
+from ctrader_fix_asyncio.broker import Broker
+from ctrader_fix_asyncio.framer import read_frames
+from ctrader_fix_asyncio.hub import MarketDataHub
+from ctrader_fix_asyncio.parser import parse
+from stand_in import make_frame
+
+
+class QuoteServer:
+    """Local price server answering a subscription with a snapshot per symbol."""
+
+    def __init__(self) -> None:
+        """Init."""
+        self.connections = 0
+        self.subscribed: List[bytes] = []
+
+    async def serve(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Answer the logon, and each subscription with a quote of both symbols."""
+        self.connections += 1
+        async for frame in read_frames(reader):
+            fields = parse(frame)
+            if fields[b"35"] == b"A":
+                writer.write(make_frame("35=A|34=1|98=0|108=30|"))
+            elif fields[b"35"] == b"V":
+                self.subscribed.append(fields[b"146"])
+                writer.write(
+                    make_frame("35=W|34=2|55=1|268=2|269=0|270=1.1|269=1|270=1.2|")
+                )
+                writer.write(
+                    make_frame("35=W|34=3|55=2|268=2|269=0|270=1.3|269=1|270=1.4|")
+                )
+
+
+def test_one_price_stream_for_the_accounts_of_a_host() -> None:
+    """The Brokers of one host share one connection, each gets its own symbols."""
+
+    async def run() -> Tuple[QuoteServer, List[Broker], List[Tuple[str, float]]]:
+        stand_in = QuoteServer()
+        server = await asyncio.start_server(stand_in.serve, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        hub = MarketDataHub()
+        brokers = []
+        for account, symbol in [("1", "EURUSD"), ("2", "GBPUSD")]:
+            broker = Broker(
+                {
+                    "broker": "b",
+                    "hostname": "127.0.0.1",
+                    "account": account,
+                    "password": "p",
+                    "type": "demo",
+                    "price_port": port,
+                }
+            )
+            broker.set_asset(symbol)
+            hub.add(broker)
+            brokers.append(broker)
+        received = []
+        brokers[1].add_quote_listener(
+            lambda s, ts, bid, ask, size: received.append((s, bid))
+        )
+        task = asyncio.create_task(hub.price_login())
+        while brokers[1].bid == 0.0:
+            await asyncio.sleep(0.01)
+        hub.sources()[0].price_supervisor.stop()
+        await asyncio.wait({task})
+        server.close()
+        return stand_in, brokers, received
+
+    stand_in, brokers, received = asyncio.run(run())
+    assert stand_in.connections == 1 and stand_in.subscribed == [b"2"]
+    assert (brokers[0].bid, brokers[0].ask) == (1.1, 1.2)
+    assert (brokers[1].bid, brokers[1].ask) == (1.3, 1.4)
+    # only the quotes of its own symbol
+    assert received == [("GBPUSD", 1.3)]
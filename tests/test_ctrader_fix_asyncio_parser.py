@@ -0,0 +1,23 @@
+"""Tests for the parsing of FIX messages in ctrader_fix_asyncio.parser."""
+
+from ctrader_fix_asyncio.parser import decode_execution_report, parse
+from stand_in import make_frame
+
+
+ORDER = make_frame(
+    "35=8|34=12|11=1696932610|14=0|37=543140337|38=1000|39=0|40=2|44=1.05|54=1"
+    "|55=1|59=1|60=20231010-10:10:10.120|150=0|151=1000|911=3|"
+)
+
+
+def test_parse_and_decode() -> None:
+    """Tags are matched whole, values can contain =."""
+    fields = parse(make_frame("35=j|58=INVALID_REQUEST:a=b|"))
+    assert fields[b"35"] == b"j" and fields[b"58"] == b"INVALID_REQUEST:a=b"
+    d = decode_execution_report(parse(ORDER))
+    assert d["order_id"] == "543140337"
+    assert d["order_request_id"] == "1696932610"
+    assert d["order_type"] == "limit" and d["price_limit"] == 1.05
+    assert d["time_in_force"] == "GTC" and d["execution_type"] == "new"
+    assert d["price_stop"] is None and d["position_id"] is None
+    assert d["num_opened_orders"] == 3
@@ -0,0 +1,43 @@
+"""Tests for the table of quotes in ctrader_fix_asyncio.quotes."""
+
+from ctrader_fix_asyncio.broker import Broker
+from ctrader_fix_asyncio.quotes import QuoteTable
+
+
+def body(fields: str) -> bytes:
+    """Fields written with | as separator, as in a frame."""
+    return b"8=FIX.4.4\x01" + fields.replace("|", "\x01").encode()
+
+
+def test_snapshots_and_incremental_refreshes() -> None:
+    """W sets the bid and ask of its symbol, X those of each entry but deletes."""
+    quotes = QuoteTable(size=4)
+    assert quotes.apply(body("35=W|55=1|268=2|269=0|270=1.1|269=1|270=1.2|"), 5.0) == 2
+    assert (quotes.bid(1), quotes.ask(1), quotes.time(1)) == (1.1, 1.2, 5.0)
+    x = (
+        "35=X|268=3|279=0|269=1|278=a|55=10051|270=1.3|279=2|269=0|278=b|55=1"
+        "|279=0|269=0|278=c|55=1|270=1.15|"
+    )
+    assert quotes.apply(body(x), 6.0) == 2
+    assert len(quotes) >= 10052
+    assert (quotes.bid(10051), quotes.ask(10051)) == (0.0, 1.3)
+    assert (quotes.bid(1), quotes.ask(1), quotes.time(1)) == (1.15, 1.2, 6.0)
+    assert quotes.bid(20000) == 0.0
+
+
+def test_one_request_for_several_symbols() -> None:
+    """The symbols are requested in one MarketDataRequest, bid and ask of the first."""
+    broker = Broker(
+        {
+            "broker": "b",
+            "hostname": "h",
+            "account": "1",
+            "password": "p",
+            "type": "demo",
+        }
+    )
+    broker.set_assets(["EURUSD", "GBPUSD", "USDJPY"])
+    request = broker.fix_market_data_request(broker.symbols)
+    assert b"\x01146=3\x0155=1\x0155=2\x0155=4\x01267=2\x01" in request
+    broker.handle_price_message(body("35=W|55=1|268=2|269=0|270=1.1|269=1|270=1.2|"))
+    assert (broker.bid, broker.ask) == (1.1, 1.2)
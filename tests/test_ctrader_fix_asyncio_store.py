@@ -0,0 +1,49 @@
+"""Tests for the stores of positions and orders in ctrader_fix_asyncio.store."""
+
+import pytest
+
+from ctrader_fix_asyncio.store import Store
+
+
+def order(order_id: str, symbol: str, position_id: str, status: str = "new") -> dict:
+    """Record of an order, as decoded from an execution report."""
+    return {
+        "order_id": order_id,
+        "symbol": symbol,
+        "position_id": position_id,
+        "order_status": status,
+    }
+
+
+def test_indexes_follow_upserts_and_removals() -> None:
+    """A replaced record moves between the values of its indexed fields."""
+    orders = Store("order_id", indexes=("symbol", "position_id", "order_status"))
+    orders.upsert(order("1", "EURUSD", "p1"))
+    orders.upsert(order("2", "EURUSD", "p2"))
+    orders.upsert(order("3", "GBPUSD", "p1"))
+    assert orders.keys_by("symbol", "EURUSD") == ["1", "2"]
+    assert orders.keys_by("position_id", "p1") == ["1", "3"]
+    orders.upsert(order("1", "EURUSD", "p1", "partially_filled"))
+    assert orders.keys_by("order_status", "new") == ["2", "3"]
+    assert [d["order_id"] for d in orders.by("order_status", "partially_filled")] == [
+        "1"
+    ]
+    assert orders.remove("3")["symbol"] == "GBPUSD"
+    assert orders.remove("3") is None
+    assert orders.keys_by("symbol", "GBPUSD") == []
+    assert "GBPUSD" not in orders.indexes["symbol"]
+    assert orders.keys() == ["1", "2"] and len(orders) == 2
+
+
+def test_snapshots_are_immutable() -> None:
+    """A snapshot keeps the records as they were, and is reused until a change."""
+    positions = Store("position_id", indexes=("symbol",))
+    positions.upsert({"position_id": "p1", "symbol": "EURUSD", "quantity": 1000.0})
+    snapshot = positions.snapshot()
+    assert positions.snapshot() is snapshot
+    positions.upsert({"position_id": "p1", "symbol": "EURUSD", "quantity": 2000.0})
+    positions.upsert({"position_id": "p2", "symbol": "EURUSD", "quantity": 500.0})
+    assert [d["quantity"] for d in snapshot] == [1000.0]
+    assert [d["quantity"] for d in positions] == [2000.0, 500.0]
+    with pytest.raises(TypeError):
+        snapshot[0]["quantity"] = 0.0
@@ -0,0 +1,101 @@
+"""Tests for the reconnection of the streams in ctrader_fix_asyncio.supervisor."""
+
+import asyncio
+from typing import List, Tuple
+
+from ctrader_fix_asyncio.broker import Broker
+from ctrader_fix_asyncio.framer import read_frames
+from ctrader_fix_asyncio.parser import Fields, parse
+from ctrader_fix_asyncio.supervisor import Supervisor
+from stand_in import make_frame
+
+
+class DroppingServer:
+    """Local price server answering the logons, dropping the first connections."""
+
+    def __init__(self, drops: int) -> None:
+        """Init with the number of connections dropped after the subscription."""
+        self.drops = drops
+        self.connections = 0
+        # connection number and fields of each message received
+        self.received: List[Tuple[int, Fields]] = []
+
+    async def serve(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Answer the logon of a connection, close it at its subscription if dropped."""
+        self.connections += 1
+        connection = self.connections
+        async for frame in read_frames(reader):
+            fields = parse(frame)
+            self.received.append((connection, fields))
+            if fields[b"35"] == b"A":
+                writer.write(make_frame("35=A|34=1|98=0|108=30|"))
+            elif fields[b"35"] == b"V" and connection <= self.drops:
+                writer.close()
+                return
+
+
+def test_broker_reconnects_with_backoff() -> None:
+    """Each new connection logs on from MsgSeqNum 1 and subscribes again."""
+
+    async def run() -> Tuple[DroppingServer, Broker]:
+        stand_in = DroppingServer(drops=2)
+        server = await asyncio.start_server(stand_in.serve, "127.0.0.1", 0)
+        broker = Broker(
+            {
+                "broker": "b",
+                "hostname": "127.0.0.1",
+                "account": "1",
+                "password": "p",
+                "type": "demo",
+                "price_port": server.sockets[0].getsockname()[1],
+            },
+            reconnect_delay=0.01,
+        )
+        broker.set_asset("EURUSD")
+        task = asyncio.create_task(broker.price_login())
+        # the third subscription received, and its logon answer read
+        while len(stand_in.received) < 6 or broker.price_supervisor.attempts:
+            await asyncio.sleep(0.01)
+        broker.price_supervisor.stop()
+        await asyncio.wait({task})
+        server.close()
+        return stand_in, broker
+
+    stand_in, broker = asyncio.run(run())
+    assert stand_in.connections == 3
+    assert [(c, f[b"35"], f[b"34"]) for c, f in stand_in.received] == [
+        (1, b"A", b"1"),
+        (1, b"V", b"2"),
+        (2, b"A", b"1"),
+        (2, b"V", b"2"),
+        (3, b"A", b"1"),
+        (3, b"V", b"2"),
+    ]
+    # logged on again, so the next reconnection would start from the first delay
+    assert broker.price_supervisor.attempts == 0
+
+
+def test_silent_stream_is_tested_then_restarted() -> None:
+    """A test request after HeartBtInt of silence, a new session after another."""
+    test_requests = []
+
+    async def silent() -> None:
+        await asyncio.sleep(60)
+
+    async def run() -> Supervisor:
+        supervisor = Supervisor(
+            "PRICE", silent, 0.05, lambda: test_requests.append(1), 0.01, 0.02
+        )
+        task = asyncio.create_task(supervisor.run())
+        while supervisor.sessions < 2:
+            await asyncio.sleep(0.01)
+        supervisor.stop()
+        await asyncio.wait({task})
+        return supervisor
+
+    supervisor = asyncio.run(run())
+    assert test_requests == [1]
+    assert supervisor.attempts == 1
+    assert 0.005 <= supervisor.backoff() <= 0.02
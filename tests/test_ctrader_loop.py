@@ -0,0 +1,48 @@
+"""Tests for the event loop shared by the FIX sessions in ctrader.loop."""
+
+import socket
+import threading
+
+from ctrader.loop import FIXLoop
+
+
+def test_reader_and_timers() -> None:
+    """Readers and timers of several sockets all run on the one loop thread."""
+    loop = FIXLoop()
+    loop.start()
+    received = []
+    threads = set()
+    done = threading.Event()
+    pairs = [socket.socketpair() for _ in range(20)]
+
+    def reader(sock: socket.socket) -> None:
+        threads.add(threading.current_thread().name)
+        received.append(sock.recv(100))
+        if len(received) == len(pairs):
+            done.set()
+
+    for r, _ in pairs:
+        loop.add_reader(r, lambda r=r: reader(r))
+    for _, w in pairs:
+        w.send(b"8=FIX")
+    assert done.wait(2)
+    assert received == [b"8=FIX"] * len(pairs)
+    assert threads == {"FIXLoop"}
+
+    ticks = []
+    ticked = threading.Event()
+
+    def tick() -> None:
+        ticks.append(1)
+        if len(ticks) == 3:
+            timer.cancel()
+            ticked.set()
+
+    timer = loop.call_every(0.01, tick)
+    once = threading.Event()
+    loop.call_later(0.01, once.set)
+    assert ticked.wait(2)
+    assert once.wait(2)
+    for r, w in pairs:
+        loop.remove_reader(r)
+        w.close()
@@ -0,0 +1,29 @@
+"""Tests for the depth of the market in ctrader.order_book."""
+
+from ctrader.order_book import ASK, BID, OrderBook
+
+
+def test_levels_aggregate_the_entries() -> None:
+    """Entries of the same price make one level, the best ones are at the ends."""
+    book = OrderBook(digits=5)
+    book.add("a", BID, 1.10001, 100000.0)
+    book.add("b", BID, 1.10003, 50000.0)
+    book.add("c", BID, 1.10001, 200000.0)
+    book.add("d", ASK, 1.10006, 70000.0)
+    book.add("e", ASK, 1.10008, 10000.0)
+    assert (book.best_bid(), book.best_ask()) == (1.10003, 1.10006)
+    assert round(book.spread(), 5) == 0.00003
+    assert book.top() == (1.10003, 1.10006, 50000.0)
+    assert book.depth(1) == ([(1.10003, 50000.0)], [(1.10006, 70000.0)])
+    assert book.depth()[0] == [(1.10003, 50000.0), (1.10001, 300000.0)]
+    book.remove("b")
+    book.remove("a")
+    assert book.best_bid() == 1.10001 and book.size(BID, 1.10001) == 200000.0
+    # an entry sent again replaces the previous one
+    book.add("d", ASK, 1.10007, 30000.0)
+    assert book.depth()[1] == [(1.10007, 30000.0), (1.10008, 10000.0)]
+    book.remove("unknown")
+    assert len(book) == 3
+    book.clear()
+    assert book.best_bid() is None and book.spread() is None
+    assert book.top() == (0.0, 0.0, 0.0)
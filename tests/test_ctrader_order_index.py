@@ -0,0 +1,33 @@
+"""Tests for the index of orders and positions in ctrader.order_index."""
+
+from ctrader.order_index import OrderIndex
+
+
+def test_lookups_in_every_direction() -> None:
+    """Positions and orders are found from their origin and back."""
+    index = OrderIndex()
+    index.link_position("o1", "p1")
+    index.link_order("o1", "sl1")
+    index.link_order("o1", "tp1")
+    index.link_order("o1", "sl1")
+    assert index.position("o1") == "p1"
+    assert index.origin_of_position("p1") == "o1"
+    assert index.orders("o1") == ["sl1", "tp1"]
+    assert index.origin_of_order("tp1") == "o1"
+    assert index.position("o2") is None and index.orders("o2") == []
+
+
+def test_updates_keep_both_directions_consistent() -> None:
+    """Relinking and removing never leaves a stale reverse entry."""
+    index = OrderIndex()
+    index.link_position("o1", "p1")
+    index.link_position("o2", "p1")
+    assert index.position("o1") is None
+    assert index.origin_of_position("p1") == "o2"
+    index.link_order("o1", "sl1")
+    index.link_order("o2", "sl1")
+    assert index.orders("o1") == [] and index.orders("o2") == ["sl1"]
+    assert index.remove_order("sl1") == "o2"
+    assert index.origin_to_orders == {} and index.order_to_origin == {}
+    assert index.remove_position("p1") == "o2"
+    assert index.origin_to_pos == {} and index.pos_to_origin == {}
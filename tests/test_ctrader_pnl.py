@@ -0,0 +1,44 @@
+"""Tests for the P&L of the positions in ctrader.pnl."""
+
+from ctrader.pnl import PnLEngine
+
+POSITIONS = {
+    "1": {"pos_id": "1", "name": "EURUSD", "long": 10000.0, "short": 0.0},
+    "2": {"pos_id": "2", "name": "USDJPY", "long": 0.0, "short": 10000.0},
+}
+POSITIONS["1"].update(price=1.1, digits=5, clid="o1")
+POSITIONS["2"].update(price=150.0, digits=3, clid="o2", convert="USDJPY", convert_dir=1)
+
+
+def test_only_the_positions_quoted_are_formatted_again() -> None:
+    """A quote marks the positions of its symbol, or converted by it, changed."""
+    pnl = PnLEngine()
+    pnl.set_positions(POSITIONS, {"EURUSD": {"bid": 1.101, "ask": 1.1012}})
+    eurusd, usdjpy = pnl.rows()
+    assert eurusd["side"] == "Buy" and eurusd["actual_price"] == "1.10100"
+    assert (eurusd["diff"], eurusd["pl"], eurusd["gain"]) == (
+        "+0.00100",
+        "+10.00",
+        "+10.00",
+    )
+    assert usdjpy["side"] == "Sell" and usdjpy["pl"] == "" and usdjpy["gain"] == ""
+    pnl.update("GBPUSD", 0, 1.25, 1.26)
+    assert pnl.dirty == set()
+    pnl.update("USDJPY", 0, 149.0, 149.5)
+    rows = pnl.rows()
+    assert rows[0] is eurusd
+    assert rows[1]["actual_price"] == "149.500" and rows[1]["pl"] == "+5000.00"
+    assert rows[1]["gain"] == "+33.44"
+    pnl.set_positions({})
+    assert pnl.rows() == []
+
+
+def test_gain_without_conversion_is_the_pl() -> None:
+    """A position quoted in the currency of the account has its P&L as gain."""
+    pnl = PnLEngine()
+    position = {"pos_id": "3", "name": "GBPUSD", "long": 0.0, "short": 20000.0}
+    position.update(price=1.25, digits=5, clid="o3")
+    pnl.set_positions({"3": position}, {"GBPUSD": {"bid": 1.2488, "ask": 1.249}})
+    (row,) = pnl.rows()
+    assert row["pl"] == "+20.00"
+    assert row["gain"] == row["pl"]
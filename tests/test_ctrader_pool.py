@@ -0,0 +1,70 @@
+"""Tests for the pool of sessions in ctrader.pool."""
+
+import time
+from typing import cast
+
+from ctrader.ctrader import CTrader
+from ctrader.loop import FIXLoop
+from ctrader.pool import SessionPool
+
+
+class FakeFIX:
+    """Session state of FIX, alive until closed."""
+
+    def __init__(self) -> None:
+        """Init alive."""
+        self.alive = True
+
+    def is_alive(self) -> bool:
+        """Check the session is not closed."""
+        return self.alive
+
+    def close(self) -> None:
+        """Close the session."""
+        self.alive = False
+
+
+class FakeSession:
+    """Session of CTrader without a server."""
+
+    def __init__(self) -> None:
+        """Init logged on."""
+        self.fix = FakeFIX()
+
+    def logout(self) -> None:
+        """Logout, closing the session."""
+        self.fix.close()
+
+
+class LocalPool(SessionPool):
+    """Pool logging on sessions that do not need a server."""
+
+    def connect(self, account: str, password: str) -> CTrader:
+        """Log on a new session, standing in for a CTrader."""
+        return cast(CTrader, FakeSession())
+
+
+def test_session_is_reused_and_replaced() -> None:
+    """Orders share the session of their account, a dead one is replaced."""
+    pool = LocalPool("127.0.0.1", "EUR", loop=FIXLoop.default())
+    first = pool.get("demo.icmarkets.1", "pw")
+    assert pool.get("demo.icmarkets.1", "pw") is first
+    assert pool.get("demo.icmarkets.2", "pw") is not first
+    first.fix.close()
+    second = pool.get("demo.icmarkets.1", "pw")
+    assert second is not first and second.fix.is_alive()
+    pool.close()
+
+
+def test_health_check_replaces_in_background() -> None:
+    """A session that dies between orders is replaced before the next one."""
+    loop = FIXLoop()
+    loop.start()
+    pool = LocalPool("127.0.0.1", "EUR", health_check_interval=0.01, loop=loop)
+    first = pool.get("demo.icmarkets.1", "pw")
+    first.fix.close()
+    deadline = time.monotonic() + 5
+    while pool.sessions["demo.icmarkets.1"] is first and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert pool.sessions["demo.icmarkets.1"].fix.is_alive()
+    pool.close()
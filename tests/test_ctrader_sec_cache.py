@@ -0,0 +1,31 @@
+"""Tests for the security list cache in ctrader.sec_cache."""
+
+from pathlib import Path
+
+from ctrader.sec_cache import SecurityListCache, apply_sec_list_diff
+
+
+def test_save_load_and_diff(tmp_path: Path) -> None:
+    """The tables survive a save and load, and a fresh list is applied as a diff."""
+    cache = SecurityListCache(str(tmp_path), "demo.icmarkets", "1.2.3.4")
+    assert cache.load() is None
+    sec_id_table = {
+        1: {"name": "EURUSD", "digits": 5},
+        2: {"name": "GBPUSD", "digits": 5},
+    }
+    cache.save(sec_id_table)
+    loaded = cache.load()
+    assert loaded == sec_id_table
+    assert SecurityListCache(str(tmp_path), "demo.icmarkets", "5.6.7.8").load() is None
+
+    sec_name_table = {
+        "EURUSD": {"id": 1, "digits": 5},
+        "GBPUSD": {"id": 2, "digits": 5},
+    }
+    fresh = {1: {"name": "EURUSD", "digits": 4}, 41: {"name": "XAUUSD", "digits": 2}}
+    assert apply_sec_list_diff(loaded, sec_name_table, fresh) == (1, 1, 1)
+    assert loaded == fresh
+    assert sec_name_table == {
+        "EURUSD": {"id": 1, "digits": 4},
+        "XAUUSD": {"id": 41, "digits": 2},
+    }
@@ -0,0 +1,62 @@
+"""Tests for the market data subscriptions in ctrader.subscriptions."""
+
+import time
+
+from ctrader.fix import FIX, Field, SubID
+from ctrader.subscriptions import Subscriptions
+from stand_in import StandInServer
+
+
+def test_counted_by_owner_and_sent_in_batches() -> None:
+    """A symbol is subscribed while held, the changes of a flush in one request."""
+    requests = []
+    subscriptions = Subscriptions(
+        lambda symbols, subscribe: requests.append((symbols, subscribe))
+    )
+    assert subscriptions.hold("p1", "EURUSD", "USDJPY")
+    assert subscriptions.hold("p2", "EURUSD")
+    # a snapshot received again holds the same symbols
+    subscriptions.hold("p1", "EURUSD", "USDJPY")
+    subscriptions.flush()
+    assert requests == [(["EURUSD", "USDJPY"], True)]
+    assert not subscriptions.release("p2")
+    assert subscriptions.release("p1")
+    assert subscriptions.hold("o1", "GBPUSD")
+    subscriptions.flush()
+    assert requests[1:] == [(["GBPUSD"], True), (["EURUSD", "USDJPY"], False)]
+    assert "GBPUSD" in subscriptions and "EURUSD" not in subscriptions
+    subscriptions.resubscribe()
+    assert requests[3:] == [(["GBPUSD"], True)]
+
+
+def test_positions_subscribe_in_one_request() -> None:
+    """The spots of the positions and of their conversion come in one request."""
+    server = StandInServer(positions=3)
+    fix = FIX(
+        "127.0.0.1",
+        "demo.icmarkets",
+        "1234567",
+        "password",
+        "JPY",
+        "1",
+        lambda positions, price_data: None,
+        lambda orders, price_data: None,
+        quote_port=server.quote_port,
+        trade_port=server.trade_port,
+    )
+    deadline = time.monotonic() + 5
+    while server.count(SubID.QUOTE, "V") < 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    fix.close_all()
+    while server.count(SubID.QUOTE, "V") < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    requests = [
+        msg for msg in server.received[SubID.QUOTE] if msg[Field.MsgType] == "V"
+    ]
+    assert [
+        (msg[Field.SubscriptionRequestType], msg[Field.NoRelatedSym])
+        for msg in requests
+    ] == [("1", "2"), ("2", "2")]
+    assert fix.spot_subscriptions.counts == {}
+    fix.close()
+    server.close()
@@ -0,0 +1,39 @@
+"""Tests for the bars built from the quotes in market_data.bars."""
+
+import pytest
+
+from market_data.bars import BarAggregator, BarBuilder
+
+SECOND = 1_000_000_000
+
+
+def test_bars_of_the_mid() -> None:
+    """A bar is completed by the first quote of a later one, the last ones kept."""
+    builder = BarBuilder(1, "mid", capacity=2)
+    builder.update("EURUSD", 0, 1.0, 0.0)
+    for ts, mid in [(0.1, 1.0), (0.5, 1.2), (0.9, 0.9), (1.2, 1.1), (3.5, 1.3)]:
+        builder.update("EURUSD", int(ts * SECOND), mid - 0.01, mid + 0.01)
+    bars = builder.latest("EURUSD", 5)
+    assert bars.ts.tolist() == [0, SECOND]
+    assert bars.open.tolist() == pytest.approx([1.0, 1.1])
+    assert bars.high.tolist() == pytest.approx([1.2, 1.1])
+    assert bars.low.tolist() == pytest.approx([0.9, 1.1])
+    assert bars.close.tolist() == pytest.approx([0.9, 1.1])
+    assert bars.ticks.tolist() == [3, 1]
+    builder.update("EURUSD", 4 * SECOND, 1.4, 1.4)
+    bars = builder.latest("EURUSD", 5, with_current=True)
+    # the oldest bar is overwritten in the ring buffer
+    assert bars.ts.tolist() == [SECOND, 3 * SECOND, 4 * SECOND]
+    assert bars.close.tolist() == pytest.approx([1.1, 1.3, 1.4])
+    assert len(builder.latest("GBPUSD", 5).ts) == 0
+
+
+def test_intervals_of_the_bid() -> None:
+    """The aggregator builds the bars of all its intervals."""
+    bars = BarAggregator(intervals=(1, 60), source="bid")
+    for ts, bid in [(0, 1.0), (30, 1.2), (61, 1.1)]:
+        bars.update("EURUSD", ts * SECOND, bid, 0.0)
+    assert bars.latest("EURUSD", 1, 5).close.tolist() == [1.0, 1.2]
+    assert bars.latest("EURUSD", 60, 5).high.tolist() == [1.2]
+    with pytest.raises(ValueError):
+        BarBuilder(60, "last")
@@ -0,0 +1,50 @@
+"""Tests for the bus of the quotes in market_data.bus."""
+
+import threading
+
+from market_data.bus import Quote, QuoteBus
+
+
+def test_mailboxes_conflate_and_drop() -> None:
+    """A mailbox keeps the latest quote per symbol, up to its capacity."""
+    bus = QuoteBus()
+    everything = bus.subscribe(capacity=2)
+    eurusd = bus.subscribe(symbols=["EURUSD"])
+    for i in range(3):
+        bus.publish("EURUSD", i, 1.1 + i, 1.2 + i)
+    bus.publish("GBPUSD", 3, 1.3, 1.4)
+    bus.publish("USDJPY", 4, 150.0, 150.1)
+    assert bus.latest("EURUSD") == Quote("EURUSD", 2, 3.1, 3.2, 0.0)
+    assert [q.symbol for q in everything.drain()] == ["EURUSD", "GBPUSD"]
+    assert (everything.received, everything.conflated, everything.dropped) == (5, 2, 1)
+    assert eurusd.get(timeout=0) == [Quote("EURUSD", 2, 3.1, 3.2, 0.0)]
+    assert everything.drain() == [] and eurusd.get(timeout=0) == []
+    bus.unsubscribe(everything)
+    bus.publish("USDJPY", 5, 150.0, 150.1)
+    assert everything.drain() == [] and bus.published == 6
+
+
+def test_slow_consumer_does_not_block_the_feed() -> None:
+    """The feed publishes while a consumer is busy, the consumer gets the last quote."""
+    bus = QuoteBus()
+    calls = []
+    mailbox = bus.subscribe(notify=lambda: calls.append(1))
+    busy = threading.Event()
+    got = []
+
+    def consume() -> None:
+        got.extend(mailbox.get(timeout=5))
+        busy.wait(5)
+        got.extend(mailbox.get(timeout=5))
+
+    consumer = threading.Thread(target=consume)
+    consumer.start()
+    bus.publish("EURUSD", 0, 1.1, 1.2)
+    while not got:
+        pass
+    for i in range(1, 1000):
+        bus.publish("EURUSD", i, 1.1, 1.2)
+    busy.set()
+    consumer.join(5)
+    assert [q.ts for q in got] == [0, 999]
+    assert mailbox.conflated == 998 and len(calls) == 2
@@ -0,0 +1,90 @@
+"""Tests for the store of the ticks in market_data.tick_store."""
+
+import asyncio
+
+import numpy as np
+
+from ctrader_fix_asyncio.broker import Broker
+from ctrader_fix_asyncio.framer import read_frames
+from market_data.tick_store import TickStore
+from stand_in import make_frame
+
+
+def test_ticks_read_by_time_range(tmp_path) -> None:
+    """Ticks are buffered, written when the buffer is full, read as views."""
+    store = TickStore(tmp_path, buffer_size=4)
+    for ts in range(1, 11):
+        store.append("EURUSD", ts, 1.0 + ts / 100, 1.1 + ts / 100, ts)
+    # two full buffers written, the last two ticks buffered
+    assert (tmp_path / "EURUSD" / "ts.bin").stat().st_size == 8 * 8
+    ticks = store.read("EURUSD", 3, 7)
+    assert ticks.ts.tolist() == [3, 4, 5, 6]
+    assert np.allclose(ticks.bid, [1.03, 1.04, 1.05, 1.06])
+    assert isinstance(ticks.ask.base, np.memmap)
+    assert len(store.read("EURUSD").ts) == 10
+    assert len(store.read("GBPUSD").ts) == 0
+    # an interrupted flush left a tick in one column only, dropped when opened
+    with open(tmp_path / "EURUSD" / "bid.bin", "ab") as file:
+        file.write(np.float64(2.0).tobytes())
+    ticks = TickStore(tmp_path).read("EURUSD", 9)
+    assert ticks.ts.tolist() == [9, 10] and ticks.size.tolist() == [9.0, 10.0]
+
+
+def test_broker_quotes_recorded(tmp_path) -> None:
+    """A quote listener of Broker is called once per symbol of a message."""
+    broker = Broker(
+        {
+            "broker": "b",
+            "hostname": "h",
+            "account": "1",
+            "password": "p",
+            "type": "demo",
+        }
+    )
+    broker.set_assets(["EURUSD", "GBPUSD"])
+    store = TickStore(tmp_path)
+    broker.add_quote_listener(store.append)
+    broker.handle_price_message(
+        b"8=FIX.4.4\x0135=W\x0155=1\x01268=2\x01269=0\x01270=1.1\x01269=1\x01270=1.2\x01"
+    )
+    broker.handle_price_message(
+        b"8=FIX.4.4\x0135=X\x01268=1\x01279=0\x01269=1\x01278=a\x0155=2\x01270=1.3\x01"
+    )
+    eurusd = store.read("EURUSD")
+    assert (eurusd.bid.tolist(), eurusd.ask.tolist()) == ([1.1], [1.2])
+    # no bid received yet
+    gbpusd = store.read("GBPUSD")
+    assert np.isnan(gbpusd.bid[0]) and gbpusd.ask.tolist() == [1.3]
+
+
+def test_broker_ticks_written_when_the_session_ends(tmp_path) -> None:
+    """The ticks recorded by Broker and still buffered are written at the end."""
+
+    async def serve(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Answer the subscription with one quote, then close the connection."""
+        async for frame in read_frames(reader):
+            if b"\x0135=V\x01" in frame:
+                break
+        writer.write(make_frame("35=W|55=1|268=2|269=0|270=1.1|269=1|270=1.2|"))
+        await writer.drain()
+        writer.close()
+
+    async def run() -> None:
+        server = await asyncio.start_server(serve, "127.0.0.1", 0)
+        broker = Broker(
+            {
+                "broker": "b",
+                "hostname": "127.0.0.1",
+                "account": "1",
+                "password": "p",
+                "type": "demo",
+                "price_port": server.sockets[0].getsockname()[1],
+            },
+            tick_store_dir=str(tmp_path),
+        )
+        broker.set_asset("EURUSD")
+        await broker.price_session()
+        server.close()
+
+    asyncio.run(run())
+    assert (tmp_path / "b" / "EURUSD" / "ts.bin").stat().st_size == 8